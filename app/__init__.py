@@ -4,17 +4,20 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_jwt_extended import JWTManager
 
-from .services import limiter
+from .services import classifier, database, genre_stats, http_cache, inference, limiter, storage, user_cache
 
 # Инициализация расширений
-db = SQLAlchemy()
+# Сессия с маршрутизацией чтений на реплики (см. services/database.py)
+db = SQLAlchemy(session_options={"class_": database.RoutingSession})
 login_manager = LoginManager()
 jwt = JWTManager()
 
-def create_app(config_name=None):
+def create_app(config_name=None, overrides=None):
     """
     Фабрика приложения Flask.
     При необходимости передать имя конфига: 'default' или 'testing'.
+    overrides — словарь настроек поверх конфига (например, другой
+    SQLALCHEMY_DATABASE_URI); применяется до создания движка БД.
     """
     app = Flask(__name__, instance_relative_config=True)
 
@@ -23,21 +26,33 @@ def create_app(config_name=None):
     app.config.from_object(f"app.config.{cfg.capitalize()}Config")
     # Можно также подгрузить instance/config.py, если нужен override
     app.config.from_pyfile("config.py", silent=True)
+    if overrides:
+        app.config.update(overrides)
 
-    # Инициализируем расширения с приложением
+    # Инициализируем расширения с приложением.
+    # Параметры пула и реплики нужны до db.init_app — движки создаются сразу
+    database.configure(app)
     db.init_app(app)
+    database.init_app(app)
     login_manager.init_app(app)
     jwt.init_app(app)
+    classifier.init_app(app)
+    inference.init_app(app)
+    genre_stats.init_app(app)
+    limiter.init_app(app)
+    storage.init_app(app)
+    user_cache.init_app(app)
+    http_cache.init_app(app)
 
     # Настройка перенаправления неавторизованных пользователей
     login_manager.login_view = "auth.login"
     login_manager.login_message_category = "warning"
 
-    # Функция для загрузки пользователя по ID из сессии
-    from .models import User
+    # Функция для загрузки пользователя по ID из сессии.
+    # Вызывается на каждом запросе — берём из кэша, без обращения к БД
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.get(int(user_id))
 
     # Регистрируем blueprints
     from .main.routes import main_bp
@@ -48,13 +63,19 @@ def create_app(config_name=None):
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(api_bp, url_prefix="/api/v1")
 
+    # CLI-команды (flask requeue-jobs и др.)
+    from .commands import register_commands
+    register_commands(app)
+
     # Контекстный процессор: делаем доступными в шаблонах
     # - GUEST_LIMIT  — число гостевых загрузок
-    # - session      — чтобы читать текущий счётчик
+    # - guest_usage  — сколько загрузок гость уже сделал (счётчик лимитера)
+    # - session      — данные сессии
     @app.context_processor
     def inject_globals():
         return {
             "GUEST_LIMIT": limiter.GUEST_LIMIT,
+            "guest_usage": limiter.guest_usage,
             "session": session,
         }
 
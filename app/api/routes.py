@@ -1,9 +1,16 @@
-import os, uuid
+import os
 import json
-from flask import Blueprint, request, jsonify, current_app
+import shutil
+import tempfile
+from flask import Blueprint, request, jsonify, current_app, url_for, stream_with_context, abort
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-from ..services.classifier import classify
+from ..services import (
+    database, dedup, genre_stats, http_cache, inference, jobs, limiter, pagination, storage, user_cache
+)
+from ..services.uploads import (
+    CHUNK_SIZE as UPLOAD_CHUNK_SIZE, UploadRejected, archive_members, save_many, save_upload
+)
 from ..services.limiter import guest_can_upload
 from ..models import Track, User
 from .. import db
@@ -13,6 +20,20 @@ api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
 ALLOWED_EXTENSIONS = {".wav", ".mp3", ".flac"}
 
 
+@api_bp.errorhandler(413)
+def api_too_large(e):
+    # Тело запроса больше MAX_CONTENT_LENGTH — отвечаем JSON, а не HTML
+    return jsonify(error="File is too large"), 413
+
+
+@api_bp.route("/health", methods=["GET"])
+def api_health():
+    # Проверка готовности: 200, когда модель прогрета, иначе 503.
+    # Заодно — счётчики кэша дедупликации этого процесса
+    state = inference.status()
+    return jsonify(dict(state, dedup=dedup.stats())), 200 if state["ready"] else 503
+
+
 @api_bp.route("/auth/login", methods=["POST"])
 def api_login():
     # Получаем JSON из запроса и ищем пользователя по email
@@ -21,6 +42,9 @@ def api_login():
 
     # Если пользователь найден и пароль совпадает — выдаём JWT
     if user and user.verify_password(data.get("password", "")):
+        # Параметры хеша сменились — пересчитываем, пока знаем пароль
+        if user.upgrade_password_hash(data["password"]):
+            db.session.commit()
         token = create_access_token(identity=str(user.id))
         return jsonify(access_token=token), 200
 
@@ -31,89 +55,384 @@ def api_login():
 @api_bp.route("/upload", methods=["POST"])
 @jwt_required(optional=True)
 def api_upload():
-    # Определяем, залогинен ли пользователь
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id) if user_id else None
+    # Определяем, залогинен ли пользователь. Пользователь из токена мог быть
+    # удалён — тогда загрузка гостевая; проверка идёт через кэш пользователей
+    identity = get_jwt_identity()
+    user = user_cache.get(int(identity)) if identity else None
+    user_id = user.id if user else None
 
     # Проверяем гостевой лимит, если нет токена
-    if user is None and not guest_can_upload():
+    if user_id is None and not guest_can_upload():
         return jsonify(error="Guest upload limit reached"), 403
+    # У пользователей — квота запросов в минуту
+    if user_id is not None and not limiter.user_can_request(user_id):
+        return jsonify(error="Request quota exceeded"), 429
 
-    # Проверяем, передан ли файл
-    if "file" not in request.files:
-        return jsonify(error="No file part"), 400
-    file = request.files["file"]
-    if file.filename == "":
-        return jsonify(error="No selected file"), 400
+    # Файл передаётся multipart-частью "file" или сырым телом запроса
+    # (Content-Type: audio/* или application/octet-stream, имя — ?filename=).
+    # Сырое тело читается из сокета блоками, без разбора и буферизации multipart
+    if request.mimetype.startswith("multipart/"):
+        if "file" not in request.files:
+            return jsonify(error="No file part"), 400
+        file = request.files["file"]
+        if file.filename == "":
+            return jsonify(error="No selected file"), 400
+        original_name, stream = file.filename, file.stream
+    else:
+        original_name = request.args.get("filename", "")
+        if not original_name:
+            return jsonify(error="No file part"), 400
+        # Размер сырого тела известен заранее — отказываем, не читая его
+        max_size = current_app.config.get("MAX_UPLOAD_SIZE")
+        if max_size and (request.content_length or 0) > max_size:
+            return jsonify(error="File is too large"), 413
+        stream = request.stream
 
     # Очищаем имя и проверяем расширение
-    filename_raw = secure_filename(file.filename)
+    filename_raw = secure_filename(original_name)
     ext = os.path.splitext(filename_raw)[1].lower()
     if ext not in ALLOWED_EXTENSIONS:
         return jsonify(error="Unsupported file extension"), 415
 
-    # Генерируем уникальное имя и сохраняем файл
-    unique_name = f"{uuid.uuid4().hex}{ext}"
-    upload_folder = current_app.config["UPLOAD_FOLDER"]
-    os.makedirs(upload_folder, exist_ok=True)
-    save_path = os.path.join(upload_folder, unique_name)
-    file.save(save_path)
-
-    # Пытаемся классифицировать аудио, при ошибке — 'unknown'
+    # Потоково сохраняем файл, попутно считая хеш содержимого;
+    # сигнатура формата и лимиты проверяются до конца приёма
     try:
-        genre = classify(save_path)
-    except Exception:
-        genre = "unknown"
-
-    # Сохраняем информацию о треке в базе
+        saved = save_upload(stream, ext)
+    except UploadRejected as e:
+        return jsonify(error=e.message), e.status
     track = Track(
-        filename=unique_name,
+        filename=saved.filename,
         original_filename=filename_raw,
-        genre=genre,
-        user_id=user.id if user else None
+        content_hash=saved.content_hash,
+        user_id=user_id
     )
+
+    # Такой файл уже классифицировали — жанр берём из кэша без прогона модели
+    if dedup.reuse_if_known(track, saved):
+        db.session.add(track)
+        db.session.commit()
+        return jsonify(
+            id=track.id,
+            filename=track.filename,
+            genre=track.genre,
+            status=track.status
+        ), 201
+
+    # Модель понадобится — списываем секунды аудио с часовой квоты
+    # Файл отклонённой загрузки не удаляем сразу: его может уже разделять
+    # параллельная такая же загрузка, ещё не записавшая трек, — удалит storage-gc
+    if user_id is not None and not limiter.charge_audio(user_id, jobs.audio_seconds(saved)):
+        return jsonify(error="Audio quota exceeded"), 429
+
+    # Иначе сохраняем трек со статусом pending — жанр проставит воркер
     db.session.add(track)
     db.session.commit()
 
-    # Возвращаем созданный ресурс
-    return jsonify(id=track.id, filename=unique_name, genre=genre), 201
+    # Ставим классификацию в очередь и сразу отвечаем 202 Accepted
+    jobs.submit(track.id, saved.path, track.user_id)
+    return jsonify(
+        id=track.id,
+        filename=track.filename,
+        genre=track.genre,
+        status=track.status,
+        status_url=url_for("api.api_track_status", track_id=track.id)
+    ), 202
+
+
+def _batch_sources():
+    """
+    Файлы пакетной загрузки: multipart-части "files" (или "file"),
+    zip-архивы среди них раскрываются; либо zip сырым телом запроса.
+    Возвращает список (имя, функция открытия потока).
+    """
+    if request.mimetype.startswith("multipart/"):
+        parts = request.files.getlist("files") + request.files.getlist("file")
+        sources = []
+        for part in parts:
+            if part.filename.lower().endswith(".zip"):
+                sources += archive_members(part.stream, ALLOWED_EXTENSIONS)
+            elif part.filename:
+                sources.append((part.filename, lambda part=part: part.stream))
+        return sources
+    if request.mimetype in ("application/zip", "application/x-zip-compressed"):
+        # zip читается с произвольным доступом — сначала копируем тело во временный файл
+        body = tempfile.SpooledTemporaryFile(max_size=UPLOAD_CHUNK_SIZE * 16)
+        shutil.copyfileobj(request.stream, body, UPLOAD_CHUNK_SIZE)
+        body.seek(0)
+        return archive_members(body, ALLOWED_EXTENSIONS)
+    return []
+
+
+@api_bp.route("/upload/batch", methods=["POST"])
+@jwt_required()
+def api_upload_batch():
+    # Пакетная загрузка: много файлов за один запрос. Файлы сохраняются
+    # параллельно, треки записываются одной транзакцией, классификация
+    # ставится в очередь пачками. В ответе — результат по каждому файлу
+    user = user_cache.get(int(get_jwt_identity()))
+    if user is None:
+        return jsonify(error="Unknown user"), 401
+    user_id = user.id
+    if not limiter.user_can_request(user_id):
+        return jsonify(error="Request quota exceeded"), 429
+
+    # Лимит тела для пакета больше, чем для одиночной загрузки
+    cfg = current_app.config
+    request.max_content_length = cfg["MAX_BATCH_UPLOAD_SIZE"]
+    request.max_form_parts = cfg["UPLOAD_BATCH_MAX_FILES"] * 2 + 10
+
+    try:
+        sources = _batch_sources()
+    except UploadRejected as e:
+        return jsonify(error=e.message), e.status
+    if not sources:
+        return jsonify(error="No files"), 400
+    if len(sources) > cfg["UPLOAD_BATCH_MAX_FILES"]:
+        return jsonify(error=f"Too many files (max {cfg['UPLOAD_BATCH_MAX_FILES']})"), 413
+
+    # Имя и расширение проверяем до записи на диск
+    results, to_save = [None] * len(sources), []
+    for i, (name, open_stream) in enumerate(sources):
+        filename_raw = secure_filename(name)
+        ext = os.path.splitext(filename_raw)[1].lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            results[i] = {"filename": name, "code": 415, "error": "Unsupported file extension"}
+        else:
+            to_save.append((i, filename_raw, ext, open_stream))
+
+    saved_list = save_many(
+        [(ext, open_stream) for _, _, ext, open_stream in to_save],
+        cfg["UPLOAD_BATCH_WORKERS"]
+    )
+
+    tracks, queued = [], []
+    for (i, filename_raw, _, _), saved in zip(to_save, saved_list):
+        if isinstance(saved, UploadRejected):
+            results[i] = {"filename": filename_raw, "code": saved.status, "error": saved.message}
+            continue
+        track = Track(
+            filename=saved.filename,
+            original_filename=filename_raw,
+            content_hash=saved.content_hash,
+            user_id=user_id
+        )
+        if dedup.reuse_if_known(track, saved):
+            code = 201
+        elif limiter.charge_audio(user_id, jobs.audio_seconds(saved)):
+            code = 202
+            queued.append((track, saved.path))
+        else:
+            # Файл без ссылок удалит storage-gc (см. api_upload)
+            results[i] = {"filename": filename_raw, "code": 429, "error": "Audio quota exceeded"}
+            continue
+        tracks.append((i, code, track))
+
+    # Все треки пакета — одной транзакцией
+    db.session.add_all(track for _, _, track in tracks)
+    db.session.commit()
+    for i, code, track in tracks:
+        results[i] = {
+            "filename": track.original_filename,
+            "code": code,
+            "id": track.id,
+            "genre": track.genre,
+            "status": track.status,
+            "status_url": url_for("api.api_track_status", track_id=track.id)
+        }
+
+    jobs.submit_batch([(track.id, path) for track, path in queued], user_id)
+    return jsonify(
+        accepted=len(tracks),
+        rejected=len(results) - len(tracks),
+        results=results
+    ), 202
 
 
 @api_bp.route("/tracks", methods=["GET"])
 @jwt_required()
+@database.replica_reads
 def api_tracks():
-    # Получаем ID текущего пользователя и его треки
+    # Треки текущего пользователя постранично: ?limit=, ?cursor=,
+    # ?fields=id,genre,..., фильтры ?genre=, ?since=, ?until=
     user_id = get_jwt_identity()
-    tracks = Track.query.filter_by(user_id=user_id).all()
+    cached = http_cache.lookup(user_id)
+    if cached is not None:
+        return cached
+    generation = http_cache.generation(user_id)
+    max_limit = current_app.config["TRACKS_MAX_PAGE_SIZE"]
+    limit = request.args.get("limit", current_app.config["TRACKS_PAGE_SIZE"], type=int)
+    if limit < 1:
+        return jsonify(error="limit must be positive"), 400
+
+    try:
+        fields = pagination.parse_fields(request.args.get("fields", ""))
+        query = pagination.filter_tracks(
+            Track.query.filter_by(user_id=user_id), request.args
+        )
+        if "scores" in fields:
+            # Оценки подгружаем одним запросом на страницу, а не на каждый трек
+            query = query.options(db.selectinload(Track.scores))
+        tracks, next_cursor = pagination.paginate_tracks(
+            query, request.args.get("cursor"), min(limit, max_limit)
+        )
+    except pagination.InvalidQuery as e:
+        return jsonify(error=str(e)), 400
 
-    # Формируем список треков для JSON
+    # Страница не изменилась, если те же треки в тех же версиях —
+    # тогда клиенту хватит 304 без сериализации
+    pretty = request.args.get("pretty") == "1"
+    etag = http_cache.etag_for(fields, pretty, next_cursor, [(t.id, t.version) for t in tracks])
+    unchanged = http_cache.not_modified(etag)
+    if unchanged is not None:
+        return unchanged
+
+    # Компактный JSON; ?pretty=1 — с отступами для чтения глазами
     payload = {
-        "tracks": [
-            {
-                "id": t.id,
-                "filename": t.filename,
-                "genre": t.genre,
-                "uploaded_at": t.uploaded_at.isoformat()
-            } for t in tracks
-        ]
+        "tracks": [pagination.serialize(t, fields) for t in tracks],
+        "next_cursor": next_cursor
     }
+    if pretty:
+        body = json.dumps(payload, ensure_ascii=False, indent=2)
+        response = current_app.response_class(body, mimetype="application/json")
+    else:
+        response = jsonify(payload)
+    return http_cache.store(user_id, generation, response, etag)
+
+
+@api_bp.route("/tracks/export", methods=["GET"])
+@jwt_required()
+@database.replica_reads
+def api_tracks_export():
+    # Вся история треков пользователя потоком: ?format=ndjson (по умолчанию) или csv.
+    # Поддерживает те же ?fields= и фильтры, что и список треков
+    user_id = get_jwt_identity()
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify(error="format must be ndjson or csv"), 400
 
-    # Возвращаем красиво отформатированный JSON
-    pretty = json.dumps(payload, ensure_ascii=False, indent=2)
-    return current_app.response_class(pretty, mimetype="application/json")
+    try:
+        fields = pagination.parse_fields(request.args.get("fields", ""))
+        query = pagination.filter_tracks(
+            Track.query.filter_by(user_id=user_id), request.args
+        )
+    except pagination.InvalidQuery as e:
+        return jsonify(error=str(e)), 400
+    if "scores" in fields:
+        query = query.options(db.selectinload(Track.scores))
+
+    # Генератор выполняется уже после возврата из view —
+    # stream_with_context держит контекст запроса и сессию БД открытыми
+    tracks = pagination.iter_tracks(query, current_app.config["EXPORT_BATCH_SIZE"])
+    if fmt == "csv":
+        body, mimetype = pagination.export_csv(tracks, fields), "text/csv"
+    else:
+        body, mimetype = pagination.export_ndjson(tracks, fields), "application/x-ndjson"
+    return current_app.response_class(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=tracks.{fmt}"}
+    )
+
+
+@api_bp.route("/stats", methods=["GET"])
+@jwt_required()
+@database.replica_reads
+def api_stats():
+    # Сводка треков пользователя по жанрам (из материализованной таблицы)
+    user_id = get_jwt_identity()
+    genres = genre_stats.summary(int(user_id))
+    return jsonify(
+        total=sum(g["count"] for g in genres),
+        genres=[
+            dict(
+                g,
+                first_uploaded_at=g["first_uploaded_at"] and g["first_uploaded_at"].isoformat(),
+                last_uploaded_at=g["last_uploaded_at"] and g["last_uploaded_at"].isoformat()
+            )
+            for g in genres
+        ]
+    ), 200
 
 
 @api_bp.route("/tracks/<int:track_id>", methods=["GET"])
 @jwt_required()
+@database.replica_reads
 def api_track_detail(track_id):
     # Ищем конкретный трек пользователя или 404
     user_id = get_jwt_identity()
-    t = Track.query.filter_by(id=track_id, user_id=user_id).first_or_404()
+    cached = http_cache.lookup(user_id)
+    if cached is not None:
+        return cached
+    generation = http_cache.generation(user_id)
+    query = Track.query.filter_by(id=track_id, user_id=user_id)
+    t = query.first()
+    if t is None and database.reading_replica():
+        # Только что загруженный трек мог ещё не дойти до реплики
+        with database.primary():
+            t = query.first()
+    if t is None:
+        abort(404)
+
+    # Клиент уже видел эту версию трека — 304 без чтения оценок
+    cache_control = http_cache.cache_control(t.is_ready)
+    unchanged = http_cache.not_modified(t.etag, t.last_modified, cache_control)
+    if unchanged is not None:
+        return unchanged
 
     # Возвращаем детали трека
-    return jsonify(
+    response = jsonify(
         id=t.id,
         filename=t.filename,
         genre=t.genre,
+        status=t.status,
+        scores=[{"label": s.label, "score": s.score} for s in t.scores],
         uploaded_at=t.uploaded_at.isoformat()
-    ), 200
+    )
+    return http_cache.store(user_id, generation, response, t.etag, t.last_modified, cache_control)
+
+
+AUDIO_MIMETYPES = {".wav": "audio/wav", ".mp3": "audio/mpeg", ".flac": "audio/flac"}
+
+
+@api_bp.route("/tracks/<int:track_id>/audio", methods=["GET"])
+@jwt_required()
+def api_track_audio(track_id):
+    # Аудиофайл трека из хранилища с поддержкой Range (перемотка в плеере,
+    # докачка): читается только запрошенный диапазон байт
+    user_id = get_jwt_identity()
+    t = Track.query.filter_by(id=track_id, user_id=user_id).first_or_404()
+    backend = storage.get_storage()
+    if not backend.exists(t.filename):
+        return jsonify(error="File not found"), 404
+
+    size = backend.size(t.filename)
+    mimetype = AUDIO_MIMETYPES.get(os.path.splitext(t.filename)[1], "application/octet-stream")
+    headers = {"Accept-Ranges": "bytes"}
+    start, length, status = 0, size, 200
+    if request.range is not None:
+        bounds = request.range.range_for_length(size)
+        if bounds is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return current_app.response_class(status=416, headers=headers)
+        start, stop = bounds
+        length, status = stop - start, 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+
+    headers["Content-Length"] = str(length)
+    return current_app.response_class(
+        backend.read_range(t.filename, start, length),
+        status=status,
+        mimetype=mimetype,
+        headers=headers
+    )
+
+
+@api_bp.route("/tracks/<int:track_id>/status", methods=["GET"])
+@jwt_required(optional=True)
+def api_track_status(track_id):
+    # Статус задачи классификации: гость видит только гостевые треки,
+    # пользователь с токеном — только свои
+    user_id = get_jwt_identity()
+    t = Track.query.filter_by(id=track_id, user_id=user_id).first_or_404()
+
+    return jsonify(id=t.id, status=t.status, genre=t.genre), 200
@@ -76,6 +76,9 @@ def login():
         user = User.query.filter_by(email=form.email.data.lower()).first()
         # Проверяем пароль
         if user and user.verify_password(form.password.data):
+            # Параметры хеша сменились — пересчитываем, пока знаем пароль
+            if user.upgrade_password_hash(form.password.data):
+                db.session.commit()
             # Помним пользователя, если стоит флаг remember_me
             login_user(user, remember=form.remember_me.data)
             flash("Вход выполнен успешно.", "success")
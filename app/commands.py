@@ -0,0 +1,443 @@
+import os
+import time
+from collections import Counter
+from functools import partial
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from . import db
+from .models import ClassificationCache, Track, TrackScore
+from .services import classifier, database, dedup, features, genre_stats, inference, jobs, storage
+
+
+@click.command("requeue-jobs")
+@with_appcontext
+def requeue_jobs_command():
+    """
+    Поставить заново в очередь треки, оставшиеся в статусе pending
+    (например, после перезапуска воркеров).
+    """
+    count = jobs.requeue_pending()
+    click.echo(f"В очередь поставлено задач: {count}")
+
+
+@click.command("inference-server")
+@click.option("--workers", type=int, default=None,
+              help="Число процессов с моделью (по умолчанию INFERENCE_POOL_SIZE или 1).")
+@click.option("--address", default=None,
+              help="host:port для подключения веб-воркеров (по умолчанию INFERENCE_SERVER_ADDRESS).")
+@click.option("--warmup-timeout", type=float, default=600,
+              help="Сколько секунд ждать загрузки модели во всех воркерах.")
+@with_appcontext
+def inference_server_command(workers, address, warmup_timeout):
+    """
+    Запустить общий пул процессов инференса с прогретой моделью.
+    Веб-воркеры подключаются к нему по INFERENCE_SERVER_ADDRESS.
+    """
+    cfg = current_app.config
+    workers = workers or cfg["INFERENCE_POOL_SIZE"] or 1
+    address = address or cfg["INFERENCE_SERVER_ADDRESS"] or "127.0.0.1:5055"
+    try:
+        authkey = inference.check_authkey(cfg.get("INFERENCE_AUTHKEY"))
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Загружаем модель в {workers} процесс(ов)...")
+    inference.serve(address, workers, authkey, warmup_timeout)
+
+
+@click.command("eval-windowing")
+@click.argument("paths", nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def eval_windowing_command(paths):
+    """
+    Сравнить классификацию по окнам с классификацией целого файла:
+    доля совпавших жанров и среднее время на файл.
+    """
+    windowed = classifier.settings()
+    full = dict(windowed, WINDOW_COUNT=0)
+
+    def run(settings):
+        classifier.configure(settings)
+        labels, elapsed = [], 0.0
+        for path in paths:
+            started = time.perf_counter()
+            labels.append(classifier.classify_batch_local([path])[0][0]["label"])
+            elapsed += time.perf_counter() - started
+        return labels, elapsed / len(paths)
+
+    try:
+        full_labels, full_time = run(full)
+        win_labels, win_time = run(windowed)
+    finally:
+        classifier.configure(windowed)
+
+    agree = sum(a == b for a, b in zip(full_labels, win_labels))
+    for path, a, b in zip(paths, full_labels, win_labels):
+        mark = "" if a == b else "  <- расхождение"
+        click.echo(f"{path}: целиком={a}, окна={b}{mark}")
+    click.echo(f"Совпадение: {agree}/{len(paths)} ({agree / len(paths):.1%})")
+    click.echo(f"Среднее время: целиком {full_time:.2f} с, окна {win_time:.2f} с")
+
+
+@click.command("build-features")
+@with_appcontext
+def build_features_command():
+    """
+    Заполнить хранилище признаков для всех сохранённых треков,
+    чтобы повторная классификация читала окна, а не декодировала файлы.
+    """
+    if not classifier.FEATURE_DIR or not classifier.WINDOW_COUNT:
+        raise click.ClickException("Хранилище признаков или окна отключены в конфиге")
+
+    rate = classifier.sampling_rate()
+    version = features.version_key(rate, classifier.WINDOW_COUNT, classifier.WINDOW_SECONDS)
+    rows = (
+        db.session.query(Track.content_hash, db.func.min(Track.id))
+        .filter(Track.content_hash.isnot(None))
+        .group_by(Track.content_hash)
+        .all()
+    )
+
+    built = skipped = 0
+    for content_hash, track_id in rows:
+        if features.load(classifier.FEATURE_DIR, version, content_hash) is not None:
+            skipped += 1
+            continue
+        path = jobs.find_upload(db.session.get(Track, track_id))
+        if path and classifier.load_features(path, rate, content_hash):
+            built += 1
+    click.echo(f"Версия {version}: посчитано {built}, уже было {skipped}, всего {len(rows)}")
+
+
+def _classify_one(path, content_hash):
+    try:
+        return classifier.classify_batch_local([path], [content_hash])[0]
+    except Exception:
+        return None
+
+
+def _classify_chunk(rows, batch_size, pool):
+    """
+    Классифицировать файлы одного чанка пачками по batch_size.
+    Одинаковые по содержимому файлы классифицируются один раз.
+    Возвращает {id трека: top-k оценки}; для треков без файла
+    или с ошибкой классификации — None.
+    """
+    by_path, scores = {}, {}
+    for row in rows:
+        path = jobs.find_upload(row)
+        if path is None:
+            scores[row.id] = None
+            continue
+        by_path.setdefault(path, (row.content_hash, []))[1].append(row.id)
+
+    paths = list(by_path)
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    hashes = [[by_path[p][0] for p in batch] for batch in batches]
+    if pool is not None:
+        # Пачки расходятся по процессам пула параллельно
+        outcomes = [pool.submit(classifier.classify_batch_local, b, h).result
+                    for b, h in zip(batches, hashes)]
+    else:
+        outcomes = [partial(classifier.classify_batch_local, b, h)
+                    for b, h in zip(batches, hashes)]
+
+    results = []
+    for batch, batch_hashes, outcome in zip(batches, hashes, outcomes):
+        try:
+            results.append(outcome())
+        except Exception:
+            # Один битый файл не должен валить всю пачку — разбираем поштучно
+            results.append([_classify_one(p, h) for p, h in zip(batch, batch_hashes)])
+
+    for batch, batch_scores in zip(batches, results):
+        for path, track_scores in zip(batch, batch_scores):
+            for track_id in by_path[path][1]:
+                scores[track_id] = track_scores
+    return scores
+
+
+@click.command("reclassify")
+@click.option("--chunk-size", type=int, default=500, show_default=True,
+              help="Сколько треков читать из БД и обновлять за одну транзакцию.")
+@click.option("--batch-size", type=int, default=16, show_default=True,
+              help="Сколько файлов отдавать модели за один прогон.")
+@click.option("--workers", type=int, default=None,
+              help="Число процессов с моделью: каждый держит свою копию модели в памяти "
+                   "(по умолчанию INFERENCE_POOL_SIZE или 1 — без пула).")
+@click.option("--checkpoint", type=click.Path(dir_okay=False), default=None,
+              help="Файл с id последнего обработанного трека (по умолчанию instance/reclassify.checkpoint).")
+@click.option("--resume", is_flag=True,
+              help="Продолжить с id из файла контрольной точки.")
+@with_appcontext
+def reclassify_command(chunk_size, batch_size, workers, checkpoint, resume):
+    """
+    Переклассифицировать все треки (например, после обновления модели).
+    Треки читаются чанками по id (keyset-пагинация), классифицируются
+    пачками в пуле процессов, жанры записываются bulk-UPDATE'ом.
+    Прогресс сохраняется после каждого чанка, прерванный запуск
+    продолжается с --resume. Треки, которые не удалось классифицировать
+    (нет файла, ошибка модели), не меняются и попадут в следующий запуск.
+    """
+    checkpoint = checkpoint or os.path.join(current_app.instance_path, "reclassify.checkpoint")
+    last_id = 0
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            last_id = int(f.read().strip() or 0)
+        click.echo(f"Продолжаем после трека id={last_id}")
+    if last_id == 0:
+        # Новая модель — старые результаты в кэше дедупликации неактуальны
+        ClassificationCache.query.delete()
+        db.session.commit()
+
+    total = Track.query.filter(Track.id > last_id).count()
+    # Не по числу CPU: каждый процесс загружает модель целиком
+    workers = workers or current_app.config["INFERENCE_POOL_SIZE"] or 1
+    pool = None
+    if workers > 1:
+        click.echo(f"Загружаем модель в {workers} процесс(ов)...")
+        pool = inference.start_pool(workers)
+        inference.wait_ready(workers)
+
+    done, skipped, started = 0, 0, time.perf_counter()
+    while True:
+        rows = db.session.execute(
+            db.select(Track.id, Track.filename, Track.user_id, Track.content_hash, Track.genre)
+            .where(Track.id > last_id)
+            .order_by(Track.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        scores = _classify_chunk(rows, batch_size, pool)
+        # Без оценок (нет файла, ошибка) трек не трогаем: его прежний жанр
+        # и оценки остаются, а сам он попадёт в следующий запуск
+        scores = {track_id: s for track_id, s in scores.items() if s is not None}
+        skipped += len(rows) - len(scores)
+        # Bulk UPDATE обходит события ORM — сводку по жанрам правим сами
+        stat_changes = Counter()
+        for row in rows:
+            if row.user_id is None or row.id not in scores:
+                continue
+            new_scores = scores[row.id]
+            stat_changes[(row.user_id, row.genre or genre_stats.PENDING)] -= 1
+            stat_changes[(row.user_id, new_scores[0]["label"] if new_scores else "unknown")] += 1
+        # Bulk UPDATE по первичному ключу и перезапись top-k оценок —
+        # одна транзакция на чанк
+        if scores:
+            db.session.execute(
+                db.update(Track),
+                [
+                    {"id": track_id,
+                     "genre": s[0]["label"] if s else "unknown",
+                     "status": "done" if s else "failed"}
+                    for track_id, s in scores.items()
+                ]
+            )
+            # Bulk UPDATE не вызывает событий ORM — версию (ETag) поднимаем сами
+            db.session.execute(
+                db.update(Track)
+                .where(Track.id.in_(list(scores)))
+                .values(version=Track.version + 1)
+            )
+            db.session.execute(
+                db.delete(TrackScore).where(TrackScore.track_id.in_(list(scores)))
+            )
+            new_scores = [
+                {"track_id": track_id, "rank": i, "label": r["label"], "score": r["score"]}
+                for track_id, s in scores.items() if s
+                for i, r in enumerate(s)
+            ]
+            if new_scores:
+                db.session.execute(db.insert(TrackScore), new_scores)
+            genre_stats.apply_changes(db.session.connection(), stat_changes)
+            db.session.commit()
+
+        last_id = rows[-1].id
+        os.makedirs(os.path.dirname(checkpoint), exist_ok=True)
+        with open(checkpoint, "w") as f:
+            f.write(str(last_id))
+
+        done += len(rows)
+        rate = done / max(time.perf_counter() - started, 1e-9)
+        click.echo(f"{done}/{total} треков ({rate:.1f} треков/с), последний id={last_id}")
+
+    if skipped:
+        click.echo(f"{skipped} треков пропущено (нет файла или ошибка классификации), "
+                   "их жанры не изменены — повторите запуск без --resume")
+    click.echo("Переклассификация завершена")
+
+
+@click.command("export-onnx")
+@click.option("--quantize", is_flag=True,
+              help="Дополнительно применить динамическую int8-квантизацию.")
+@with_appcontext
+def export_onnx_command(quantize):
+    """
+    Экспортировать модель в ONNX в папку ONNX_MODEL_DIR
+    (используется при CLASSIFIER_BACKEND=onnx).
+    """
+    output_dir = current_app.config["ONNX_MODEL_DIR"]
+    classifier.export_onnx(output_dir, quantize)
+    click.echo(f"Модель экспортирована в {output_dir}")
+
+
+@click.command("classifier-parity")
+@click.argument("paths", nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option("--backend", type=click.Choice(classifier.BACKENDS), default="onnx",
+              show_default=True, help="Проверяемый бэкенд.")
+@click.option("--min-agreement", type=float, default=0.95, show_default=True,
+              help="Минимальная доля совпавших жанров с PyTorch.")
+@with_appcontext
+def classifier_parity_command(paths, backend, min_agreement):
+    """
+    Сравнить бэкенд с исходной PyTorch-моделью на наборе файлов:
+    совпадение жанров, расхождение оценок и время на файл.
+    Завершается с ошибкой, если совпадение ниже --min-agreement.
+    """
+    paths = list(paths)
+    outputs, timings = {}, {}
+    for name in ("pytorch", backend):
+        clf = classifier.build_pipeline(name)
+        # Первый прогон — прогрев, в замер не входит
+        classifier.run_pipeline(clf, paths[:1])
+        started = time.perf_counter()
+        outputs[name] = [classifier.run_pipeline(clf, [p])[0] for p in paths]
+        timings[name] = (time.perf_counter() - started) / len(paths)
+
+    report = classifier.parity(outputs["pytorch"], outputs[backend])
+    click.echo(f"Совпадение жанров: {report['agreement']:.1%}")
+    click.echo(f"Макс. расхождение оценки: {report['max_abs_diff']:.4f}")
+    click.echo(f"Время на файл: pytorch {timings['pytorch']:.3f} с, "
+               f"{backend} {timings[backend]:.3f} с")
+    if report["agreement"] < min_agreement:
+        raise click.ClickException("Бэкенд расходится с PyTorch сильнее допустимого")
+
+
+@click.command("genre-stats")
+@click.option("--check", is_flag=True,
+              help="Только сверить сводку с треками, ничего не меняя.")
+@with_appcontext
+def genre_stats_command(check):
+    """
+    Пересобрать сводку по жанрам (UserGenreStat) по таблице треков.
+    С --check выводит расхождения и завершается с ошибкой, если они есть.
+    """
+    if check:
+        mismatches = genre_stats.check()
+        for user_id, genre, stored, expected in mismatches:
+            click.echo(f"user={user_id} genre={genre!r}: в сводке {stored}, по трекам {expected}")
+        if mismatches:
+            raise click.ClickException(f"Расхождений: {len(mismatches)}")
+        click.echo("Сводка по жанрам согласована с треками")
+        return
+    rows = genre_stats.rebuild()
+    click.echo(f"Сводка пересобрана: {rows} строк")
+
+
+@click.command("dedup-stats")
+@with_appcontext
+def dedup_stats_command():
+    """
+    Показать заполненность кэша дедупликации и число попаданий
+    по всем процессам (счётчики хранятся в БД).
+    """
+    totals = dedup.totals()
+    click.echo(f"Записей в кэше: {totals['entries']}, попаданий: {totals['hits']}")
+
+
+@click.command("storage-gc")
+@click.option("--min-age", type=float, default=3600, show_default=True,
+              help="Не трогать файлы моложе стольких секунд.")
+@click.option("--dry-run", is_flag=True, help="Только показать, сколько будет удалено.")
+@with_appcontext
+def storage_gc_command(min_age, dry_run):
+    """
+    Удалить из хранилища загрузок файлы, на которые не ссылается
+    ни один трек, и брошенные временные файлы.
+    """
+    stats = storage.collect_garbage(min_age, dry_run)
+    verb = "Будет удалено" if dry_run else "Удалено"
+    click.echo(
+        f"Проверено файлов: {stats['scanned']}. "
+        f"{verb}: {stats['removed']} ({stats['bytes'] / 1024 / 1024:.1f} МБ)"
+    )
+
+
+# Варианты для flask password-bench по умолчанию: от дешёвых к дорогим
+PASSWORD_BENCH_METHODS = (
+    "pbkdf2:sha256:260000",
+    "pbkdf2:sha256:600000",
+    "pbkdf2:sha256:1000000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+    "scrypt:65536:8:1",
+)
+
+
+@click.command("password-bench")
+@click.option("--method", "methods", multiple=True,
+              help="Алгоритм хеша в формате Werkzeug; можно указать несколько раз.")
+@click.option("--seconds", type=float, default=1.0, help="Сколько секунд мерить каждый вариант.")
+@with_appcontext
+def password_bench_command(methods, seconds):
+    """
+    Замерить скорость проверки пароля (входов в секунду на одно ядро)
+    для разных алгоритмов и стоимости хеша, чтобы выбрать PASSWORD_HASH_METHOD.
+    """
+    from werkzeug.security import check_password_hash, generate_password_hash
+
+    current = current_app.config.get("PASSWORD_HASH_METHOD")
+    methods = methods or tuple(dict.fromkeys(PASSWORD_BENCH_METHODS + (current,)))
+    for method in methods:
+        try:
+            hashed = generate_password_hash("benchmark-password", method=method)
+        except ValueError as e:
+            raise click.ClickException(f"{method}: {e}")
+        count, started = 0, time.perf_counter()
+        while True:
+            check_password_hash(hashed, "benchmark-password")
+            count += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= seconds:
+                break
+        mark = "  <- PASSWORD_HASH_METHOD" if method == current else ""
+        click.echo(f"{method}: {elapsed / count * 1000:.1f} мс/вход, "
+                   f"{count / elapsed:.1f} входов/с{mark}")
+
+
+@click.command("replica-sync")
+@with_appcontext
+def replica_sync_command():
+    """
+    Обновить SQLite-реплики копией основной базы (локальная замена
+    репликации для разработки; реальные реплики не трогаются).
+    """
+    copied = database.copy_sqlite_replicas(current_app._get_current_object())
+    for path in copied:
+        click.echo(f"Реплика обновлена: {path}")
+    if not copied:
+        click.echo("SQLite-реплики не настроены (SQLALCHEMY_REPLICA_URIS)")
+
+
+def register_commands(app):
+    """
+    Регистрирует CLI-команды приложения (flask <command>).
+    """
+    app.cli.add_command(requeue_jobs_command)
+    app.cli.add_command(inference_server_command)
+    app.cli.add_command(eval_windowing_command)
+    app.cli.add_command(build_features_command)
+    app.cli.add_command(reclassify_command)
+    app.cli.add_command(export_onnx_command)
+    app.cli.add_command(classifier_parity_command)
+    app.cli.add_command(genre_stats_command)
+    app.cli.add_command(dedup_stats_command)
+    app.cli.add_command(storage_gc_command)
+    app.cli.add_command(replica_sync_command)
+    app.cli.add_command(password_bench_command)
@@ -15,6 +15,140 @@ class Config:
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "change-me-too")
     # Отключаем лишний overhead отслеживания изменений SQLAlchemy
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Настройка SQLite для параллельной работы воркеров: журнал WAL,
+    # synchronous=NORMAL, ожидание блокировки записи вместо ошибки
+    # "database is locked", mmap и кэш страниц (см. services/database.py)
+    SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "1") == "1"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+    # Пул соединений для PostgreSQL и других серверных СУБД:
+    # постоянные соединения, запас сверх них, пересоздание через
+    # DB_POOL_RECYCLE секунд и проверка соединения перед выдачей
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    # Реплики только для чтения (URI через запятую): страницы статистики,
+    # результата и списки треков API читают с них. После записи
+    # пользователь REPLICA_MAX_LAG секунд читает с основной БД,
+    # чтобы видеть свои изменения несмотря на отставание реплик
+    SQLALCHEMY_REPLICA_URIS = [
+        uri for uri in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if uri
+    ]
+    REPLICA_MAX_LAG = int(os.environ.get("REPLICA_MAX_LAG", 5))
+    # Классификация выполняется в фоне: загрузка сразу отвечает 202,
+    # а жанр проставляется воркером после завершения задачи
+    CLASSIFY_ASYNC = True
+    # Число потоков-воркеров очереди классификации в одном процессе.
+    # Воркеры ждут результат микробатчера, поэтому их должно быть
+    # не меньше размера пачки — иначе пачки не будут набираться
+    CLASSIFY_WORKERS = int(os.environ.get("CLASSIFY_WORKERS", 8))
+    # Микробатчинг: сколько файлов максимум в одной пачке
+    # и сколько миллисекунд ждать попутчиков после первого запроса
+    CLASSIFIER_BATCH_SIZE = int(os.environ.get("CLASSIFIER_BATCH_SIZE", 8))
+    CLASSIFIER_BATCH_WAIT_MS = int(os.environ.get("CLASSIFIER_BATCH_WAIT_MS", 50))
+    # Модель смотрит не на весь трек, а на CLASSIFIER_WINDOWS окон
+    # по CLASSIFIER_WINDOW_SECONDS секунд (начало, середина, конец);
+    # оценки окон усредняются. 0 окон — декодировать файл целиком
+    CLASSIFIER_WINDOWS = int(os.environ.get("CLASSIFIER_WINDOWS", 3))
+    CLASSIFIER_WINDOW_SECONDS = float(os.environ.get("CLASSIFIER_WINDOW_SECONDS", 10))
+    # Сколько лучших жанров с оценками сохранять для каждого трека
+    CLASSIFIER_TOP_K = int(os.environ.get("CLASSIFIER_TOP_K", 5))
+    # Бэкенд инференса: pytorch | quantized (int8) | onnx (ONNX Runtime).
+    # Перед переключением проверьте совпадение: flask classifier-parity
+    CLASSIFIER_BACKEND = os.environ.get("CLASSIFIER_BACKEND", "pytorch")
+    # Папка с экспортированной ONNX-моделью (flask export-onnx)
+    ONNX_MODEL_DIR = os.environ.get(
+        "ONNX_MODEL_DIR",
+        os.path.join(basedir, "..", "instance", "onnx")
+    )
+    # Хранилище признаков: вырезанные окна треков в .npy по хешу содержимого
+    # и версии предобработки — повторная классификация не декодирует файлы
+    FEATURE_CACHE_DIR = os.environ.get(
+        "FEATURE_CACHE_DIR",
+        os.path.join(basedir, "..", "instance", "features")
+    )
+    # Лимиты на загрузку: размер файла в байтах и длительность в секундах.
+    # Проверяются по ходу потоковой записи, тело сверх лимита не дочитывается
+    MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 50 * 1024 * 1024))
+    MAX_UPLOAD_DURATION = int(os.environ.get("MAX_UPLOAD_DURATION", 15 * 60))
+    # Общий лимит тела запроса для Flask/Werkzeug (запас на multipart-заголовки)
+    MAX_CONTENT_LENGTH = MAX_UPLOAD_SIZE + 1024 * 1024
+    # Хранилище загрузок: local (папка UPLOAD_FOLDER) или s3 —
+    # S3-совместимое объектное хранилище (AWS S3, MinIO; нужен boto3).
+    # Для s3 веб-узлы не хранят состояние: файлы для модели скачиваются
+    # в локальный кэш STORAGE_CACHE_DIR
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+    S3_BUCKET = os.environ.get("S3_BUCKET")
+    S3_PREFIX = os.environ.get("S3_PREFIX", "")
+    S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")
+    S3_REGION = os.environ.get("S3_REGION")
+    STORAGE_CACHE_DIR = os.environ.get(
+        "STORAGE_CACHE_DIR",
+        os.path.join(basedir, "..", "instance", "blob-cache")
+    )
+    # Пакетная загрузка (/api/v1/upload/batch): максимум файлов и общий
+    # размер тела запроса, число потоков для параллельной записи файлов
+    UPLOAD_BATCH_MAX_FILES = int(os.environ.get("UPLOAD_BATCH_MAX_FILES", 200))
+    MAX_BATCH_UPLOAD_SIZE = int(os.environ.get("MAX_BATCH_UPLOAD_SIZE", 1024 * 1024 * 1024))
+    UPLOAD_BATCH_WORKERS = int(os.environ.get("UPLOAD_BATCH_WORKERS", 4))
+    # Пул процессов инференса: сколько процессов держат модель в памяти.
+    # 0 — модель загружается прямо в веб-процессе
+    INFERENCE_POOL_SIZE = int(os.environ.get("INFERENCE_POOL_SIZE", 0))
+    # Адрес общего сервера инференса (host:port, см. flask inference-server).
+    # Если задан — все веб-воркеры хоста отправляют файлы туда по IPC,
+    # и модель хранится в памяти только у процессов сервера
+    INFERENCE_SERVER_ADDRESS = os.environ.get("INFERENCE_SERVER_ADDRESS")
+    # Секретный ключ соединения с сервером инференса (общий у сервера и веб-воркеров).
+    # Обязателен с INFERENCE_SERVER_ADDRESS: сервер принимает pickle-сообщения,
+    # поэтому ключ не совпадает с SECRET_KEY и не может быть стандартным
+    INFERENCE_AUTHKEY = os.environ.get("INFERENCE_AUTHKEY")
+    # Прогревать модель при старте приложения, а не на первом запросе
+    INFERENCE_PRELOAD = os.environ.get("INFERENCE_PRELOAD", "0") == "1"
+    # Гостевой лимит: не больше GUEST_LIMIT загрузок с одного IP
+    # за скользящее окно GUEST_LIMIT_WINDOW секунд
+    GUEST_LIMIT = int(os.environ.get("GUEST_LIMIT", 5))
+    GUEST_LIMIT_WINDOW = int(os.environ.get("GUEST_LIMIT_WINDOW", 24 * 60 * 60))
+    # Хранилище счётчиков лимитера: memory (один процесс) или sqlite —
+    # файл RATELIMIT_STORAGE, общий для всех воркеров хоста
+    RATELIMIT_BACKEND = os.environ.get("RATELIMIT_BACKEND", "sqlite")
+    RATELIMIT_STORAGE = os.environ.get(
+        "RATELIMIT_STORAGE",
+        os.path.join(basedir, "..", "instance", "ratelimit.db")
+    )
+    # Квоты зарегистрированных пользователей (0 — без ограничения):
+    # загрузок в минуту и секунд аудио на классификацию в час
+    USER_REQUESTS_PER_MINUTE = int(os.environ.get("USER_REQUESTS_PER_MINUTE", 30))
+    USER_AUDIO_SECONDS_PER_HOUR = int(os.environ.get("USER_AUDIO_SECONDS_PER_HOUR", 4 * 60 * 60))
+    # Размер страницы списка треков в API по умолчанию и максимум для ?limit=
+    TRACKS_PAGE_SIZE = int(os.environ.get("TRACKS_PAGE_SIZE", 50))
+    TRACKS_MAX_PAGE_SIZE = int(os.environ.get("TRACKS_MAX_PAGE_SIZE", 500))
+    # Сколько треков показывать на одной странице /stats
+    STATS_PAGE_SIZE = int(os.environ.get("STATS_PAGE_SIZE", 50))
+    # Сколько строк за раз читать с курсора БД при потоковом экспорте треков
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+    # Алгоритм и стоимость хеша паролей (формат Werkzeug):
+    # "scrypt:N:r:p" или "pbkdf2:sha256:итерации". Проверка пароля — основная
+    # нагрузка на CPU при входе; выбрать стоимость поможет flask password-bench.
+    # При изменении старые хеши пересчитываются при следующем входе
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    # HTTP-кэширование треков: ETag по id и версии трека, 304 Not Modified.
+    # Завершённые треки клиент может не перепроверять HTTP_CACHE_MAX_AGE секунд
+    HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", 60))
+    # Кэш готовых ответов API в памяти процесса (0 — выключен): время жизни
+    # в секундах и максимум ответов. Изменения треков сбрасывают кэш
+    # пользователя в своём процессе, в остальных — через RESPONSE_CACHE_TTL
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 0))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+    # Кэш пользователей для load_user: время жизни записи в секундах
+    # (0 — без кэша) и максимум записей. Изменения пользователя сбрасывают
+    # запись сразу в своём процессе, в остальных — через USER_CACHE_TTL
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 30))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", 10000))
+    # Максимум записей в кэше "хеш содержимого → жанр" (лишние вытесняются по LRU)
+    DEDUP_CACHE_MAX_ENTRIES = int(os.environ.get("DEDUP_CACHE_MAX_ENTRIES", 10000))
 
 
 class DefaultConfig(Config):
@@ -52,3 +186,15 @@ class TestingConfig(Config):
     UPLOAD_FOLDER = os.path.join(basedir, "..", "tests", "tmp_uploads")
     # Тестовый e-mail администратора
     ADMIN_EMAIL = "test@mail.com"
+    # В тестах классифицируем синхронно, чтобы результат был сразу в БД
+    CLASSIFY_ASYNC = False
+    # Признаки в тестах на диск не пишем
+    FEATURE_CACHE_DIR = None
+    # Модель в тестах не загружаем и не выносим в отдельные процессы
+    INFERENCE_POOL_SIZE = 0
+    INFERENCE_SERVER_ADDRESS = None
+    INFERENCE_PRELOAD = False
+    # Дешёвый хеш паролей, чтобы тесты не тратили время на scrypt
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    # Счётчики лимитера — в памяти процесса тестов
+    RATELIMIT_BACKEND = "memory"
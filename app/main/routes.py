@@ -1,14 +1,14 @@
 import os
-import uuid
 from flask import (
     Blueprint, render_template, redirect, url_for,
-    current_app, request, flash, abort
+    current_app, request, flash, abort, make_response, session
 )
 from flask_login import current_user, login_required
 from werkzeug.utils import secure_filename
 
 from ..models import Track
-from ..services.classifier import classify
+from ..services import database, dedup, genre_stats, http_cache, jobs, limiter
+from ..services.uploads import UploadRejected, save_upload
 from ..services.limiter import guest_can_upload
 from .. import db
 from .forms import UploadForm
@@ -18,6 +18,12 @@ from app.services.limiter import reset_guest_limit
 # Создаём blueprint для основного интерфейса
 main_bp = Blueprint("main", __name__)
 
+# Сообщения пользователю при отказе в приёме файла (по HTTP-статусу)
+_REJECT_MESSAGES = {
+    413: "Файл слишком большой или слишком длинный.",
+    415: "Файл не похож на аудио в формате WAV, MP3 или FLAC.",
+}
+
 
 @main_bp.route("/")
 def index():
@@ -32,8 +38,8 @@ def upload():
     """
     Обработка формы загрузки аудио:
     - GET: отрисовать форму.
-    - POST: проверить гостевой лимит, сохранить файл,
-            запустить классификацию, сохранить в БД и редирект на результат.
+    - POST: проверить гостевой лимит, сохранить файл, сохранить в БД,
+            поставить классификацию в очередь и редирект на результат.
     """
     form = UploadForm()
     # Если пользователь залогинен, current_user.is_authenticated==True
@@ -47,44 +53,45 @@ def upload():
                 "warning"
             )
             return redirect(url_for("auth.login"))
+        # У пользователей — квота запросов в минуту
+        if user is not None and not limiter.user_can_request(user.id):
+            flash("Слишком много загрузок подряд. Попробуйте через минуту.", "warning")
+            return render_template("upload.html", form=form, user=user)
 
         f = form.file.data
         # Надёжно очищаем имя файла
         filename_raw = secure_filename(f.filename)
         ext = os.path.splitext(filename_raw)[1].lower()
-        # Генерируем уникальное имя с UUID
-        unique_name = f"{uuid.uuid4().hex}{ext}"
-
-        # Определяем папку для сохранения: по user.id или "guests"
-        upload_folder = current_app.config["UPLOAD_FOLDER"]
-        if user:
-            dest_dir = os.path.join(upload_folder, str(user.id))
-        else:
-            dest_dir = os.path.join(upload_folder, "guests")
-        # Создаём директорию, если её нет
-        os.makedirs(dest_dir, exist_ok=True)
-
-        # Полный путь для сохранения
-        save_path = os.path.join(dest_dir, unique_name)
-        f.save(save_path)
-
-        # Пытаемся классифицировать аудио — на случай ошибок возвращаем "unknown"
+
+        # Файл пишется потоково в хранилище по хешу содержимого
         try:
-            genre = classify(save_path)
-        except Exception:
-            genre = "unknown"
+            saved = save_upload(f.stream, ext)
+        except UploadRejected as e:
+            flash(_REJECT_MESSAGES.get(e.status, e.message), "danger")
+            return render_template("upload.html", form=form, user=user)
 
         # Создаём запись в БД
         track = Track(
-            filename=unique_name,
+            filename=saved.filename,
             original_filename=filename_raw,
-            genre=genre,
+            content_hash=saved.content_hash,
             user_id=user.id if user else None
         )
+        # Если такой файл уже классифицировали — жанр берём из кэша
+        cached = dedup.reuse_if_known(track, saved)
+        # Иначе понадобится модель — списываем секунды аудио с часовой квоты
+        if not cached and user is not None and \
+                not limiter.charge_audio(user.id, jobs.audio_seconds(saved)):
+            # Файл без ссылок удалит storage-gc (см. api.api_upload)
+            flash("Часовая квота на длительность аудио исчерпана.", "warning")
+            return render_template("upload.html", form=form, user=user)
         db.session.add(track)
         db.session.commit()
 
-        # Переадресуем на страницу результата
+        # Иначе ставим классификацию в очередь и сразу переадресуем
+        # на страницу результата (она сама обновляется, пока трек в обработке)
+        if not cached:
+            jobs.submit(track.id, saved.path, track.user_id)
         return redirect(url_for("main.result", track_id=track.id))
 
     # Если пришли GET-запрос или валидация не прошла — рендерим форму
@@ -92,56 +99,88 @@ def upload():
 
 
 @main_bp.route("/result/<int:track_id>")
+@database.replica_reads
 def result(track_id):
     """
     Страница результата классификации.
     Доступна всем пользователям (гостям и залогиненным).
     """
     track = Track.query.get_or_404(track_id)
-    return render_template("result.html", track=track)
+    # Страница зависит от версии трека и от того, кто смотрит (шапка);
+    # неотображённые flash-сообщения показываются один раз — такую не кэшируем
+    if session.get("_flashes"):
+        return render_template("result.html", track=track)
+    # Администратору шапка показывает счётчик гостевого лимитера — он входит
+    # в ETag, а страницу всегда перепроверяем (без max-age)
+    is_admin = current_user.is_authenticated and \
+        current_user.email.lower() == current_app.config["ADMIN_EMAIL"].lower()
+    guest_counter = limiter.guest_usage() if is_admin else None
+    etag = http_cache.etag_for(track.etag, current_user.get_id(), guest_counter)
+    cache_control = http_cache.cache_control(track.is_ready and not is_admin)
+    unchanged = http_cache.not_modified(etag, cache_control=cache_control)
+    if unchanged is not None:
+        return unchanged
+    response = make_response(render_template("result.html", track=track))
+    return http_cache.conditional(response, etag, track.last_modified, cache_control)
 
 
 @main_bp.route("/stats")
 @login_required
+@database.replica_reads
 def stats():
     """
     Страница статистики пользователя:
     - сортировка по имени или дате (параметры ?sort=...&order=...)
-    - группировка по жанрам (?group=1)
+    - группировка по жанрам (?group=1): сводка читается из UserGenreStat,
+      треки жанра загружаются только для раскрытого жанра (?genre=...)
+    - постраничный вывод (?page=N)
     Только для залогиненных.
     """
     sort = request.args.get("sort", "date")
     order = request.args.get("order", "desc")
     group = request.args.get("group", "0") == "1"
+    page = request.args.get("page", 1, type=int)
+    per_page = current_app.config["STATS_PAGE_SIZE"]
 
     # Выбираем колонку для сортировки
     col = Track.original_filename if sort == "name" else Track.uploaded_at
 
     # Определяем направление сортировки и следующий toggle
     if order == "asc":
-        q = current_user.tracks.order_by(col.asc())
+        ordering = col.asc()
         next_order = "desc"
     else:
-        q = current_user.tracks.order_by(col.desc())
+        ordering = col.desc()
         next_order = "asc"
 
-    tracks = q.all()
+    q = db.select(Track).filter_by(user_id=current_user.id)
 
     if group:
-        # Группируем треки по жанру
-        grouped = {}
-        for t in tracks:
-            grouped.setdefault(t.genre, []).append(t)
+        # Сводка по жанрам — из материализованной таблицы, O(жанров) строк
+        summary = genre_stats.summary(current_user.id)
+
+        # Треки раскрытого жанра (пустое значение — ещё не классифицированные)
+        genre = request.args.get("genre")
+        tracks = None
+        if genre is not None:
+            genre_filter = Track.genre == genre if genre else Track.genre.is_(None)
+            tracks = db.paginate(
+                q.where(genre_filter).order_by(ordering),
+                page=page, per_page=per_page, error_out=False
+            )
         return render_template(
             "stats.html",
-            grouped=grouped,
+            summary=summary,
+            genre=genre,
+            tracks=tracks,
             sort=sort,
             order=order,
             next_order=next_order,
             group=True
         )
 
-    # Рендерим без группировки
+    # Рендерим без группировки — одну страницу треков
+    tracks = db.paginate(q.order_by(ordering), page=page, per_page=per_page, error_out=False)
     return render_template(
         "stats.html",
         tracks=tracks,
@@ -175,14 +214,15 @@ def model_info():
 @login_required
 def admin_reset_guest_limit():
     """
-    Роут для сброса гостевого лимита.
+    Роут для сброса гостевого лимита: для всех гостей
+    или только для одного адреса (?ip=...).
     Доступен только администратору (сравниваем email).
     """
     # Проверяем, что текущий пользователь — админ
     if current_user.email.lower() != current_app.config["ADMIN_EMAIL"].lower():
         abort(403)
 
-    # Удаляем ключ лимитера из сессии
-    reset_guest_limit()
+    # Сбрасываем счётчики в общем хранилище лимитера
+    reset_guest_limit(request.args.get("ip"))
     flash("Гостевой лимит загрузок успешно сброшен.", "success")
     return redirect(url_for("main.upload"))
@@ -1,8 +1,32 @@
 from datetime import datetime
+from functools import lru_cache
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app, has_app_context
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
 from . import db
 
+# Алгоритм хеширования паролей по умолчанию (как у Werkzeug)
+DEFAULT_PASSWORD_HASH_METHOD = "scrypt:32768:8:1"
+
+
+def password_hash_method() -> str:
+    """
+    Алгоритм и параметры стоимости хеша паролей из PASSWORD_HASH_METHOD,
+    например "scrypt:32768:8:1" или "pbkdf2:sha256:600000".
+    """
+    if has_app_context():
+        return current_app.config.get("PASSWORD_HASH_METHOD", DEFAULT_PASSWORD_HASH_METHOD)
+    return DEFAULT_PASSWORD_HASH_METHOD
+
+
+@lru_cache(maxsize=None)
+def _hash_prefix(method: str) -> str:
+    # Werkzeug дописывает параметры по умолчанию ("pbkdf2" → "pbkdf2:sha256:1000000"),
+    # поэтому полный префикс хеша узнаём, один раз захешировав пустую строку
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
 
 class User(UserMixin, db.Model):
     """
@@ -14,8 +38,8 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     # Электронная почта, уникальное значение, индекс для быстрого поиска
     email = db.Column(db.String(120), unique=True, index=True, nullable=False)
-    # Хеш пароля (никогда не храним plaintext)
-    password_hash = db.Column(db.String(128), nullable=False)
+    # Хеш пароля (никогда не храним plaintext); формат "метод$соль$хеш"
+    password_hash = db.Column(db.String(255), nullable=False)
     # Дата и время регистрации, по умолчанию — текущее UTC
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
     # Связь "один-ко-многим" с треками пользователя
@@ -32,9 +56,10 @@ class User(UserMixin, db.Model):
     @password.setter
     def password(self, plaintext):
         """
-        При установке password автоматически генерируется и сохраняется хеш.
+        При установке password автоматически генерируется и сохраняется хеш
+        с текущими PASSWORD_HASH_METHOD.
         """
-        self.password_hash = generate_password_hash(plaintext)
+        self.password_hash = generate_password_hash(plaintext, method=password_hash_method())
 
     def verify_password(self, plaintext):
         """
@@ -43,23 +68,154 @@ class User(UserMixin, db.Model):
         """
         return check_password_hash(self.password_hash, plaintext)
 
+    def password_needs_rehash(self):
+        """
+        Хеш посчитан с другим алгоритмом или стоимостью, чем сейчас в конфиге.
+        """
+        return self.password_hash.split("$", 1)[0] != _hash_prefix(password_hash_method())
+
+    def upgrade_password_hash(self, plaintext):
+        """
+        Вызывается после успешного входа, пока известен plaintext:
+        если параметры хеша изменились, перехешировать пароль.
+        Возвращает True, если хеш обновлён (нужен commit).
+        """
+        if not self.password_needs_rehash():
+            return False
+        self.password = plaintext
+        return True
+
 
 class Track(db.Model):
     """
     Модель аудиотрека, загруженного пользователем.
     """
     __tablename__ = "track"
+    # Составные индексы под пути доступа: список/страницы треков пользователя
+    # по дате (keyset по uploaded_at, id), сортировка по имени на /stats
+    # и выборка по жанру
+    __table_args__ = (
+        db.Index("ix_track_user_uploaded", "user_id", "uploaded_at", "id"),
+        db.Index("ix_track_user_filename", "user_id", "original_filename"),
+        db.Index("ix_track_user_genre", "user_id", "genre", "uploaded_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    # Имя файла на диске (UUID + расширение)
+    # Путь к файлу относительно UPLOAD_FOLDER (UUID + расширение)
     filename = db.Column(db.String(255), nullable=False)
+    # SHA-256 содержимого файла — для поиска одинаковых загрузок
+    content_hash = db.Column(db.String(64), index=True, nullable=True)
     # Оригинальное имя файла, какое было у пользователя
     original_filename = db.Column(db.String(255), nullable=False)
-    # Определённый моделью жанр
-    genre = db.Column(db.String(64), nullable=False)
+    # Определённый моделью жанр (пусто, пока задача классификации не выполнена)
+    genre = db.Column(db.String(64), nullable=True)
+    # Статус задачи классификации: pending → done / failed
+    status = db.Column(db.String(16), nullable=False, default="pending")
     # Время загрузки, по умолчанию текущее UTC
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Версия трека: растёт при каждом изменении (классификация, переклассификация).
+    # Вместе с id даёт ETag, updated_at — Last-Modified для HTTP-кэширования
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     # Внешний ключ на пользователя-владельца
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
     # (Опционально) имя файла обложки, если есть
     cover_filename = db.Column(db.String(255), nullable=True)
+    # Top-k жанров с оценками модели (по убыванию оценки)
+    scores = db.relationship(
+        "TrackScore",
+        backref="track",
+        order_by="TrackScore.rank",
+        cascade="all, delete-orphan"
+    )
+
+    @property
+    def etag(self):
+        """
+        Тег версии трека для заголовка ETag.
+        """
+        return f"track-{self.id}-v{self.version}"
+
+    @property
+    def last_modified(self):
+        return self.updated_at or self.uploaded_at
+
+    @property
+    def is_ready(self):
+        """
+        True, если классификация завершена (успешно или с ошибкой).
+        """
+        return self.status != "pending"
+
+    def set_scores(self, scores):
+        """
+        Заменить сохранённые оценки списком [{"label": ..., "score": ...}],
+        отсортированным по убыванию оценки.
+        """
+        self.scores = [
+            TrackScore(rank=i, label=s["label"], score=s["score"])
+            for i, s in enumerate(scores)
+        ]
+
+
+@event.listens_for(Track, "before_update")
+def _bump_track_version(mapper, connection, target):
+    # Срабатывает и когда изменились только оценки (связь scores):
+    # версия растёт атомарно в том же UPDATE
+    if object_session(target).is_modified(target):
+        target.version = Track.version + 1
+
+
+class TrackScore(db.Model):
+    """
+    Оценка одного жанра для трека (top-k распределение модели).
+    Хранится, чтобы менять пороги и строить аналитику без повторного прогона.
+    """
+    __tablename__ = "track_score"
+
+    id = db.Column(db.Integer, primary_key=True)
+    track_id = db.Column(db.Integer, db.ForeignKey("track.id"), index=True, nullable=False)
+    # Позиция в top-k (0 — самый вероятный жанр)
+    rank = db.Column(db.Integer, nullable=False)
+    label = db.Column(db.String(64), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+class ClassificationCache(db.Model):
+    """
+    Кэш результатов классификации по хешу содержимого файла.
+    Повторная загрузка того же файла берёт жанр отсюда и переиспользует
+    уже сохранённый файл вместо нового прогона модели.
+    """
+    __tablename__ = "classification_cache"
+
+    # SHA-256 содержимого
+    content_hash = db.Column(db.String(64), primary_key=True)
+    # Сохранённый файл (путь относительно UPLOAD_FOLDER)
+    filename = db.Column(db.String(255), nullable=False)
+    # Жанр, определённый моделью
+    genre = db.Column(db.String(64), nullable=False)
+    # Top-k оценки в JSON ([{"label": ..., "score": ...}])
+    scores = db.Column(db.Text, nullable=True)
+    # Сколько раз запись переиспользовалась
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    # Время последнего использования — по нему вытесняем (LRU)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class UserGenreStat(db.Model):
+    """
+    Сводка треков пользователя по жанру: обновляется при каждом
+    добавлении/переклассификации трека (см. services/genre_stats),
+    чтобы статистика читала O(жанров) строк, а не все треки.
+    """
+    __tablename__ = "user_genre_stat"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    # Жанр; пустая строка — треки, ещё не прошедшие классификацию
+    genre = db.Column(db.String(64), primary_key=True)
+    # Число треков пользователя в этом жанре
+    count = db.Column(db.Integer, nullable=False, default=0)
+    # Первая и последняя загрузка в жанре
+    first_uploaded_at = db.Column(db.DateTime, nullable=True)
+    last_uploaded_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,92 @@
+# app/services/audio.py
+
+from math import gcd
+
+import numpy as np
+
+# soundfile (libsndfile) умеет seek по WAV/FLAC/MP3 без полного декодирования.
+# Если его нет — окна не режем, и пайплайн декодирует файл целиком
+try:
+    import soundfile as sf
+except ImportError:  # pragma: no cover
+    sf = None
+
+try:
+    from scipy.signal import resample_poly
+except ImportError:  # pragma: no cover
+    resample_poly = None
+
+
+def window_starts(total_frames: int, window_frames: int, count: int) -> list:
+    """
+    Начала count окон, равномерно разнесённых по треку
+    (для трёх окон — начало, середина и конец).
+    Если трек короче суммы окон — одно окно с начала.
+    """
+    if count <= 0:
+        return []
+    if total_frames <= window_frames * count:
+        return [0]
+    if count == 1:
+        return [(total_frames - window_frames) // 2]
+    step = (total_frames - window_frames) / (count - 1)
+    return [int(round(i * step)) for i in range(count)]
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """
+    Передискретизировать моно-сигнал из src_rate в dst_rate.
+    """
+    if src_rate == dst_rate:
+        return samples
+    if resample_poly is not None:
+        g = gcd(src_rate, dst_rate)
+        return resample_poly(samples, dst_rate // g, src_rate // g).astype(np.float32)
+    # Запасной вариант без scipy — линейная интерполяция
+    n_out = int(round(len(samples) * dst_rate / src_rate))
+    x_out = np.linspace(0, len(samples) - 1, n_out)
+    return np.interp(x_out, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def load_windows(path: str, sampling_rate: int, window_seconds: float, count: int):
+    """
+    Декодировать только count окон по window_seconds секунд,
+    перематывая файл к началу каждого окна вместо полного декодирования.
+    Возвращает список моно-массивов float32 с частотой sampling_rate
+    или None, если окна вырезать не удалось (нет soundfile, формат
+    не поддерживает seek) — тогда файл нужно декодировать целиком.
+    """
+    if sf is None or count <= 0:
+        return None
+    try:
+        with sf.SoundFile(path) as f:
+            if not f.seekable() or f.frames <= 0:
+                return None
+            window_frames = int(window_seconds * f.samplerate)
+            windows = []
+            for start in window_starts(f.frames, window_frames, count):
+                f.seek(start)
+                data = f.read(window_frames, dtype="float32", always_2d=True)
+                if not len(data):
+                    continue
+                # Сводим каналы в моно и приводим к частоте модели
+                windows.append(resample(data.mean(axis=1), f.samplerate, sampling_rate))
+    except RuntimeError:
+        return None
+    return windows or None
+
+
+def aggregate_scores(window_results: list) -> list:
+    """
+    Усреднить оценки модели по окнам одного трека.
+    window_results — список ответов пайплайна (по одному на окно),
+    каждый — список {"label", "score"}. Возвращает такой же список,
+    отсортированный по убыванию средней оценки.
+    """
+    totals = {}
+    for results in window_results:
+        for r in results:
+            totals[r["label"]] = totals.get(r["label"], 0.0) + r["score"]
+    n = len(window_results) or 1
+    merged = [{"label": label, "score": total / n} for label, total in totals.items()]
+    return sorted(merged, key=lambda r: r["score"], reverse=True)
@@ -1,16 +1,331 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
 from transformers import pipeline
 
+from . import audio, features
+
+MODEL_NAME = "pedromatias97/genre-recognizer-finetuned-gtzan_dset"
+
+# Параметры микробатчинга (переопределяются из конфига в init_app)
+BATCH_SIZE = 8
+BATCH_WAIT_MS = 50
+# Окна для классификации: сколько окон и какой длины вырезать из трека.
+# WINDOW_COUNT = 0 — отдавать модели файл целиком
+WINDOW_COUNT = 3
+WINDOW_SECONDS = 10.0
+# Папка хранилища признаков (None — не кэшировать окна на диске)
+FEATURE_DIR = None
+# Сколько лучших жанров с оценками возвращать и сохранять
+TOP_K = 5
+# Бэкенд инференса: "pytorch" (исходная модель), "quantized"
+# (динамическая int8-квантизация линейных слоёв) или "onnx" (ONNX Runtime)
+BACKEND = "pytorch"
+# Папка с экспортированной ONNX-моделью (см. flask export-onnx)
+ONNX_DIR = None
+
+BACKENDS = ("pytorch", "quantized", "onnx")
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+
 _classifier = None
+_classifier_lock = threading.Lock()
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+class MicroBatcher:
+    """
+    Собирает одиночные запросы в пачки: ждёт, пока наберётся max_batch_size
+    элементов или пройдёт max_wait_ms с первого запроса, затем выполняет
+    всю пачку одним вызовом run_batch и раздаёт результаты ожидающим.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=50):
+        self._run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._loop, name="classify-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        """
+        Добавить элемент в очередь; результат придёт во Future.
+        """
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _loop(self):
+        while True:
+            # Ждём первый запрос без таймаута, остальные — до дедлайна
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self._run_batch(items)
+        except Exception as exc:
+            # Ошибка пачки достаётся всем её участникам
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+def init_app(app):
+    """
+    Прочитать параметры классификатора из конфига приложения.
+    """
+    configure({
+        "BATCH_SIZE": app.config.get("CLASSIFIER_BATCH_SIZE", BATCH_SIZE),
+        "BATCH_WAIT_MS": app.config.get("CLASSIFIER_BATCH_WAIT_MS", BATCH_WAIT_MS),
+        "WINDOW_COUNT": app.config.get("CLASSIFIER_WINDOWS", WINDOW_COUNT),
+        "WINDOW_SECONDS": app.config.get("CLASSIFIER_WINDOW_SECONDS", WINDOW_SECONDS),
+        "FEATURE_DIR": app.config.get("FEATURE_CACHE_DIR"),
+        "TOP_K": app.config.get("CLASSIFIER_TOP_K", TOP_K),
+        "BACKEND": app.config.get("CLASSIFIER_BACKEND", BACKEND),
+        "ONNX_DIR": app.config.get("ONNX_MODEL_DIR"),
+    })
+
+
+def settings() -> dict:
+    """
+    Текущие параметры классификатора — для передачи в процессы пула,
+    где init_app не вызывается.
+    """
+    return {
+        "BATCH_SIZE": BATCH_SIZE,
+        "BATCH_WAIT_MS": BATCH_WAIT_MS,
+        "WINDOW_COUNT": WINDOW_COUNT,
+        "WINDOW_SECONDS": WINDOW_SECONDS,
+        "FEATURE_DIR": FEATURE_DIR,
+        "TOP_K": TOP_K,
+        "BACKEND": BACKEND,
+        "ONNX_DIR": ONNX_DIR,
+    }
+
+
+def configure(values: dict) -> None:
+    """
+    Установить параметры классификатора (см. settings()).
+    """
+    globals().update(values)
+
+
+def build_pipeline(backend: str):
+    """
+    Собрать пайплайн классификации на заданном бэкенде.
+    ONNX и квантизация требуют optimum[onnxruntime] / torch соответственно
+    и импортируются только при выборе этих бэкендов.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд классификатора: {backend}")
+    if backend == "pytorch":
+        return pipeline("audio-classification", model=MODEL_NAME)
+
+    from transformers import AutoFeatureExtractor
+    feature_extractor = AutoFeatureExtractor.from_pretrained(MODEL_NAME)
+
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForAudioClassification
+        # Берём заранее экспортированную модель (квантованную, если есть),
+        # иначе экспортируем на лету
+        if ONNX_DIR and os.path.exists(os.path.join(ONNX_DIR, "config.json")):
+            quantized = os.path.exists(os.path.join(ONNX_DIR, ONNX_QUANTIZED_FILE))
+            model = ORTModelForAudioClassification.from_pretrained(
+                ONNX_DIR, file_name=ONNX_QUANTIZED_FILE if quantized else None
+            )
+        else:
+            model = ORTModelForAudioClassification.from_pretrained(MODEL_NAME, export=True)
+    else:
+        import torch
+        from transformers import AutoModelForAudioClassification
+        model = AutoModelForAudioClassification.from_pretrained(MODEL_NAME)
+        # Веса Linear-слоёв в int8, активации квантуются на лету
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    return pipeline(
+        "audio-classification",
+        model=model,
+        feature_extractor=feature_extractor
+    )
+
+
+def export_onnx(output_dir: str, quantize: bool = False) -> str:
+    """
+    Экспортировать модель в ONNX (и при quantize — применить динамическую
+    int8-квантизацию ONNX Runtime) в output_dir.
+    """
+    from optimum.onnxruntime import ORTModelForAudioClassification
+
+    model = ORTModelForAudioClassification.from_pretrained(MODEL_NAME, export=True)
+    model.save_pretrained(output_dir)
+    if quantize:
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        quantizer = ORTQuantizer.from_pretrained(output_dir)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        # Сохраняется рядом как model_quantized.onnx и выбирается при загрузке
+        quantizer.quantize(save_dir=output_dir, quantization_config=qconfig)
+    return output_dir
+
 
 def get_classifier():
     global _classifier
-    if _classifier is None:
-        _classifier = pipeline(
-            "audio-classification",
-            model="pedromatias97/genre-recognizer-finetuned-gtzan_dset"
-        )
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = build_pipeline(BACKEND)
     return _classifier
 
-def classify(path: str) -> str:
-    results = get_classifier()(path)
-    return results[0]["label"]
+
+def parity(reference: list, candidate: list) -> dict:
+    """
+    Сравнить выходы двух бэкендов на одних и тех же файлах.
+    reference/candidate — списки top-k оценок по файлам.
+    Возвращает долю совпавших top-1 жанров и максимальное расхождение
+    оценки одного и того же жанра.
+    """
+    agree, max_diff = 0, 0.0
+    for ref, cand in zip(reference, candidate):
+        agree += ref[0]["label"] == cand[0]["label"]
+        cand_scores = {r["label"]: r["score"] for r in cand}
+        for r in ref:
+            if r["label"] in cand_scores:
+                max_diff = max(max_diff, abs(r["score"] - cand_scores[r["label"]]))
+    n = len(reference) or 1
+    return {"agreement": agree / n, "max_abs_diff": max_diff}
+
+
+def sampling_rate() -> int:
+    """
+    Частота дискретизации, которую ждёт модель. Если пайплайн ещё
+    не загружен, читаем только конфиг feature extractor'а, без весов.
+    """
+    if _classifier is not None:
+        return _classifier.feature_extractor.sampling_rate
+    from transformers import AutoFeatureExtractor
+    return AutoFeatureExtractor.from_pretrained(MODEL_NAME).sampling_rate
+
+
+def _get_batcher() -> MicroBatcher:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(_run_queued, BATCH_SIZE, BATCH_WAIT_MS)
+    return _batcher
+
+
+def _run_queued(items: list) -> list:
+    # Элементы очереди микробатчера — пары (путь, хеш содержимого)
+    paths, hashes = zip(*items)
+    return classify_batch(list(paths), list(hashes))
+
+
+def load_features(path: str, sampling_rate: int, content_hash: str = None):
+    """
+    Окна трека для модели: из хранилища признаков, если они там уже
+    есть для текущей версии предобработки, иначе — декодированием файла
+    (с сохранением результата в хранилище).
+    Возвращает список окон или None, если окна вырезать не удалось.
+    """
+    if not WINDOW_COUNT:
+        return None
+    use_store = bool(FEATURE_DIR and content_hash)
+    version = features.version_key(sampling_rate, WINDOW_COUNT, WINDOW_SECONDS)
+    if use_store:
+        windows = features.load(FEATURE_DIR, version, content_hash)
+        if windows is not None:
+            return windows
+
+    windows = audio.load_windows(path, sampling_rate, WINDOW_SECONDS, WINDOW_COUNT)
+    # Окна разной длины (короткий трек) не кэшируем: их дёшево декодировать
+    if windows and use_store and features.is_uniform(windows):
+        features.save(FEATURE_DIR, version, content_hash, windows)
+    return windows
+
+
+def _model_inputs(path: str, sampling_rate: int, content_hash: str = None) -> list:
+    """
+    Входы модели для одного файла: окна или (если окна вырезать
+    не удалось) путь к файлу для полного декодирования.
+    """
+    windows = load_features(path, sampling_rate, content_hash)
+    if not windows:
+        return [path]
+    return [{"raw": w, "sampling_rate": sampling_rate} for w in windows]
+
+
+def classify_batch_local(paths: list, hashes: list = None) -> list:
+    """
+    Классифицировать несколько файлов одним прогоном пайплайна
+    в текущем процессе. Каждый файл режется на окна, оценки окон
+    усредняются. hashes — хеши содержимого (для хранилища признаков).
+    Для каждого файла возвращает top-k [{"label", "score"}] по убыванию.
+    """
+    return run_pipeline(get_classifier(), paths, hashes)
+
+
+def run_pipeline(clf, paths: list, hashes: list = None) -> list:
+    """
+    Прогнать файлы через данный пайплайн (см. classify_batch_local).
+    """
+    sampling_rate = clf.feature_extractor.sampling_rate
+    hashes = hashes or [None] * len(paths)
+
+    inputs, owners = [], []
+    for i, (path, content_hash) in enumerate(zip(paths, hashes)):
+        for item in _model_inputs(path, sampling_rate, content_hash):
+            inputs.append(item)
+            owners.append(i)
+
+    # top_k=None — нужны оценки всех жанров, чтобы усреднять по окнам
+    results = clf(inputs, batch_size=len(inputs), top_k=None)
+    per_file = [[] for _ in paths]
+    for owner, result in zip(owners, results):
+        per_file[owner].append(result)
+    return [audio.aggregate_scores(r)[:TOP_K] for r in per_file]
+
+
+def classify_batch(paths: list, hashes: list = None) -> list:
+    """
+    Классифицировать пачку файлов: в пуле процессов инференса,
+    если он настроен, иначе — в текущем процессе.
+    """
+    from . import inference
+    if inference.is_enabled():
+        return inference.classify_batch(paths, hashes)
+    return classify_batch_local(paths, hashes)
+
+
+def classify_scores(path: str, content_hash: str = None) -> list:
+    """
+    Top-k жанров с оценками для одного файла.
+    """
+    # При BATCH_SIZE > 1 запрос ждёт попутчиков в общей пачке
+    if BATCH_SIZE > 1:
+        return _get_batcher().submit((path, content_hash)).result()
+    return classify_batch([path], [content_hash])[0]
+
+
+def classify(path: str, content_hash: str = None) -> str:
+    return classify_scores(path, content_hash)[0]["label"]
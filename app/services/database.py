@@ -0,0 +1,197 @@
+# app/services/database.py
+
+import functools
+import random
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# Префикс ключей SQLALCHEMY_BINDS для реплик чтения: replica_0, replica_1, ...
+REPLICA_PREFIX = "replica_"
+# Ключ cookie-сессии: до какого времени читать с основной БД
+PRIMARY_UNTIL_KEY = "db_primary_until"
+
+
+def engine_options(config) -> dict:
+    """
+    Параметры движка SQLAlchemy (SQLALCHEMY_ENGINE_OPTIONS) из конфига.
+    Для серверных СУБД (PostgreSQL и т.п.) — размер пула, проверка
+    соединения перед выдачей (pre-ping) и пересоздание старых соединений.
+    Для SQLite пул не настраивается: соединения локальные и дешёвые.
+    Явно заданные в конфиге SQLALCHEMY_ENGINE_OPTIONS имеют приоритет.
+    """
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    uri = config.get("SQLALCHEMY_DATABASE_URI") or ""
+    if uri.startswith("sqlite"):
+        return options
+
+    options.setdefault("pool_size", config.get("DB_POOL_SIZE", 10))
+    options.setdefault("max_overflow", config.get("DB_MAX_OVERFLOW", 20))
+    options.setdefault("pool_recycle", config.get("DB_POOL_RECYCLE", 1800))
+    options.setdefault("pool_pre_ping", config.get("DB_POOL_PRE_PING", True))
+    return options
+
+
+def replica_binds(config) -> dict:
+    """
+    Реплики чтения SQLALCHEMY_REPLICA_URIS как дополнительные движки
+    в SQLALCHEMY_BINDS. Моделей с такими __bind_key__ нет — запросы
+    попадают на реплики только через RoutingSession.
+    """
+    binds = dict(config.get("SQLALCHEMY_BINDS") or {})
+    for i, uri in enumerate(config.get("SQLALCHEMY_REPLICA_URIS") or ()):
+        binds[f"{REPLICA_PREFIX}{i}"] = uri
+    return binds
+
+
+def configure(app):
+    """
+    Дополнить конфиг параметрами движков и репликами.
+    Вызывается до db.init_app — движки создаются сразу при инициализации.
+    """
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(app.config)
+
+
+def sqlite_pragmas(config) -> list:
+    """
+    PRAGMA для каждого нового соединения SQLite:
+    - journal_mode=WAL — читатели не блокируют запись и наоборот;
+    - synchronous=NORMAL — в режиме WAL fsync только при checkpoint,
+      после сбоя питания теряется лишь последняя транзакция, но не целостность;
+    - busy_timeout — ждать освобождения блокировки записи,
+      а не сразу падать с "database is locked";
+    - mmap_size и cache_size — чтение страниц через отображение файла
+      в память и больший кэш страниц (cache_size < 0 — в килобайтах).
+    """
+    return [
+        ("journal_mode", "WAL"),
+        ("synchronous", config.get("SQLITE_SYNCHRONOUS", "NORMAL")),
+        ("busy_timeout", int(config.get("SQLITE_BUSY_TIMEOUT_MS", 5000))),
+        ("mmap_size", int(config.get("SQLITE_MMAP_SIZE", 0))),
+        ("cache_size", -int(config.get("SQLITE_CACHE_SIZE_KB", 2000))),
+    ]
+
+
+def init_app(app):
+    """
+    Подключить к движкам приложения (после db.init_app) настройку SQLite:
+    PRAGMA применяются в событии connect к каждому соединению пула
+    (отключается SQLITE_TUNING = False). Коммиты в запросах закрепляют
+    чтения пользователя за основной БД (см. replica_reads).
+    """
+    from .. import db
+
+    if not event.contains(RoutingSession, "after_commit", _pin_primary):
+        event.listen(RoutingSession, "after_commit", _pin_primary)
+
+    if not app.config.get("SQLITE_TUNING", True):
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", set_pragmas)
+
+
+def replica_engines() -> list:
+    from .. import db
+
+    return [
+        engine for key, engine in db.engines.items()
+        if key and key.startswith(REPLICA_PREFIX)
+    ]
+
+
+def replica_reads(view):
+    """
+    Декоратор представления, которое только читает данные: его запросы
+    идут на реплику. Если пользователь недавно что-то записал
+    (см. _pin_primary), чтение остаётся на основной БД — иначе
+    сразу после загрузки он мог бы не увидеть свой трек на отставшей реплике.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get(PRIMARY_UNTIL_KEY, 0) <= time.time():
+            g.db_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def reading_replica() -> bool:
+    return has_request_context() and g.get("db_replica", False) and bool(replica_engines())
+
+
+@contextmanager
+def primary():
+    """
+    Временно читать с основной БД внутри представления на реплике
+    (например, повторить поиск объекта, которого на реплике ещё нет).
+    """
+    previous = g.get("db_replica", False)
+    g.db_replica = False
+    try:
+        yield
+    finally:
+        g.db_replica = previous
+
+
+def _pin_primary(db_session):
+    # После записи в запросе закрепляем чтения пользователя за основной БД
+    # на время максимального отставания реплик (read-your-writes)
+    if not has_request_context() or not current_app.config.get("SQLALCHEMY_REPLICA_URIS"):
+        return
+    g.db_replica = False
+    session[PRIMARY_UNTIL_KEY] = time.time() + current_app.config.get("REPLICA_MAX_LAG", 5)
+
+
+class RoutingSession(Session):
+    """
+    Сессия, отправляющая чтения представлений с replica_reads на случайную
+    реплику. Запись (flush, INSERT/UPDATE/DELETE) и всё остальное —
+    на основную БД.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing
+                and not getattr(clause, "is_dml", False)
+                and not (self.new or self.dirty or self.deleted)
+                and reading_replica()):
+            return random.choice(replica_engines())
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def copy_sqlite_replicas(app) -> list:
+    """
+    Локальная замена репликации для разработки и тестов: скопировать
+    файл основной SQLite-базы в файлы реплик через backup API
+    (согласованный снимок без остановки записи).
+    Возвращает пути обновлённых реплик.
+    """
+    from .. import db
+
+    copied = []
+    with app.app_context():
+        source = db.engine.url.database
+        for engine in replica_engines():
+            if engine.dialect.name != "sqlite" or not engine.url.database:
+                continue
+            engine.dispose()
+            with closing(sqlite3.connect(source)) as src, \
+                    closing(sqlite3.connect(engine.url.database)) as dst:
+                src.backup(dst)
+            copied.append(engine.url.database)
+    return copied
@@ -0,0 +1,135 @@
+# app/services/dedup.py
+
+import json
+import threading
+from datetime import datetime
+
+from flask import current_app
+
+from . import storage
+
+# Счётчики попаданий/промахов кэша в текущем процессе
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def stats() -> dict:
+    """
+    Снимок счётчиков кэша текущего процесса: {"hits": ..., "misses": ...}.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def totals() -> dict:
+    """
+    Сводка по кэшу из БД, общая для всех процессов:
+    {"entries": число записей, "hits": сумма попаданий}.
+    """
+    from .. import db
+    from ..models import ClassificationCache
+
+    entries, hits = db.session.query(
+        db.func.count(ClassificationCache.content_hash),
+        db.func.coalesce(db.func.sum(ClassificationCache.hits), 0),
+    ).one()
+    return {"entries": entries, "hits": hits}
+
+
+def lookup(content_hash: str):
+    """
+    Найти результат классификации для файла с таким же содержимым.
+    Возвращает запись ClassificationCache или None.
+    Изменения (счётчик, время использования) сохраняются вместе
+    со следующим commit вызывающего кода.
+    """
+    from .. import db
+    from ..models import ClassificationCache
+
+    entry = db.session.get(ClassificationCache, content_hash)
+    if entry is not None and not storage.get_storage().exists(entry.filename):
+        # Файл удалён из хранилища — запись больше не годится
+        db.session.delete(entry)
+        entry = None
+
+    if entry is None:
+        _count("misses")
+        return None
+
+    entry.hits += 1
+    entry.last_used_at = datetime.utcnow()
+    _count("hits")
+    return entry
+
+
+def remember(content_hash: str, filename: str, genre: str, scores: list = None) -> None:
+    """
+    Запомнить жанр (и top-k оценки) и сохранённый файл для данного хеша
+    содержимого; при добавлении новой записи вытеснить самые давно
+    использованные записи сверх лимита.
+    """
+    from .. import db
+    from ..models import ClassificationCache
+
+    entry = db.session.get(ClassificationCache, content_hash)
+    created = entry is None
+    if created:
+        entry = ClassificationCache(content_hash=content_hash)
+        db.session.add(entry)
+    entry.filename = filename
+    entry.genre = genre
+    entry.scores = json.dumps(scores) if scores else None
+    entry.last_used_at = datetime.utcnow()
+    db.session.flush()
+    # Число записей растёт только при вставке — COUNT(*) по кэшу
+    # нужен лишь тогда, а не при каждом обновлении существующей записи
+    if created:
+        _evict()
+
+
+def _evict() -> None:
+    from .. import db
+    from ..models import ClassificationCache
+
+    limit = current_app.config.get("DEDUP_CACHE_MAX_ENTRIES", 10000)
+    overflow = ClassificationCache.query.count() - limit
+    if overflow <= 0:
+        return
+
+    # LRU: удаляем записи с самым старым last_used_at
+    stale = (
+        db.session.query(ClassificationCache.content_hash)
+        .order_by(ClassificationCache.last_used_at.asc())
+        .limit(overflow)
+        .subquery()
+    )
+    ClassificationCache.query.filter(
+        ClassificationCache.content_hash.in_(db.select(stale))
+    ).delete(synchronize_session=False)
+
+
+def reuse_if_known(track, saved) -> bool:
+    """
+    Если файл с таким же содержимым уже классифицирован — проставить треку
+    жанр из кэша без прогона модели. Файл в хранилище адресуется хешем,
+    поэтому трек ссылается на тот же файл, что и прежние загрузки.
+    Возвращает True при попадании в кэш.
+    """
+    entry = lookup(saved.content_hash)
+    if entry is None:
+        return False
+
+    # Старые записи кэша могут указывать на файл в прежней раскладке —
+    # переводим их на адрес по хешу
+    entry.filename = saved.filename
+    track.filename = saved.filename
+    track.genre = entry.genre
+    track.status = "done"
+    if entry.scores:
+        track.set_scores(json.loads(entry.scores))
+    return True
@@ -0,0 +1,71 @@
+# app/services/features.py
+
+import os
+import uuid
+
+import numpy as np
+
+# Версия кода предобработки: увеличить при изменении нарезки окон,
+# передискретизации и т.п., чтобы старые признаки не использовались.
+# 2 — окна разной длины больше не обрезаются при сохранении
+PREPROCESS_VERSION = 2
+
+
+def version_key(sampling_rate: int, window_count: int, window_seconds: float) -> str:
+    """
+    Ключ версии предобработки: признаки, посчитанные с другими
+    параметрами окон или частотой, лежат в отдельной папке.
+    """
+    return f"v{PREPROCESS_VERSION}-sr{sampling_rate}-w{window_count}x{window_seconds:g}s"
+
+
+def feature_path(root: str, version: str, content_hash: str) -> str:
+    """
+    Путь к файлу признаков: <root>/<version>/<ab>/<hash>.npy
+    (шардирование по первым символам хеша, чтобы не раздувать папки).
+    """
+    return os.path.join(root, version, content_hash[:2], f"{content_hash}.npy")
+
+
+def load(root: str, version: str, content_hash: str):
+    """
+    Прочитать окна трека из хранилища признаков.
+    Файл отображается в память (mmap) — данные читаются с диска
+    только по мере обращения. Возвращает список окон или None.
+    """
+    path = feature_path(root, version, content_hash)
+    try:
+        windows = np.load(path, mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        return None
+    return list(windows)
+
+
+def is_uniform(windows: list) -> bool:
+    """
+    Все окна одной длины — их можно хранить одним массивом.
+    У треков короче окон последнее окно бывает короче остальных.
+    """
+    return bool(windows) and len({len(w) for w in windows}) == 1
+
+
+def save(root: str, version: str, content_hash: str, windows: list) -> str:
+    """
+    Сохранить окна трека одним массивом (окна × сэмплы) в формате .npy.
+    Окна должны быть одной длины (см. is_uniform): из кэша модель должна
+    получить ровно то же, что при декодировании файла, поэтому окна
+    не обрезаются и не дополняются — иначе ValueError.
+    Запись атомарная: сначала во временный файл, затем переименование.
+    """
+    if not is_uniform(windows):
+        raise ValueError("Окна разной длины нельзя сохранить одним массивом")
+    path = feature_path(root, version, content_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    data = np.stack([np.asarray(w, dtype=np.float32) for w in windows])
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,169 @@
+# app/services/genre_stats.py
+
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+# Ключ жанра в сводке для ещё не классифицированных треков (genre IS NULL)
+PENDING = ""
+
+
+def init_app(app):
+    """
+    Подписаться на flush сессий: сводка по жанрам обновляется
+    в той же транзакции, что и сами треки.
+    """
+    if not event.contains(Session, "after_flush", _track_changes):
+        event.listen(Session, "after_flush", _track_changes)
+
+
+def _key(user_id, genre):
+    return user_id, genre if genre is not None else PENDING
+
+
+def _track_changes(session, flush_context):
+    # Изменения уже записаны, но история атрибутов ещё доступна —
+    # по ней считаем, на сколько изменилось число треков в каждом жанре
+    from ..models import Track
+
+    changes = Counter()
+    for obj in session.new:
+        if isinstance(obj, Track) and obj.user_id is not None:
+            changes[_key(obj.user_id, obj.genre)] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Track) and obj.user_id is not None:
+            changes[_key(obj.user_id, obj.genre)] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Track):
+            continue
+        genre = attributes.get_history(obj, "genre")
+        owner = attributes.get_history(obj, "user_id")
+        if not (genre.has_changes() or owner.has_changes()):
+            continue
+        old_user = owner.deleted[0] if owner.deleted else obj.user_id
+        old_genre = genre.deleted[0] if genre.deleted else obj.genre
+        if old_user is not None:
+            changes[_key(old_user, old_genre)] -= 1
+        if obj.user_id is not None:
+            changes[_key(obj.user_id, obj.genre)] += 1
+
+    if changes:
+        apply_changes(session.connection(), changes)
+
+
+def apply_changes(connection, changes: Counter) -> None:
+    """
+    Применить к сводке изменения {(user_id, жанр): ±число треков}.
+    Счётчик меняется атомарным UPDATE count = count + delta; границы
+    дат пересчитываются по индексу (user_id, genre, uploaded_at) —
+    это два поиска по B-дереву, а не просмотр треков пользователя.
+    Вызывается из события flush и явно из bulk-операций
+    (например, flask reclassify), которые события ORM обходят.
+    """
+    from .. import db
+    from ..models import Track, UserGenreStat
+
+    stat = UserGenreStat.__table__
+    for (user_id, genre), delta in changes.items():
+        if not delta:
+            continue
+        genre_filter = Track.genre.is_(None) if genre == PENDING else Track.genre == genre
+        bounds = db.select(
+            db.func.min(Track.uploaded_at), db.func.max(Track.uploaded_at)
+        ).where(Track.user_id == user_id, genre_filter)
+        first, last = connection.execute(bounds).one()
+
+        updated = connection.execute(
+            stat.update()
+            .where(stat.c.user_id == user_id, stat.c.genre == genre)
+            .values(count=stat.c.count + delta,
+                    first_uploaded_at=first,
+                    last_uploaded_at=last)
+        )
+        if updated.rowcount == 0 and delta > 0:
+            connection.execute(stat.insert().values(
+                user_id=user_id, genre=genre, count=delta,
+                first_uploaded_at=first, last_uploaded_at=last
+            ))
+
+    # Жанры, в которых не осталось треков, убираем из сводки
+    connection.execute(stat.delete().where(stat.c.count <= 0))
+
+
+def summary(user_id: int) -> list:
+    """
+    Сводка пользователя по жанрам: строки UserGenreStat по алфавиту
+    (жанр None — ещё не классифицированные треки).
+    """
+    from ..models import UserGenreStat
+
+    rows = (
+        UserGenreStat.query
+        .filter_by(user_id=user_id)
+        .order_by(UserGenreStat.genre)
+        .all()
+    )
+    return [
+        {
+            "genre": row.genre if row.genre != PENDING else None,
+            "count": row.count,
+            "first_uploaded_at": row.first_uploaded_at,
+            "last_uploaded_at": row.last_uploaded_at,
+        }
+        for row in rows
+    ]
+
+
+def _computed():
+    # Эталонная сводка, посчитанная GROUP BY по трекам
+    from .. import db
+    from ..models import Track
+
+    rows = db.session.execute(
+        db.select(
+            Track.user_id, Track.genre, db.func.count(Track.id),
+            db.func.min(Track.uploaded_at), db.func.max(Track.uploaded_at)
+        )
+        .where(Track.user_id.isnot(None))
+        .group_by(Track.user_id, Track.genre)
+    ).all()
+    return {_key(u, g): (c, first, last) for u, g, c, first, last in rows}
+
+
+def check() -> list:
+    """
+    Сравнить сводку с пересчётом по трекам.
+    Возвращает список расхождений (user_id, жанр, в сводке, по трекам).
+    """
+    from ..models import UserGenreStat
+
+    expected = _computed()
+    stored = {
+        (row.user_id, row.genre): (row.count, row.first_uploaded_at, row.last_uploaded_at)
+        for row in UserGenreStat.query.all()
+    }
+    mismatches = []
+    for user_id, genre in sorted(set(expected) | set(stored), key=str):
+        have, want = stored.get((user_id, genre)), expected.get((user_id, genre))
+        if have != want:
+            mismatches.append((user_id, genre, have, want))
+    return mismatches
+
+
+def rebuild() -> int:
+    """
+    Пересобрать сводку целиком по трекам. Возвращает число строк.
+    """
+    from .. import db
+    from ..models import UserGenreStat
+
+    expected = _computed()
+    UserGenreStat.query.delete()
+    db.session.add_all(
+        UserGenreStat(user_id=user_id, genre=genre, count=count,
+                      first_uploaded_at=first, last_uploaded_at=last)
+        for (user_id, genre), (count, first, last) in expected.items()
+    )
+    db.session.commit()
+    return len(expected)
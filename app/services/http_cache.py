@@ -0,0 +1,216 @@
+# app/services/http_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timezone
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Закэшированный ответ: поколение треков пользователя на момент записи,
+# момент истечения, ETag, Last-Modified, тело, тип и Cache-Control
+CachedResponse = namedtuple(
+    "CachedResponse", "generation expires etag last_modified body mimetype cache_control"
+)
+
+# Время жизни ответа в кэше процесса, секунды (0 — кэш выключен),
+# и максимум ответов (лишние вытесняются по LRU)
+TTL = 0
+MAX_ENTRIES = 1000
+# max-age для завершённых треков: переклассификация редка,
+# клиент может не перепроверять трек столько секунд
+MAX_AGE = 60
+
+# (user_id, URL) → CachedResponse
+_entries = OrderedDict()
+# user_id → поколение: растёт при любом изменении треков пользователя,
+# ответы старого поколения считаются недействительными
+_generations = {}
+_lock = threading.Lock()
+# Ключ session.info: пользователи, чьи треки изменены в текущей транзакции
+_CHANGED_KEY = "http_cache_changed"
+
+
+def init_app(app):
+    """
+    Прочитать настройки из конфига и подписаться на изменения треков:
+    кэш пользователя сбрасывается при flush и ещё раз после commit.
+    Кэш ответов — в памяти процесса: изменения, сделанные другими
+    процессами (например, flask reclassify), видны только через TTL.
+    """
+    global TTL, MAX_ENTRIES, MAX_AGE
+    TTL = app.config.get("RESPONSE_CACHE_TTL", TTL)
+    MAX_ENTRIES = app.config.get("RESPONSE_CACHE_MAX_ENTRIES", MAX_ENTRIES)
+    MAX_AGE = app.config.get("HTTP_CACHE_MAX_AGE", MAX_AGE)
+
+    if not event.contains(Session, "after_flush", _tracks_flushed):
+        event.listen(Session, "after_flush", _tracks_flushed)
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_soft_rollback", _after_rollback)
+
+
+def _tracks_flushed(session, flush_context):
+    from ..models import Track
+
+    users = {
+        obj.user_id
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, Track) and obj.user_id is not None
+    }
+    if users:
+        invalidate_users(users)
+        session.info.setdefault(_CHANGED_KEY, set()).update(users)
+
+
+def _after_commit(session):
+    users = session.info.pop(_CHANGED_KEY, None)
+    if users:
+        invalidate_users(users)
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+def invalidate_users(user_ids) -> None:
+    """
+    Сбросить закэшированные ответы пользователей (поднять их поколение).
+    """
+    with _lock:
+        for user_id in user_ids:
+            user_id = int(user_id)
+            _generations[user_id] = _generations.get(user_id, 0) + 1
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def etag_for(*parts) -> str:
+    """
+    ETag по составным частям представления (id и версии треков,
+    параметры запроса): короткий хеш от их repr.
+    """
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def _http_date(value):
+    # Время в БД — наивное UTC; HTTP-даты с точностью до секунды
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def is_fresh(etag: str, last_modified=None) -> bool:
+    """
+    Копия клиента актуальна: If-None-Match совпал с etag или
+    (без If-None-Match) ресурс не менялся после If-Modified-Since.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    last_modified = _http_date(last_modified)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def _apply_headers(response, etag, last_modified, cache_control):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _http_date(last_modified)
+    response.headers["Cache-Control"] = cache_control
+    # Ответы зависят от пользователя: токена в API или cookie-сессии на страницах
+    response.vary.update(("Authorization", "Cookie"))
+    return response
+
+
+def cache_control(ready: bool = True) -> str:
+    """
+    Cache-Control для личных данных: завершённые треки — max-age,
+    ожидающие классификации и списки — всегда перепроверять (no-cache).
+    """
+    if ready and MAX_AGE:
+        return f"private, max-age={MAX_AGE}"
+    return "private, no-cache"
+
+
+def not_modified(etag: str, last_modified=None, cache_control: str = "private, no-cache"):
+    """
+    Готовый ответ 304 Not Modified, если копия клиента актуальна, иначе None.
+    Проверяется до построения тела, чтобы не сериализовать данные зря.
+    """
+    if not is_fresh(etag, last_modified):
+        return None
+    response = current_app.response_class(status=304)
+    return _apply_headers(response, etag, last_modified, cache_control)
+
+
+def conditional(response, etag: str, last_modified=None, cache_control: str = "private, no-cache"):
+    """
+    Проставить ETag, Last-Modified, Cache-Control и Vary ответу 200.
+    """
+    return _apply_headers(response, etag, last_modified, cache_control)
+
+
+def cache_key(user_id):
+    return int(user_id), request.full_path
+
+
+def lookup(user_id):
+    """
+    Ответ из кэша процесса для текущего URL пользователя
+    (304, если у клиента та же версия) или None.
+    """
+    if not TTL:
+        return None
+    key = cache_key(user_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry.expires <= now \
+                or entry.generation != _generations.get(key[0], 0):
+            _entries.pop(key, None)
+            return None
+        _entries.move_to_end(key)
+
+    cached = not_modified(entry.etag, entry.last_modified, entry.cache_control)
+    if cached is not None:
+        return cached
+    response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+    return conditional(response, entry.etag, entry.last_modified, entry.cache_control)
+
+
+def store(user_id, generation: int, response, etag: str, last_modified=None,
+          cache_control: str = "private, no-cache"):
+    """
+    Запомнить ответ 200 для текущего URL пользователя.
+    generation — поколение, взятое через generation() до чтения из БД:
+    если треки изменились во время запроса, ответ сразу устареет.
+    Ответы, прочитанные с реплики, не запоминаются: отставшая реплика
+    может отдать данные старше текущего поколения.
+    """
+    from . import database
+
+    conditional(response, etag, last_modified, cache_control)
+    if not TTL or response.status_code != 200 or database.reading_replica():
+        return response
+    key = cache_key(user_id)
+    entry = CachedResponse(
+        generation, time.monotonic() + TTL, etag, last_modified,
+        response.get_data(), response.mimetype, cache_control
+    )
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return response
+
+
+def generation(user_id) -> int:
+    with _lock:
+        return _generations.get(int(user_id), 0)
@@ -0,0 +1,274 @@
+# app/services/inference.py
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.managers import BaseManager
+
+from . import classifier
+
+logger = logging.getLogger(__name__)
+
+# Параметры (переопределяются из конфига в init_app)
+POOL_SIZE = 0
+SERVER_ADDRESS = None
+AUTHKEY = b""
+
+# Локальный пул процессов и множество PID прогретых воркеров
+_pool = None
+_warm_pids = set()
+_lock = threading.Lock()
+
+# Клиент общего сервера инференса
+_remote = None
+
+# Ключи, которые нельзя использовать для сервера инференса: менеджер
+# принимает от клиентов pickle, и знающий ключ может выполнить код на сервере
+_INSECURE_AUTHKEYS = {"", "change-me", "change-me-too"}
+# Ошибки соединения с сервером инференса (перезапуск, обрыв сети)
+_CONNECTION_ERRORS = (ConnectionError, EOFError, OSError)
+
+
+class InferenceManager(BaseManager):
+    """
+    Менеджер multiprocessing, через который сервер инференса
+    публикует пул процессов.
+    """
+
+
+class _ClientManager(BaseManager):
+    """
+    Клиентская сторона: веб-воркеры подключаются к серверу инференса.
+    """
+
+
+_ClientManager.register("service")
+
+
+def _parse_address(address: str):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _warm_worker(settings):
+    # Initializer процесса пула: применяем параметры классификатора
+    # из родительского процесса и один раз загружаем модель
+    classifier.configure(settings)
+    classifier.get_classifier()
+
+
+def _ping():
+    return os.getpid()
+
+
+def check_authkey(value) -> bytes:
+    """
+    Ключ аутентификации сервера инференса из INFERENCE_AUTHKEY.
+    Отдельный от SECRET_KEY; пустой или стандартный ключ — RuntimeError.
+    """
+    if value is None or value in _INSECURE_AUTHKEYS:
+        raise RuntimeError(
+            "Задайте INFERENCE_AUTHKEY — отдельный секретный ключ сервера инференса"
+        )
+    return value.encode() if isinstance(value, str) else value
+
+
+def init_app(app):
+    """
+    Прочитать настройки пула из конфига и при INFERENCE_PRELOAD
+    прогреть модель в фоне, не задерживая старт приложения.
+    С INFERENCE_SERVER_ADDRESS без надёжного INFERENCE_AUTHKEY
+    приложение не запускается.
+    """
+    global POOL_SIZE, SERVER_ADDRESS, AUTHKEY
+    POOL_SIZE = app.config.get("INFERENCE_POOL_SIZE", 0)
+    SERVER_ADDRESS = app.config.get("INFERENCE_SERVER_ADDRESS")
+    AUTHKEY = check_authkey(app.config.get("INFERENCE_AUTHKEY")) if SERVER_ADDRESS else b""
+
+    if app.config.get("INFERENCE_PRELOAD"):
+        threading.Thread(target=preload, name="inference-preload", daemon=True).start()
+
+
+def is_enabled() -> bool:
+    """
+    True, если инференс выносится из веб-процесса
+    (в общий сервер или в локальный пул процессов).
+    """
+    return bool(SERVER_ADDRESS or POOL_SIZE)
+
+
+def start_pool(size: int) -> ProcessPoolExecutor:
+    """
+    Запустить пул из size процессов, каждый из которых загружает модель.
+    Используется spawn: форк процесса с загруженным torch небезопасен.
+    Новый пул прогревается в фоне (см. wait_ready), поэтому и пул,
+    запущенный лениво первым запросом, со временем становится готовым
+    для /api/v1/health.
+    """
+    global _pool
+    with _lock:
+        if _pool is not None:
+            return _pool
+        _pool = ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=get_context("spawn"),
+            initializer=_warm_worker,
+            initargs=(classifier.settings(),)
+        )
+    threading.Thread(target=_warm_pool, args=(size,), name="inference-warmup", daemon=True).start()
+    return _pool
+
+
+def _warm_pool(size: int) -> None:
+    try:
+        wait_ready(size)
+    except Exception:
+        logger.exception("Не удалось прогреть пул инференса")
+
+
+def wait_ready(size: int, timeout: float = None) -> bool:
+    """
+    Дождаться, пока все size воркеров пула загрузят модель.
+    Задача-пинг выполняется только после initializer, поэтому ответ
+    воркера означает, что модель в нём уже прогрета.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        futures = [_pool.submit(_ping) for _ in range(size)]
+        for f in futures:
+            left = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                pid = f.result(timeout=left)
+            except TimeoutError:
+                return False
+            with _lock:
+                _warm_pids.add(pid)
+        if len(_warm_pids) >= size:
+            logger.info("Пул инференса прогрет: %s воркеров", size)
+            return True
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+
+
+def preload() -> None:
+    """
+    Прогреть модель заранее, чтобы первый запрос не платил за загрузку.
+    """
+    try:
+        if SERVER_ADDRESS:
+            _call_remote("status")
+        elif POOL_SIZE:
+            start_pool(POOL_SIZE)
+            wait_ready(POOL_SIZE)
+        else:
+            classifier.get_classifier()
+            logger.info("Модель загружена в веб-процессе")
+    except Exception:
+        logger.exception("Не удалось прогреть модель")
+
+
+def status() -> dict:
+    """
+    Состояние инференса: режим, число воркеров и прогрета ли модель.
+    """
+    if SERVER_ADDRESS:
+        try:
+            return dict(_call_remote("status"), mode="server")
+        except Exception:
+            return {"mode": "server", "ready": False, "workers": 0}
+    if POOL_SIZE:
+        return {
+            "mode": "pool",
+            "ready": len(_warm_pids) >= POOL_SIZE,
+            "workers": len(_warm_pids),
+        }
+    return {
+        "mode": "local",
+        "ready": classifier._classifier is not None,
+        "workers": 1,
+    }
+
+
+def classify_batch(paths: list, hashes: list = None) -> list:
+    """
+    Классифицировать пачку в общем сервере или в локальном пуле процессов.
+    """
+    if SERVER_ADDRESS:
+        return _call_remote("classify_batch", paths, hashes)
+    pool = start_pool(POOL_SIZE)
+    return pool.submit(classifier.classify_batch_local, paths, hashes).result()
+
+
+def _get_remote():
+    global _remote
+    with _lock:
+        if _remote is None:
+            manager = _ClientManager(_parse_address(SERVER_ADDRESS), AUTHKEY)
+            manager.connect()
+            # Прокси держит отдельное соединение на каждый поток
+            _remote = manager.service()
+    return _remote
+
+
+def _drop_remote(proxy) -> None:
+    global _remote
+    with _lock:
+        if _remote is proxy:
+            _remote = None
+
+
+def _call_remote(method: str, *args):
+    """
+    Вызвать метод сервера инференса. При обрыве соединения (например,
+    сервер перезапустили) прокси сбрасывается и вызов повторяется
+    один раз через новое подключение.
+    """
+    proxy = _get_remote()
+    try:
+        return getattr(proxy, method)(*args)
+    except _CONNECTION_ERRORS:
+        logger.warning("Соединение с сервером инференса потеряно, переподключаемся")
+        _drop_remote(proxy)
+    proxy = _get_remote()
+    try:
+        return getattr(proxy, method)(*args)
+    except _CONNECTION_ERRORS:
+        _drop_remote(proxy)
+        raise
+
+
+class _Service:
+    """
+    Объект, который сервер инференса отдаёт клиентам через менеджер.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def classify_batch(self, paths, hashes=None):
+        return _pool.submit(classifier.classify_batch_local, paths, hashes).result()
+
+    def status(self):
+        return {"ready": len(_warm_pids) >= self._size, "workers": len(_warm_pids)}
+
+
+def serve(address: str, size: int, authkey: bytes, timeout: float = None):
+    """
+    Запустить общий сервер инференса: пул из size прогретых процессов,
+    доступный веб-воркерам по IPC на address (host:port).
+    Блокирует текущий процесс.
+    Без надёжного authkey (см. check_authkey) сервер не запускается.
+    """
+    authkey = check_authkey(authkey)
+    start_pool(size)
+    if not wait_ready(size, timeout):
+        raise RuntimeError("Воркеры инференса не прогрелись за отведённое время")
+
+    service = _Service(size)
+    InferenceManager.register("service", callable=lambda: service)
+    manager = InferenceManager(_parse_address(address), authkey)
+    logger.info("Сервер инференса слушает %s", address)
+    manager.get_server().serve_forever()
@@ -0,0 +1,273 @@
+# app/services/jobs.py
+
+import logging
+import os
+import threading
+from collections import deque
+from functools import partial
+
+from flask import current_app
+
+from . import classifier, dedup, storage
+
+logger = logging.getLogger(__name__)
+
+# Планировщик создаётся лениво — по одному на процесс
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class FairScheduler:
+    """
+    Очередь задач классификации с честным разделением между владельцами:
+    у каждого пользователя своя очередь, воркеры берут задачи по кругу
+    (round-robin), а не в порядке поступления. Пакетная загрузка одного
+    клиента не задерживает одиночные загрузки остальных больше, чем
+    на одну задачу на каждого активного пользователя.
+    """
+
+    def __init__(self, workers: int):
+        # owner → очередь его задач; в _ring — владельцы с задачами по кругу
+        self._queues = {}
+        self._ring = deque()
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(
+                target=self._loop, name=f"classify-{i}", daemon=True
+            ).start()
+
+    def submit(self, owner, job) -> None:
+        """
+        Поставить задачу (вызываемый объект без аргументов) в очередь владельца.
+        """
+        with self._cond:
+            queue = self._queues.get(owner)
+            if queue is None:
+                queue = self._queues[owner] = deque()
+                self._ring.append(owner)
+            queue.append(job)
+            self._cond.notify()
+
+    def next_job(self, timeout: float = None):
+        """
+        Следующая задача: первая из очереди владельца, чья очередь
+        подошла по кругу. None, если за timeout задач не появилось.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._ring, timeout):
+                return None
+            owner = self._ring.popleft()
+            queue = self._queues[owner]
+            job = queue.popleft()
+            if queue:
+                # У владельца ещё есть задачи — в конец круга
+                self._ring.append(owner)
+            else:
+                del self._queues[owner]
+            return job
+
+    def pending(self) -> dict:
+        """
+        Число задач в очереди по владельцам.
+        """
+        with self._cond:
+            return {owner: len(q) for owner, q in self._queues.items()}
+
+    def _loop(self):
+        while True:
+            job = self.next_job()
+            try:
+                job()
+            except Exception:
+                logger.exception("Ошибка в задаче классификации")
+
+
+def _get_scheduler(app) -> FairScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(app.config["CLASSIFY_WORKERS"])
+    return _scheduler
+
+
+def classify_track(track_id: int, path: str) -> None:
+    """
+    Выполнить классификацию трека и записать результат в БД.
+    Должна вызываться внутри app context.
+    """
+    from .. import db
+    from ..models import Track
+
+    track = db.session.get(Track, track_id)
+    if track is None:
+        # Трек успели удалить, пока задача стояла в очереди
+        return
+
+    # Задачу может выполнять другой узел — тогда файл берём из хранилища
+    path = _local_file(track, path)
+    if path is None:
+        logger.error("Файл трека %s не найден в хранилище", track_id)
+        track.genre, track.status = "unknown", "failed"
+        db.session.commit()
+        return
+
+    # Ошибки модели не должны ронять воркер — помечаем трек как failed
+    try:
+        scores = classifier.classify_scores(path, track.content_hash)
+    except Exception:
+        logger.exception("Ошибка классификации трека %s", track_id)
+        track.genre, track.status = "unknown", "failed"
+        db.session.commit()
+        return
+
+    _store_result(track, scores)
+    db.session.commit()
+
+
+def _local_file(track, path):
+    if path and os.path.exists(path):
+        return path
+    return find_upload(track)
+
+
+def _store_result(track, scores) -> None:
+    track.genre = scores[0]["label"]
+    track.status = "done"
+    track.set_scores(scores)
+    # Результат запоминаем для повторных загрузок того же файла
+    if track.content_hash:
+        dedup.remember(track.content_hash, track.filename, track.genre, scores)
+
+
+def classify_tracks(items: list) -> None:
+    """
+    Классифицировать несколько треков одним прогоном модели
+    и записать результаты одной транзакцией.
+    items — список пар (id трека, путь к файлу).
+    Должна вызываться внутри app context.
+    """
+    from .. import db
+    from ..models import Track
+
+    pending = []
+    for track_id, path in items:
+        track = db.session.get(Track, track_id)
+        if track is None:
+            continue
+        path = _local_file(track, path)
+        if path is None:
+            track.genre, track.status = "unknown", "failed"
+            continue
+        pending.append((track, path))
+    if not pending:
+        db.session.commit()
+        return
+
+    try:
+        results = classifier.classify_batch(
+            [path for _, path in pending],
+            [track.content_hash for track, _ in pending]
+        )
+    except Exception:
+        # Пачка упала целиком — классифицируем поштучно,
+        # чтобы битый файл не помечал failed остальные
+        logger.exception("Ошибка пакетной классификации, повтор поштучно")
+        for track, path in pending:
+            classify_track(track.id, path)
+        return
+
+    for (track, _), scores in zip(pending, results):
+        _store_result(track, scores)
+    db.session.commit()
+
+
+def _run(app, track_id: int, path: str) -> None:
+    # Воркер работает вне запроса — поднимаем собственный контекст приложения
+    with app.app_context():
+        classify_track(track_id, path)
+
+
+def submit(track_id: int, path: str, owner=None) -> None:
+    """
+    Поставить трек в очередь на классификацию.
+    owner — id пользователя (None — гости, у них общая очередь);
+    задачи разных владельцев выполняются по очереди (см. FairScheduler).
+    При CLASSIFY_ASYNC=False задача выполняется сразу в текущем потоке.
+    """
+    app = current_app._get_current_object()
+    if not app.config.get("CLASSIFY_ASYNC", True):
+        classify_track(track_id, path)
+        return
+    _get_scheduler(app).submit(owner, partial(_run, app, track_id, path))
+
+
+def _run_batch(app, items: list) -> None:
+    with app.app_context():
+        classify_tracks(items)
+
+
+def submit_batch(items: list, owner=None) -> None:
+    """
+    Поставить несколько треков в очередь одной задачей на каждые
+    CLASSIFIER_BATCH_SIZE файлов: модель прогоняется пачкой, а задачи
+    остальных пользователей вклиниваются между пачками.
+    items — список пар (id трека, путь к файлу).
+    """
+    app = current_app._get_current_object()
+    size = max(classifier.BATCH_SIZE, 1)
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    if not app.config.get("CLASSIFY_ASYNC", True):
+        for chunk in chunks:
+            classify_tracks(chunk)
+        return
+    scheduler = _get_scheduler(app)
+    for chunk in chunks:
+        scheduler.submit(owner, partial(_run_batch, app, chunk))
+
+
+def audio_seconds(saved) -> float:
+    """
+    Сколько секунд аудио списать с квоты за классификацию файла:
+    его длительность, а если её не удалось оценить — длина окон,
+    которые реально прогоняет модель.
+    """
+    if saved.duration:
+        return saved.duration
+    return classifier.WINDOW_COUNT * classifier.WINDOW_SECONDS
+
+
+def find_upload(track):
+    """
+    Локальный путь к файлу трека для модели.
+    Track.filename — имя в хранилище загрузок (для S3 файл скачивается
+    в локальный кэш); у старых веб-загрузок там только имя файла,
+    а сам файл лежит в подпапке <user_id>/guests папки UPLOAD_FOLDER.
+    """
+    path = storage.get_storage().local_path(track.filename)
+    if path is not None:
+        return path
+    subdir = str(track.user_id) if track.user_id else "guests"
+    legacy = os.path.join(current_app.config["UPLOAD_FOLDER"], subdir, track.filename)
+    return legacy if os.path.exists(legacy) else None
+
+
+def requeue_pending() -> int:
+    """
+    Повторно поставить в очередь треки со статусом pending
+    (например, задачи, потерянные при перезапуске процесса).
+    Возвращает число поставленных задач.
+    """
+    from .. import db
+    from ..models import Track
+
+    count = 0
+    for t in Track.query.filter_by(status="pending").all():
+        path = find_upload(t)
+        if path is None:
+            # Файл пропал — классифицировать нечего
+            t.genre, t.status = "unknown", "failed"
+            continue
+        submit(t.id, path, t.user_id)
+        count += 1
+    db.session.commit()
+    return count
@@ -1,33 +1,241 @@
 # app/services/limiter.py
 
-from flask import session
-from datetime import datetime, timedelta
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, request
 
 GUEST_LIMIT = 5
-SESSION_KEY = "guest_upload"
-RESET_INTERVAL = timedelta(hours=24)
+# Окно гостевого лимита в секундах
+GUEST_WINDOW = 24 * 60 * 60
+# Префикс ключа гостевых загрузок в хранилище лимитера
+GUEST_PREFIX = "guest:"
 
-def guest_can_upload() -> bool:
-    now = datetime.utcnow()
-    data = session.get(SESSION_KEY)
-    if data:
-        start = datetime.fromisoformat(data["start"])
-        count = data["count"]
-        if now - start >= RESET_INTERVAL:
-            count, start = 0, now
+_backend = None
+
+
+def _slide(state, now: float, window: float):
+    """
+    Сдвинуть состояние скользящего окна к моменту now.
+    state — (начало текущего окна, счётчик текущего, счётчик предыдущего).
+    Окна выровнены по window секунд; если прошло больше одного окна,
+    предыдущий счётчик обнуляется.
+    """
+    start = math.floor(now / window) * window
+    if state is None:
+        return start, 0, 0
+    prev_start, current, previous = state
+    if start == prev_start:
+        return start, current, previous
+    if start - prev_start == window:
+        return start, 0, current
+    return start, 0, 0
+
+
+def _estimate(state, now: float, window: float) -> float:
+    """
+    Оценка числа запросов за последние window секунд (sliding window
+    counter): счётчик текущего окна плюс доля предыдущего, ещё
+    попадающая в скользящее окно. O(1) по времени и памяти на ключ.
+    Запрос пропускается, пока оценка ниже лимита, и добавляет к счётчику
+    свою «стоимость» (1 для запросов, секунды аудио для квоты на аудио).
+    """
+    start, current, previous = state
+    overlap = 1 - (now - start) / window
+    return current + previous * overlap
+
+
+class MemoryBackend:
+    """
+    Счётчики в памяти процесса: для одного воркера и тестов.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: float, window: float, now: float = None,
+            cost: float = 1) -> bool:
+        now = time.time() if now is None else now
+        with self._lock:
+            state = _slide(self._data.get(key), now, window)
+            if _estimate(state, now, window) >= limit:
+                self._data[key] = state
+                return False
+            start, current, previous = state
+            self._data[key] = (start, current + cost, previous)
+            return True
+
+    def usage(self, key: str, window: float, now: float = None) -> float:
+        now = time.time() if now is None else now
+        with self._lock:
+            state = _slide(self._data.get(key), now, window)
+        return _estimate(state, now, window)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def reset(self, prefix: str = "") -> None:
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+class SQLiteBackend:
+    """
+    Счётчики в файле SQLite — общие для всех процессов-воркеров хоста.
+    Проверка и увеличение выполняются в одной транзакции BEGIN IMMEDIATE,
+    поэтому параллельные воркеры не теряют обновления.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                " key TEXT PRIMARY KEY,"
+                " window_start REAL NOT NULL,"
+                " current REAL NOT NULL,"
+                " previous REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # Отдельное соединение на поток: sqlite3 не разделяет их между потоками
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, conn, key):
+        return conn.execute(
+            "SELECT window_start, current, previous FROM rate_limit WHERE key = ?",
+            (key,)
+        ).fetchone()
+
+    def hit(self, key: str, limit: float, window: float, now: float = None,
+            cost: float = 1) -> bool:
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = _slide(self._load(conn, key), now, window)
+            allowed = _estimate(state, now, window) < limit
+            start, current, previous = state
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit VALUES (?, ?, ?, ?)",
+                (key, start, current + cost if allowed else current, previous)
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return allowed
+
+    def usage(self, key: str, window: float, now: float = None) -> float:
+        now = time.time() if now is None else now
+        state = _slide(self._load(self._connect(), key), now, window)
+        return _estimate(state, now, window)
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM rate_limit WHERE key = ?", (key,))
+
+    def reset(self, prefix: str = "") -> None:
+        # Экранируем спецсимволы LIKE, чтобы префикс совпадал буквально
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._connect().execute(
+            "DELETE FROM rate_limit WHERE key LIKE ? ESCAPE '\\'", (pattern + "%",)
+        )
+
+
+def init_app(app):
+    """
+    Выбрать хранилище лимитера по конфигу:
+    RATELIMIT_BACKEND = memory | sqlite (файл RATELIMIT_STORAGE).
+    """
+    global _backend, GUEST_LIMIT, GUEST_WINDOW
+    GUEST_LIMIT = app.config.get("GUEST_LIMIT", GUEST_LIMIT)
+    GUEST_WINDOW = app.config.get("GUEST_LIMIT_WINDOW", GUEST_WINDOW)
+
+    kind = app.config.get("RATELIMIT_BACKEND", "memory")
+    if kind == "sqlite":
+        _backend = SQLiteBackend(app.config["RATELIMIT_STORAGE"])
+    elif kind == "memory":
+        _backend = MemoryBackend()
     else:
-        count, start = 0, now
+        raise ValueError(f"Неизвестное хранилище лимитера: {kind}")
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = MemoryBackend()
+    return _backend
+
+
+def client_key() -> str:
+    """
+    Ключ гостя — его IP-адрес (за прокси нужен ProxyFix, чтобы
+    remote_addr был адресом клиента). В отличие от cookie-сессии,
+    его нельзя сбросить, очистив cookies.
+    """
+    return GUEST_PREFIX + (request.remote_addr or "unknown")
+
+
+def guest_can_upload() -> bool:
+    """
+    Учесть гостевую загрузку; False — лимит GUEST_LIMIT за GUEST_WINDOW исчерпан.
+    """
+    return get_backend().hit(client_key(), GUEST_LIMIT, GUEST_WINDOW)
+
+
+def guest_usage() -> int:
+    """
+    Сколько загрузок гость уже сделал за текущее скользящее окно.
+    """
+    return math.ceil(get_backend().usage(client_key(), GUEST_WINDOW))
+
 
-    if count >= GUEST_LIMIT:
-        session[SESSION_KEY] = {"count": count, "start": start.isoformat()}
-        return False
+def _user_key(user_id, kind: str) -> str:
+    return f"user:{user_id}:{kind}"
 
-    session[SESSION_KEY] = {"count": count + 1, "start": start.isoformat()}
-    return True
 
-def reset_guest_limit():
+def user_can_request(user_id) -> bool:
     """
-    Сбрасывает счётчик гостевых загрузок
-    (удаляет ключ из сессии).
+    Учесть запрос пользователя на классификацию;
+    False — превышена квота USER_REQUESTS_PER_MINUTE (0 — без квоты).
     """
-    session.pop(SESSION_KEY, None)
+    limit = current_app.config.get("USER_REQUESTS_PER_MINUTE", 0)
+    if not limit:
+        return True
+    return get_backend().hit(_user_key(user_id, "requests"), limit, 60)
+
+
+def charge_audio(user_id, seconds: float) -> bool:
+    """
+    Списать seconds секунд аудио с часовой квоты пользователя
+    USER_AUDIO_SECONDS_PER_HOUR (0 — без квоты).
+    False — квота уже исчерпана, файл классифицировать нельзя.
+    """
+    limit = current_app.config.get("USER_AUDIO_SECONDS_PER_HOUR", 0)
+    if not limit:
+        return True
+    return get_backend().hit(_user_key(user_id, "audio"), limit, 60 * 60, cost=seconds)
+
+
+def reset_guest_limit(address: str = None):
+    """
+    Сбрасывает счётчик гостевых загрузок для IP-адреса
+    или (без адреса) для всех гостей.
+    """
+    if address:
+        get_backend().delete(GUEST_PREFIX + address)
+    else:
+        get_backend().reset(GUEST_PREFIX)
@@ -0,0 +1,147 @@
+# app/services/pagination.py
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+
+from .. import db
+from ..models import Track
+
+# Поля трека, которые можно запросить через ?fields=
+TRACK_FIELDS = {
+    "id": lambda t: t.id,
+    "filename": lambda t: t.filename,
+    "original_filename": lambda t: t.original_filename,
+    "genre": lambda t: t.genre,
+    "status": lambda t: t.status,
+    "uploaded_at": lambda t: t.uploaded_at.isoformat(),
+    "scores": lambda t: [{"label": s.label, "score": s.score} for s in t.scores],
+}
+# Поля по умолчанию — прежний формат списка треков
+DEFAULT_FIELDS = ("id", "filename", "genre", "status", "uploaded_at")
+
+
+class InvalidQuery(ValueError):
+    """
+    Некорректные параметры списка (курсор, поля, даты) — ответ 400.
+    """
+
+
+def parse_fields(raw: str) -> tuple:
+    """
+    Разобрать ?fields=id,genre,... в кортеж имён полей.
+    Пустое значение — поля по умолчанию.
+    """
+    if not raw:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in TRACK_FIELDS]
+    if unknown:
+        raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}")
+    return fields or DEFAULT_FIELDS
+
+
+def serialize(track, fields: tuple) -> dict:
+    return {name: TRACK_FIELDS[name](track) for name in fields}
+
+
+def encode_cursor(track) -> str:
+    """
+    Непрозрачный курсор на позицию после данного трека:
+    base64 от (uploaded_at, id).
+    """
+    raw = json.dumps([track.uploaded_at.isoformat(), track.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        uploaded_at, track_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(uploaded_at), int(track_id)
+    except (ValueError, TypeError):
+        raise InvalidQuery("Invalid cursor")
+
+
+def _parse_date(value: str, name: str):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidQuery(f"Invalid {name}: expected ISO 8601 date")
+
+
+def filter_tracks(query, args):
+    """
+    Применить к запросу треков фильтры ?genre=, ?since=, ?until=
+    (даты в ISO 8601, since включительно, until — нет).
+    """
+    if args.get("genre"):
+        query = query.filter(Track.genre == args["genre"])
+    if args.get("since"):
+        query = query.filter(Track.uploaded_at >= _parse_date(args["since"], "since"))
+    if args.get("until"):
+        query = query.filter(Track.uploaded_at < _parse_date(args["until"], "until"))
+    return query
+
+
+def paginate_tracks(query, cursor: str = None, limit: int = 50):
+    """
+    Keyset-пагинация по (uploaded_at, id) от новых к старым.
+    Вместо OFFSET берём строки строго после курсора, поэтому стоимость
+    страницы не зависит от её номера и размера библиотеки.
+    Возвращает (треки, курсор следующей страницы или None).
+    """
+    query = query.order_by(Track.uploaded_at.desc(), Track.id.desc())
+    if cursor:
+        uploaded_at, track_id = decode_cursor(cursor)
+        query = query.filter(
+            db.tuple_(Track.uploaded_at, Track.id) < (uploaded_at, track_id)
+        )
+    # Лишняя строка показывает, есть ли следующая страница
+    tracks = query.limit(limit + 1).all()
+    if len(tracks) > limit:
+        return tracks[:limit], encode_cursor(tracks[limit - 1])
+    return tracks, None
+
+
+def iter_tracks(query, batch_size: int = 1000):
+    """
+    Обойти все треки запроса, не загружая их в память разом:
+    строки читаются с курсора БД пачками по batch_size (yield_per).
+    """
+    statement = query.order_by(Track.uploaded_at, Track.id).statement
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    return result.scalars()
+
+
+def export_ndjson(tracks, fields: tuple):
+    """
+    Генератор строк NDJSON: один JSON-объект трека на строку.
+    """
+    for track in tracks:
+        yield json.dumps(serialize(track, fields), ensure_ascii=False) + "\n"
+
+
+def export_csv(tracks, fields: tuple):
+    """
+    Генератор строк CSV с заголовком; оценки пишутся JSON-строкой.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def flush():
+        line = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return line
+
+    writer.writerow(fields)
+    yield flush()
+    for track in tracks:
+        row = serialize(track, fields)
+        if "scores" in row:
+            row["scores"] = json.dumps(row["scores"], ensure_ascii=False)
+        writer.writerow(row[name] for name in fields)
+        yield flush()
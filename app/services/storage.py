@@ -0,0 +1,376 @@
+# app/services/storage.py
+
+import itertools
+import os
+import time
+import uuid
+
+from flask import current_app
+
+# Загрузки хранятся по хешу содержимого: objects/ab/cd/<sha256><ext>.
+# Одинаковые файлы занимают одно место, а каталоги растут не больше
+# чем до 256 подкаталогов на уровень
+OBJECTS_DIR = "objects"
+# Недописанные загрузки — до переименования в итоговый путь
+TMP_DIR = "tmp"
+# Размер блока при чтении файла из хранилища
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class LocalStorage:
+    """
+    Хранилище в локальной папке (UPLOAD_FOLDER).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def writer(self):
+        return _LocalWriter(self)
+
+    def exists(self, name: str) -> bool:
+        return os.path.isfile(self._path(name))
+
+    def size(self, name: str) -> int:
+        return os.path.getsize(self._path(name))
+
+    def read_range(self, name: str, start: int = 0, length: int = None):
+        """
+        Генератор блоков файла с позиции start, не больше length байт.
+        """
+        with open(self._path(name), "rb") as f:
+            f.seek(start)
+            left = length
+            while left is None or left > 0:
+                chunk = f.read(READ_CHUNK_SIZE if left is None else min(READ_CHUNK_SIZE, left))
+                if not chunk:
+                    break
+                if left is not None:
+                    left -= len(chunk)
+                yield chunk
+
+    def delete(self, name: str) -> None:
+        if os.path.exists(self._path(name)):
+            os.remove(self._path(name))
+
+    def list(self, prefix: str):
+        """
+        Файлы под prefix: (имя, время изменения, размер), по каталогам.
+        """
+        for dirpath, _, files in os.walk(self._path(prefix)):
+            rel_dir = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            for f in sorted(files):
+                st = os.stat(os.path.join(dirpath, f))
+                yield f"{rel_dir}/{f}", st.st_mtime, st.st_size
+
+    def local_path(self, name: str):
+        """
+        Путь к файлу на локальном диске (для декодирования моделью)
+        или None, если файла нет.
+        """
+        path = self._path(name)
+        return path if os.path.isfile(path) else None
+
+    def prune_cache(self, cutoff: float) -> None:
+        # Локальное хранилище не держит кэш копий
+        pass
+
+
+class _LocalWriter:
+    # Запись новой загрузки: во временный файл, затем переименование
+
+    def __init__(self, storage: LocalStorage):
+        self._storage = storage
+        tmp_dir = storage._path(TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        self._tmp = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+        self._file = open(self._tmp, "wb")
+        self.local_path = None
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def commit(self, name: str) -> str:
+        self._file.close()
+        path = self._storage._path(name)
+        if os.path.exists(path):
+            # Такой файл уже есть — обновляем время изменения, чтобы сборщик
+            # мусора не удалил его, пока ссылка на него не записана в БД
+            os.remove(self._tmp)
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp, path)
+        self.local_path = path
+        return name
+
+
+class S3Storage:
+    """
+    Хранилище в S3-совместимом объектном хранилище (AWS S3, MinIO).
+    Запись идёт multipart-загрузкой по мере приёма файла; для модели
+    файлы скачиваются в локальный кэш cache_dir. Объекты адресуются
+    хешем содержимого и не меняются, поэтому кэш не устаревает.
+    Требует boto3.
+    """
+
+    # Минимальный размер части multipart-загрузки в S3
+    PART_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, bucket: str, cache_dir: str, prefix: str = "",
+                 endpoint_url: str = None, region: str = None, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("Для STORAGE_BACKEND=s3 нужен пакет boto3")
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.cache_dir = cache_dir
+
+    def key(self, name: str) -> str:
+        return self.prefix + name
+
+    def _cache_path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def writer(self):
+        return _S3Writer(self)
+
+    def _head(self, name: str):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.key(name))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, name: str) -> bool:
+        return self._head(name) is not None
+
+    def size(self, name: str) -> int:
+        return self._head(name)["ContentLength"]
+
+    def read_range(self, name: str, start: int = 0, length: int = None):
+        end = "" if length is None else start + length - 1
+        obj = self.client.get_object(
+            Bucket=self.bucket, Key=self.key(name), Range=f"bytes={start}-{end}"
+        )
+        yield from obj["Body"].iter_chunks(READ_CHUNK_SIZE)
+
+    def delete(self, name: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+        if os.path.exists(self._cache_path(name)):
+            os.remove(self._cache_path(name))
+
+    def list(self, prefix: str):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.key(prefix)):
+            for obj in page.get("Contents", []):
+                name = obj["Key"][len(self.prefix):]
+                yield name, obj["LastModified"].timestamp(), obj["Size"]
+
+    def local_path(self, name: str):
+        """
+        Локальная копия объекта: из кэша или скачанная в него.
+        None, если объекта нет.
+        """
+        path = self._cache_path(name)
+        if os.path.isfile(path):
+            os.utime(path)
+            return path
+        if not self.exists(name):
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.part"
+        self.client.download_file(self.bucket, self.key(name), tmp)
+        os.replace(tmp, path)
+        return path
+
+    def prune_cache(self, cutoff: float) -> None:
+        """
+        Удалить из локального кэша копии, не использованные с cutoff.
+        """
+        for dirpath, _, files in os.walk(self.cache_dir):
+            for f in files:
+                path = os.path.join(dirpath, f)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+
+
+class _S3Writer:
+    # Запись новой загрузки в S3: части по PART_SIZE уходят во временный
+    # объект tmp/<uuid> по мере приёма, после подсчёта хеша объект
+    # копируется на сервере в итоговый ключ. Локальная копия остаётся
+    # в кэше — воркер на этом же узле не будет скачивать файл обратно
+
+    def __init__(self, storage: S3Storage):
+        self._s3 = storage
+        self._tmp_key = storage.key(f"{TMP_DIR}/{uuid.uuid4().hex}.part")
+        self._buf = bytearray()
+        self._parts = []
+        self._upload_id = None
+        tmp_dir = os.path.join(storage.cache_dir, TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        self._tmp = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+        self._file = open(self._tmp, "wb")
+        self.local_path = None
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._buf += chunk
+        if len(self._buf) >= S3Storage.PART_SIZE:
+            self._flush_part()
+
+    def _flush_part(self) -> None:
+        client, bucket = self._s3.client, self._s3.bucket
+        if self._upload_id is None:
+            self._upload_id = client.create_multipart_upload(
+                Bucket=bucket, Key=self._tmp_key
+            )["UploadId"]
+        number = len(self._parts) + 1
+        part = client.upload_part(
+            Bucket=bucket, Key=self._tmp_key, UploadId=self._upload_id,
+            PartNumber=number, Body=bytes(self._buf)
+        )
+        self._parts.append({"ETag": part["ETag"], "PartNumber": number})
+        self._buf.clear()
+
+    def abort(self) -> None:
+        self._file.close()
+        if self._upload_id is not None:
+            self._s3.client.abort_multipart_upload(
+                Bucket=self._s3.bucket, Key=self._tmp_key, UploadId=self._upload_id
+            )
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def commit(self, name: str) -> str:
+        self._file.close()
+        client, bucket, key = self._s3.client, self._s3.bucket, self._s3.key(name)
+        if self._s3.exists(name):
+            if self._upload_id is not None:
+                client.abort_multipart_upload(
+                    Bucket=bucket, Key=self._tmp_key, UploadId=self._upload_id
+                )
+            # Копия объекта в себя обновляет LastModified — защита от сборщика мусора
+            client.copy_object(
+                Bucket=bucket, Key=key, CopySource={"Bucket": bucket, "Key": key},
+                MetadataDirective="REPLACE"
+            )
+        elif self._upload_id is None:
+            # Маленький файл уместился в одну часть — обычный PUT
+            client.put_object(Bucket=bucket, Key=key, Body=bytes(self._buf))
+        else:
+            if self._buf:
+                self._flush_part()
+            client.complete_multipart_upload(
+                Bucket=bucket, Key=self._tmp_key, UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts}
+            )
+            client.copy_object(
+                Bucket=bucket, Key=key, CopySource={"Bucket": bucket, "Key": self._tmp_key}
+            )
+            client.delete_object(Bucket=bucket, Key=self._tmp_key)
+
+        cached = self._s3._cache_path(name)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        os.replace(self._tmp, cached)
+        self.local_path = cached
+        return name
+
+
+def init_app(app):
+    """
+    Создать хранилище загрузок по конфигу: STORAGE_BACKEND = local | s3.
+    """
+    kind = app.config.get("STORAGE_BACKEND", "local")
+    if kind == "local":
+        backend = LocalStorage(app.config["UPLOAD_FOLDER"])
+    elif kind == "s3":
+        backend = S3Storage(
+            bucket=app.config["S3_BUCKET"],
+            cache_dir=app.config["STORAGE_CACHE_DIR"],
+            prefix=app.config.get("S3_PREFIX", ""),
+            endpoint_url=app.config.get("S3_ENDPOINT_URL"),
+            region=app.config.get("S3_REGION"),
+        )
+    else:
+        raise ValueError(f"Неизвестное хранилище загрузок: {kind}")
+    app.extensions["storage"] = backend
+
+
+def get_storage():
+    return current_app.extensions["storage"]
+
+
+def blob_name(content_hash: str, ext: str) -> str:
+    """
+    Путь файла в хранилище по хешу содержимого.
+    """
+    return "/".join((OBJECTS_DIR, content_hash[:2], content_hash[2:4], content_hash + ext))
+
+
+def _referenced(filenames: list) -> set:
+    from .. import db
+    from ..models import Track
+
+    rows = db.session.execute(
+        db.select(Track.filename).where(Track.filename.in_(filenames)).distinct()
+    ).scalars()
+    return set(rows)
+
+
+def collect_garbage(min_age: float = 3600, dry_run: bool = False) -> dict:
+    """
+    Удалить файлы хранилища, на которые не ссылается ни один трек,
+    и брошенные временные файлы. Файлы моложе min_age секунд не трогаем:
+    их ссылки могут быть ещё не закоммичены.
+    Ссылки проверяются одним запросом на каталог-шард, а не на файл.
+    Возвращает {"scanned", "removed", "bytes"}.
+    """
+    from .. import db
+    from ..models import ClassificationCache
+
+    backend = get_storage()
+    cutoff = time.time() - min_age
+    stats = {"scanned": 0, "removed": 0, "bytes": 0}
+
+    def remove(name, size):
+        stats["removed"] += 1
+        stats["bytes"] += size
+        if not dry_run:
+            backend.delete(name)
+
+    shards = itertools.groupby(backend.list(OBJECTS_DIR), key=lambda f: f[0].rsplit("/", 1)[0])
+    for _, files in shards:
+        files = list(files)
+        stats["scanned"] += len(files)
+        referenced = _referenced([name for name, _, _ in files])
+        orphans = [f for f in files if f[0] not in referenced and f[1] < cutoff]
+        for name, _, size in orphans:
+            remove(name, size)
+        if orphans and not dry_run:
+            # Записи кэша дедупликации на удалённые файлы больше не нужны
+            ClassificationCache.query.filter(
+                ClassificationCache.filename.in_([name for name, _, _ in orphans])
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+    for name, mtime, size in backend.list(TMP_DIR):
+        if mtime < cutoff:
+            remove(name, size)
+    if not dry_run:
+        backend.prune_cache(cutoff)
+    return stats
@@ -0,0 +1,223 @@
+# app/services/uploads.py
+
+import hashlib
+import os
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from . import storage
+
+# Размер блока при потоковой записи загрузки на диск
+CHUNK_SIZE = 64 * 1024
+
+# path — локальный путь к файлу, filename — имя в хранилище загрузок,
+# duration — оценка длительности в секундах (None, если оценить не удалось)
+SavedUpload = namedtuple("SavedUpload", "path filename content_hash size duration")
+
+
+def absolute_path(filename: str) -> str:
+    """
+    Абсолютный путь к файлу, сохранённому под UPLOAD_FOLDER.
+    """
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
+
+
+class UploadRejected(Exception):
+    """
+    Загрузка отклонена при приёме: неподдерживаемое содержимое (415)
+    или превышены лимиты размера/длительности (413).
+    """
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def sniff_format(head: bytes):
+    """
+    Определить формат по сигнатуре в начале файла.
+    Возвращает расширение (".wav", ".flac", ".mp3") или None.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return ".wav"
+    if head[:4] == b"fLaC":
+        return ".flac"
+    # MP3: тег ID3v2 или сразу синхрослово MPEG-кадра (11 единичных бит)
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return ".mp3"
+    return None
+
+
+# Битрейты MPEG-1 Layer III, кбит/с (индекс из заголовка кадра)
+_MP3_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0]
+
+
+def _mp3_byte_rate(head: bytes):
+    """
+    Байтрейт MP3 по первому заголовку кадра — только для CBR MPEG-1 Layer III.
+    У MPEG-2/2.5 другая таблица битрейтов, а у VBR первый кадр — служебный
+    (Xing/Info/VBRI) с условным битрейтом; для них оценки нет (None),
+    и длительность ограничивается только MAX_UPLOAD_SIZE.
+    """
+    # Пропускаем тег ID3v2: его размер записан в 4 байтах по 7 бит
+    offset = 0
+    if head[:3] == b"ID3" and len(head) >= 10:
+        size = 0
+        for b in head[6:10]:
+            size = (size << 7) | (b & 0x7F)
+        offset = 10 + size
+    for i in range(offset, len(head) - 3):
+        if head[i] != 0xFF or head[i + 1] & 0xE0 != 0xE0:
+            continue
+        version = (head[i + 1] >> 3) & 0x3
+        layer = (head[i + 1] >> 1) & 0x3
+        # 0b11 — MPEG-1, 0b01 — Layer III
+        if version != 0b11 or layer != 0b01:
+            return None
+        # Заголовок VBR лежит после side info: 17 байт у моно, 32 — у стерео;
+        # VBRI — всегда через 32 байта
+        side_info = 17 if head[i + 3] >> 6 == 0b11 else 32
+        if head[i + 4 + side_info:i + 8 + side_info] in (b"Xing", b"Info") \
+                or head[i + 36:i + 40] == b"VBRI":
+            return None
+        kbps = _MP3_BITRATES[head[i + 2] >> 4]
+        return kbps * 1000 // 8 if kbps else None
+    return None
+
+
+def _wav_byte_rate(head: bytes):
+    # Ищем чанк "fmt " — в нём поле byte rate (байт в секунду)
+    pos = 12
+    while pos + 8 <= len(head):
+        chunk_id = head[pos:pos + 4]
+        chunk_size = int.from_bytes(head[pos + 4:pos + 8], "little")
+        if chunk_id == b"fmt " and pos + 20 <= len(head):
+            return int.from_bytes(head[pos + 16:pos + 20], "little") or None
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _flac_duration(head: bytes):
+    # STREAMINFO идёт сразу после "fLaC" и 4-байтового заголовка блока:
+    # 20 бит частоты дискретизации и 36 бит общего числа сэмплов
+    info = head[8:42]
+    if len(info) < 18:
+        return None
+    sample_rate = int.from_bytes(info[10:13], "big") >> 4
+    total_samples = int.from_bytes(info[13:18], "big") & 0xFFFFFFFFF
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+
+def save_upload(stream, ext: str) -> SavedUpload:
+    """
+    Потоково сохранить загрузку в хранилище по хешу содержимого
+    (см. services/storage), попутно посчитав SHA-256.
+    По первому блоку проверяется сигнатура формата, а по ходу записи —
+    MAX_UPLOAD_SIZE и MAX_UPLOAD_DURATION; при нарушении запись прерывается
+    с UploadRejected, не дочитывая тело запроса.
+    Файл пишется во временный и переименовывается в адрес по хешу;
+    если такой файл уже есть, новая копия не сохраняется.
+    path в результате — локальная копия файла для модели.
+    """
+    max_size = current_app.config.get("MAX_UPLOAD_SIZE")
+    max_duration = current_app.config.get("MAX_UPLOAD_DURATION")
+
+    head = stream.read(CHUNK_SIZE)
+    fmt = sniff_format(head)
+    if fmt is None:
+        raise UploadRejected("Unsupported audio format", 415)
+    if fmt != ext:
+        raise UploadRejected("File content does not match extension", 415)
+
+    # Длительность: у FLAC точная из STREAMINFO, у WAV/MP3 — по байтрейту
+    byte_rate = duration = None
+    if fmt == ".flac":
+        duration = _flac_duration(head)
+        if max_duration and duration and duration > max_duration:
+            raise UploadRejected("Audio is too long", 413)
+    elif fmt == ".wav":
+        byte_rate = _wav_byte_rate(head)
+    else:
+        byte_rate = _mp3_byte_rate(head)
+    max_bytes = max_size
+    if max_duration and byte_rate:
+        by_duration = int(max_duration * byte_rate) + len(head)
+        max_bytes = min(max_bytes, by_duration) if max_bytes else by_duration
+
+    writer = storage.get_storage().writer()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        chunk = head
+        while chunk:
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                too_big = max_size and size > max_size
+                raise UploadRejected(
+                    "File is too large" if too_big else "Audio is too long", 413
+                )
+            digest.update(chunk)
+            writer.write(chunk)
+            chunk = stream.read(CHUNK_SIZE)
+    except BaseException:
+        # Не оставляем в хранилище обрывки файла
+        writer.abort()
+        raise
+
+    content_hash = digest.hexdigest()
+    filename = writer.commit(storage.blob_name(content_hash, ext))
+    if byte_rate:
+        duration = size / byte_rate
+    return SavedUpload(writer.local_path, filename, content_hash, size, duration)
+
+
+def archive_members(fileobj, allowed_extensions):
+    """
+    Аудиофайлы из zip-архива: список (имя, функция открытия потока).
+    Каталоги, служебные файлы macOS и файлы с другими расширениями
+    пропускаются. Архив читается по мере открытия членов, целиком
+    в память не распаковывается.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise UploadRejected("Invalid zip archive", 400)
+    members = []
+    for info in archive.infolist():
+        name = os.path.basename(info.filename)
+        if info.is_dir() or not name or info.filename.startswith("__MACOSX/"):
+            continue
+        if os.path.splitext(name)[1].lower() in allowed_extensions:
+            members.append((name, lambda info=info: archive.open(info)))
+    return members
+
+
+def save_many(sources, workers: int) -> list:
+    """
+    Сохранить несколько загрузок параллельно.
+    sources — список (расширение, функция, возвращающая поток).
+    Для каждого источника возвращает SavedUpload или UploadRejected
+    (порядок сохраняется).
+    """
+    app = current_app._get_current_object()
+
+    def save(item):
+        ext, open_stream = item
+        # Потоки пула работают вне запроса — нужен свой контекст приложения
+        with app.app_context():
+            try:
+                with open_stream() as stream:
+                    return save_upload(stream, ext)
+            except UploadRejected as e:
+                return e
+
+    if not sources:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sources)))) as pool:
+        return list(pool.map(save, sources))
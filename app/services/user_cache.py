@@ -0,0 +1,119 @@
+# app/services/user_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+# Сколько секунд пользователь живёт в кэше (0 — кэш выключен)
+# и сколько пользователей хранить (лишние вытесняются по LRU)
+TTL = 30
+MAX_ENTRIES = 10000
+
+# user_id → (момент истечения, отсоединённый снимок User)
+_entries = OrderedDict()
+_lock = threading.Lock()
+# Ключ session.info: id пользователей, изменённых в текущей транзакции
+_CHANGED_KEY = "user_cache_changed"
+
+
+def init_app(app):
+    """
+    Прочитать настройки кэша из конфига и подписаться на изменения
+    пользователей: запись сбрасывается сразу при flush и ещё раз после
+    commit (чтобы параллельный запрос не успел закэшировать старую строку),
+    bulk UPDATE/DELETE по пользователям сбрасывает весь кэш.
+    Другие процессы узнают об изменениях только по истечении TTL.
+    """
+    from ..models import User
+
+    global TTL, MAX_ENTRIES
+    TTL = app.config.get("USER_CACHE_TTL", TTL)
+    MAX_ENTRIES = app.config.get("USER_CACHE_MAX_ENTRIES", MAX_ENTRIES)
+
+    for name in ("after_update", "after_delete"):
+        if not event.contains(User, name, _user_changed):
+            event.listen(User, name, _user_changed)
+    if not event.contains(Session, "after_commit", _after_commit):
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_soft_rollback", _after_rollback)
+        event.listen(Session, "after_bulk_update", _bulk_change)
+        event.listen(Session, "after_bulk_delete", _bulk_change)
+
+
+def _user_changed(mapper, connection, target):
+    invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED_KEY, set()).add(target.id)
+
+
+def _bulk_change(context):
+    # Query.update()/delete() обходят события маппера — сбрасываем весь кэш
+    from ..models import User
+
+    if context.mapper.class_ is User:
+        invalidate()
+
+
+def _after_commit(session):
+    for user_id in session.info.pop(_CHANGED_KEY, ()):
+        invalidate(user_id)
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+def _snapshot(user):
+    # Отсоединённая копия загруженных колонок: её можно делить между
+    # потоками, а в сессию запроса она вливается через merge без SQL
+    from ..models import User
+
+    copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+def get(user_id: int):
+    """
+    Пользователь по id для текущей сессии или None.
+    Из кэша — без запроса к БД (db.session.merge(load=False)),
+    при промахе — db.session.get и запись снимка в кэш.
+    """
+    from .. import db
+    from ..models import User
+
+    if not TTL:
+        return db.session.get(User, user_id)
+
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            _entries.move_to_end(user_id)
+            return db.session.merge(entry[1], load=False)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        invalidate(user_id)
+        return None
+    with _lock:
+        _entries[user_id] = (now + TTL, _snapshot(user))
+        _entries.move_to_end(user_id)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return user
+
+
+def invalidate(user_id=None) -> None:
+    """
+    Сбросить запись пользователя или (без id) весь кэш.
+    """
+    with _lock:
+        if user_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(user_id, None)
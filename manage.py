@@ -1,6 +1,11 @@
-from app import create_app
+from flask_migrate import Migrate
+
+from app import create_app, db
 
 app = create_app()
+# Команды Flask-Migrate (flask db ...) рядом с командами приложения
+# (flask reclassify, flask requeue-jobs и др., см. app/commands.py)
+migrate = Migrate(app, db)
 
 if __name__ == "__main__":
     app.run(debug=True)
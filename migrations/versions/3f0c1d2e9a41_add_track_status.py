@@ -0,0 +1,34 @@
+"""Add status to Track for background classification
+
+Revision ID: 3f0c1d2e9a41
+Revises: b1399ac05f19
+Create Date: 2025-06-20 18:42:10.512307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f0c1d2e9a41'
+down_revision = 'b1399ac05f19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Существующие треки уже классифицированы — помечаем их как done
+    with op.batch_alter_table('track', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=16), nullable=False, server_default='done'))
+        batch_op.alter_column('genre',
+               existing_type=sa.String(length=64),
+               nullable=True)
+
+
+def downgrade():
+    op.execute("UPDATE track SET genre = 'unknown' WHERE genre IS NULL")
+    with op.batch_alter_table('track', schema=None) as batch_op:
+        batch_op.alter_column('genre',
+               existing_type=sa.String(length=64),
+               nullable=False)
+        batch_op.drop_column('status')
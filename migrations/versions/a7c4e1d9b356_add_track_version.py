@@ -0,0 +1,31 @@
+"""Add track version and updated_at for HTTP caching
+
+Revision ID: a7c4e1d9b356
+Revises: f3a9d2c7b814
+Create Date: 2025-07-10 09:27:53.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e1d9b356'
+down_revision = 'f3a9d2c7b814'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('track', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Для существующих треков временем изменения считаем время загрузки
+    op.execute("UPDATE track SET updated_at = uploaded_at")
+
+
+def downgrade():
+    with op.batch_alter_table('track', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
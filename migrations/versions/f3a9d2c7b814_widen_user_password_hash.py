@@ -0,0 +1,33 @@
+"""Widen user.password_hash for configurable hash methods
+
+Revision ID: f3a9d2c7b814
+Revises: e8b3f1c6a920
+Create Date: 2025-07-08 11:42:19.530871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9d2c7b814'
+down_revision = 'e8b3f1c6a920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Хеш scrypt в формате Werkzeug длиннее 128 символов
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=128),
+               existing_nullable=False)
@@ -3,6 +3,7 @@ import sys
 import tempfile
 import pytest
 import shutil
+from contextlib import contextmanager
 from pathlib import Path
 from types import SimpleNamespace
 
@@ -10,7 +11,9 @@ from types import SimpleNamespace
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
-import wave, struct
+import wave, struct, random
+
+from sqlalchemy import event
 
 from app import create_app, db as _db
 from app.models import User
@@ -37,15 +40,39 @@ def client(app):
     return app.test_client()
 
 
+STUB_SCORES = [
+    {"label": "testgenre", "score": 0.9},
+    {"label": "othergenre", "score": 0.1},
+]
+
+
 @pytest.fixture(autouse=True)
 def stub_classifier(monkeypatch):
     """Заглушка классификатора, всегда возвращает 'testgenre'."""
     monkeypatch.setattr(
-        "app.services.classifier.classify",
-        lambda path: "testgenre"
+        "app.services.classifier.classify_scores",
+        lambda path, content_hash=None: STUB_SCORES
+    )
+    # Пакетный путь (загрузка пачкой) — та же заглушка для каждого файла
+    monkeypatch.setattr(
+        "app.services.classifier.classify_batch",
+        lambda paths, hashes=None: [STUB_SCORES] * len(paths)
     )
 
 
+@pytest.fixture(autouse=True)
+def reset_limiter():
+    """
+    Гостевой лимит считается по IP, квоты — по id пользователя;
+    у тестов они общие, поэтому до и после теста очищаем всё хранилище
+    лимитера (пустой префикс — все ключи, а не только гостевые).
+    """
+    from app.services import limiter
+    limiter.get_backend().reset(prefix="")
+    yield
+    limiter.get_backend().reset(prefix="")
+
+
 @pytest.fixture
 def wav_stub(tmp_path: Path) -> Path:
     """Минимальный валидный WAV-файл (160 сэмплов тишины)."""
@@ -59,6 +86,22 @@ def wav_stub(tmp_path: Path) -> Path:
     return p
 
 
+@pytest.fixture
+def unique_wav(tmp_path: Path) -> Path:
+    """
+    WAV-файл со случайным содержимым — не совпадает по хешу
+    ни с одной предыдущей загрузкой (обходит кэш дедупликации).
+    """
+    p = tmp_path / "unique.wav"
+    with wave.open(str(p), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        samples = [random.randint(-1000, 1000) for _ in range(160)]
+        wf.writeframes(struct.pack("<" + "h"*160, *samples))
+    return p
+
+
 @pytest.fixture
 def new_user(app):
     """
@@ -90,4 +133,28 @@ def cleanup_uploads(app):
     # после всех тестов удаляем папку с загруженными файлами
     upload_dir = app.config.get("UPLOAD_FOLDER")
     if upload_dir:
-        shutil.rmtree(upload_dir, ignore_errors=True)
\ No newline at end of file
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+@contextmanager
+def _track_queries(engine):
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM track" in statement:
+            queries.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def captured_track_queries():
+    """
+    Контекстный менеджер: собрать SELECT'ы по таблице track
+    (запрос и параметры), выполненные внутри блока.
+    """
+    return _track_queries
@@ -30,31 +30,32 @@ def test_login_success(client, new_user):
     assert isinstance(token, str) and token
 
 
-def test_guest_upload_limit(client, wav_stub):
+def test_guest_upload_limit(client, unique_wav):
     """
     Гость может загрузить максимум 5 файлов.
     Шестая попытка должна вернуть 403 и сообщение про лимит.
     """
     # 5 успешных загрузок подряд
-    for _ in range(5):
+    for i in range(5):
         r = client.post(
             "/api/v1/upload",
-            data={"file": (open(wav_stub, "rb"), wav_stub.name)},
+            data={"file": (open(unique_wav, "rb"), unique_wav.name)},
             content_type="multipart/form-data"
         )
-        assert r.status_code == 201
+        # Новый файл ставится в очередь (202), повторы берут жанр из кэша (201)
+        assert r.status_code == (202 if i == 0 else 201)
 
     # 6-я загрузка должна быть запрещена
     r6 = client.post(
         "/api/v1/upload",
-        data={"file": (open(wav_stub, "rb"), wav_stub.name)},
+        data={"file": (open(unique_wav, "rb"), unique_wav.name)},
         content_type="multipart/form-data"
     )
     assert r6.status_code == 403
     assert "limit" in r6.get_json()["error"].lower()
 
 
-def test_auth_upload_unlimited(client, new_user, wav_stub):
+def test_auth_upload_unlimited(client, new_user, unique_wav):
     """
     Авторизованный пользователь может загружать без ограничений.
     После 7 загрузок в базе должно быть 7 записей.
@@ -62,14 +63,15 @@ def test_auth_upload_unlimited(client, new_user, wav_stub):
     token = login_get_token(client, new_user.email, "password123")
 
     # Делает 7 последовательных загрузок с токеном
-    for _ in range(7):
+    for i in range(7):
         r = client.post(
             "/api/v1/upload",
             headers={"Authorization": f"Bearer {token}"},
-            data={"file": (open(wav_stub, "rb"), wav_stub.name)},
+            data={"file": (open(unique_wav, "rb"), unique_wav.name)},
             content_type="multipart/form-data"
         )
-        assert r.status_code == 201
+        # Новый файл ставится в очередь (202), повторы берут жанр из кэша (201)
+        assert r.status_code == (202 if i == 0 else 201)
 
     # Проверка в БД: сколько треков привязано к новому пользователю
     from app import db
@@ -79,7 +81,7 @@ def test_auth_upload_unlimited(client, new_user, wav_stub):
         assert cnt == 7
 
 
-def test_get_tracks_and_detail(client, new_user, wav_stub):
+def test_get_tracks_and_detail(client, new_user, unique_wav):
     """
     Проверяем получение списка треков и детальной информации по конкретному треку.
     """
@@ -89,10 +91,10 @@ def test_get_tracks_and_detail(client, new_user, wav_stub):
     upload = client.post(
         "/api/v1/upload",
         headers={"Authorization": f"Bearer {token}"},
-        data={"file": (open(wav_stub, "rb"), wav_stub.name)},
+        data={"file": (open(unique_wav, "rb"), unique_wav.name)},
         content_type="multipart/form-data"
     )
-    assert upload.status_code == 201
+    assert upload.status_code == 202
     tid = upload.get_json()["id"]
 
     # GET /tracks — список всех треков пользователя
@@ -112,6 +114,11 @@ def test_get_tracks_and_detail(client, new_user, wav_stub):
     )
     assert detail.status_code == 200
     assert detail.get_json()["id"] == tid
+    # Сохраняются top-k оценки модели, по убыванию
+    assert detail.get_json()["scores"] == [
+        {"label": "testgenre", "score": 0.9},
+        {"label": "othergenre", "score": 0.1},
+    ]
 
 
 def test_upload_bad_extension(client, wav_stub):
@@ -131,3 +138,350 @@ def test_upload_bad_extension(client, wav_stub):
     # Ожидаем 415 и сообщение об ошибке, связанной с расширением
     assert r.status_code == 415
     assert "extension" in r.get_json()["error"].lower()
+
+
+def test_upload_job_status(client, new_user, unique_wav):
+    """
+    Загрузка возвращает 202 и ссылку на статус задачи;
+    после выполнения задачи у трека проставлен жанр.
+    """
+    token = login_get_token(client, new_user.email, "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    upload = client.post(
+        "/api/v1/upload",
+        headers=headers,
+        data={"file": (open(unique_wav, "rb"), unique_wav.name)},
+        content_type="multipart/form-data"
+    )
+    assert upload.status_code == 202
+    body = upload.get_json()
+    assert body["status_url"].endswith(f"/tracks/{body['id']}/status")
+
+    # В тестах очередь синхронная — задача уже выполнена
+    status = client.get(body["status_url"], headers=headers)
+    assert status.status_code == 200
+    assert status.get_json() == {
+        "id": body["id"], "status": "done", "genre": "testgenre"
+    }
+
+    # Без токена чужой трек не виден
+    assert client.get(body["status_url"]).status_code == 404
+
+
+def test_duplicate_upload_uses_cache(client, new_user, unique_wav, monkeypatch):
+    """
+    Повторная загрузка того же содержимого не запускает модель:
+    жанр берётся из кэша, а трек ссылается на уже сохранённый файл.
+    """
+    from app.services import dedup
+
+    calls = []
+    monkeypatch.setattr(
+        "app.services.classifier.classify_scores",
+        lambda path, content_hash=None: calls.append(path) or [
+            {"label": "cachedgenre", "score": 0.7}
+        ]
+    )
+    token = login_get_token(client, new_user.email, "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def upload():
+        return client.post(
+            "/api/v1/upload",
+            headers=headers,
+            data={"file": (open(unique_wav, "rb"), "copy.wav")},
+            content_type="multipart/form-data"
+        )
+
+    first = upload()
+    hits_before = dedup.stats()["hits"]
+    second = upload()
+
+    assert first.status_code == 202
+    assert second.status_code == 201
+    assert second.get_json()["genre"] == "cachedgenre"
+    # Оценки тоже берутся из кэша
+    detail = client.get(f"/api/v1/tracks/{second.get_json()['id']}", headers=headers)
+    assert detail.get_json()["scores"] == [{"label": "cachedgenre", "score": 0.7}]
+    assert second.get_json()["filename"] == first.get_json()["filename"]
+    assert len(calls) == 1
+    assert dedup.stats()["hits"] == hits_before + 1
+
+
+def test_raw_body_upload(client, unique_wav):
+    """Файл можно передать сырым телом запроса с ?filename=."""
+    r = client.post(
+        "/api/v1/upload?filename=raw.wav",
+        data=unique_wav.read_bytes(),
+        content_type="audio/wav"
+    )
+    assert r.status_code == 202
+    assert r.get_json()["status"] == "done"
+
+
+def test_upload_rejects_non_audio_content(client, new_user, tmp_path):
+    """Файл с расширением .wav, но без сигнатуры RIFF/WAVE — 415."""
+    token = login_get_token(client, new_user.email, "password123")
+    junk = tmp_path / "junk.wav"
+    junk.write_bytes(b"<html>not audio</html>" * 10)
+
+    r = client.post(
+        "/api/v1/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        data={"file": (open(junk, "rb"), junk.name)},
+        content_type="multipart/form-data"
+    )
+    assert r.status_code == 415
+    assert "format" in r.get_json()["error"].lower()
+
+
+def test_upload_rejects_too_large(app, client, new_user, unique_wav, monkeypatch):
+    """Превышение MAX_UPLOAD_SIZE — 413, файл на диске не остаётся."""
+    import os
+    monkeypatch.setitem(app.config, "MAX_UPLOAD_SIZE", 100)
+    token = login_get_token(client, new_user.email, "password123")
+    before = set(os.listdir(app.config["UPLOAD_FOLDER"]))
+
+    r = client.post(
+        "/api/v1/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        data={"file": (open(unique_wav, "rb"), unique_wav.name)},
+        content_type="multipart/form-data"
+    )
+    assert r.status_code == 413
+    assert set(os.listdir(app.config["UPLOAD_FOLDER"])) == before
+
+
+def test_health_reports_warm_state(client, monkeypatch):
+    """/health отвечает 503, пока модель не загружена, и 200 после прогрева."""
+    from app.services import classifier
+
+    monkeypatch.setattr(classifier, "_classifier", None)
+    cold = client.get("/api/v1/health")
+    assert cold.status_code == 503
+    assert cold.get_json()["ready"] is False
+
+    monkeypatch.setattr(classifier, "_classifier", object())
+    warm = client.get("/api/v1/health")
+    assert warm.status_code == 200
+    state = warm.get_json()
+    assert {k: state[k] for k in ("mode", "ready", "workers")} == {
+        "mode": "local", "ready": True, "workers": 1
+    }
+    assert set(state["dedup"]) == {"hits", "misses"}
+
+
+def test_tracks_keyset_pagination(app, client):
+    """
+    Список треков отдаётся страницами по курсору (uploaded_at, id),
+    с выбором полей и фильтрами по жанру и дате.
+    """
+    from datetime import datetime, timedelta
+    from app import db
+    from app.models import Track, User
+
+    with app.app_context():
+        user = User(email="pager@example.com")
+        user.password = "password123"
+        db.session.add(user)
+        db.session.flush()
+        start = datetime(2024, 1, 1)
+        for i in range(5):
+            db.session.add(Track(
+                filename=f"{i}.wav", original_filename=f"{i}.wav",
+                genre="rock" if i % 2 else "jazz", status="done",
+                uploaded_at=start + timedelta(days=i), user_id=user.id
+            ))
+        db.session.commit()
+
+    token = login_get_token(client, "pager@example.com", "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # Обходим все страницы по 2 трека: новые сверху, без повторов
+    seen, cursor = [], None
+    while True:
+        url = "/api/v1/tracks?limit=2&fields=filename,genre"
+        if cursor:
+            url += f"&cursor={cursor}"
+        body = client.get(url, headers=headers).get_json()
+        assert all(set(t) == {"filename", "genre"} for t in body["tracks"])
+        seen += [t["filename"] for t in body["tracks"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["4.wav", "3.wav", "2.wav", "1.wav", "0.wav"]
+
+    # Фильтры по жанру и диапазону дат
+    body = client.get(
+        "/api/v1/tracks?genre=rock&since=2024-01-02&until=2024-01-04&fields=filename",
+        headers=headers
+    ).get_json()
+    assert body["tracks"] == [{"filename": "1.wav"}]
+
+    # Неизвестное поле и битый курсор — 400
+    assert client.get("/api/v1/tracks?fields=password_hash", headers=headers).status_code == 400
+    assert client.get("/api/v1/tracks?cursor=garbage", headers=headers).status_code == 400
+
+
+def test_tracks_export_streams(app, client):
+    """Экспорт истории треков потоком в NDJSON и CSV."""
+    import csv
+    import io
+    import json
+    from app import db
+    from app.models import Track, User
+
+    with app.app_context():
+        user = User(email="exporter@example.com")
+        user.password = "password123"
+        db.session.add(user)
+        db.session.flush()
+        for i in range(3):
+            track = Track(filename=f"e{i}.wav", original_filename=f"e{i}.wav",
+                          genre="rock", status="done", user_id=user.id)
+            track.set_scores([{"label": "rock", "score": 0.8}])
+            db.session.add(track)
+        db.session.commit()
+
+    token = login_get_token(client, "exporter@example.com", "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    r = client.get("/api/v1/tracks/export?fields=filename,scores", headers=headers)
+    assert r.status_code == 200
+    assert r.is_streamed
+    assert r.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert [row["filename"] for row in rows] == ["e0.wav", "e1.wav", "e2.wav"]
+    assert rows[0]["scores"] == [{"label": "rock", "score": 0.8}]
+
+    r = client.get("/api/v1/tracks/export?format=csv&fields=id,genre", headers=headers)
+    assert r.mimetype == "text/csv"
+    table = list(csv.reader(io.StringIO(r.get_data(as_text=True))))
+    assert table[0] == ["id", "genre"]
+    assert len(table) == 4
+
+    assert client.get("/api/v1/tracks/export?format=xml", headers=headers).status_code == 400
+
+
+def test_batch_upload(app, client, new_user, tmp_path):
+    """
+    Пакетная загрузка: несколько файлов и zip-архив в одном запросе,
+    результат по каждому файлу, плохие файлы не мешают остальным.
+    """
+    import io
+    import random
+    import struct
+    import wave
+    import zipfile
+    from app.models import Track
+
+    def wav_bytes():
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            wf.writeframes(struct.pack("<" + "h" * 160,
+                                       *[random.randint(-1000, 1000) for _ in range(160)]))
+        return buf.getvalue()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("album/one.wav", wav_bytes())
+        zf.writestr("album/two.wav", wav_bytes())
+        zf.writestr("album/cover.jpg", b"not audio")
+    archive.seek(0)
+
+    token = login_get_token(client, new_user.email, "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+    r = client.post(
+        "/api/v1/upload/batch",
+        headers=headers,
+        data={"files": [
+            (io.BytesIO(wav_bytes()), "a.wav"),
+            (io.BytesIO(b"<html>fake</html>"), "b.wav"),
+            (io.BytesIO(b"text"), "c.txt"),
+            (archive, "album.zip"),
+        ]},
+        content_type="multipart/form-data"
+    )
+    assert r.status_code == 202
+    body = r.get_json()
+    codes = {res["filename"]: res["code"] for res in body["results"]}
+    assert codes == {"a.wav": 202, "b.wav": 415, "c.txt": 415, "one.wav": 202, "two.wav": 202}
+    assert (body["accepted"], body["rejected"]) == (3, 2)
+
+    with app.app_context():
+        ids = [res["id"] for res in body["results"] if "id" in res]
+        tracks = Track.query.filter(Track.id.in_(ids)).all()
+        assert {t.status for t in tracks} == {"done"}
+        assert {t.genre for t in tracks} == {"testgenre"}
+
+    # zip сырым телом запроса
+    archive.seek(0)
+    raw = client.post(
+        "/api/v1/upload/batch", headers=headers,
+        data=archive.getvalue(), content_type="application/zip"
+    )
+    assert raw.status_code == 202
+    # те же файлы уже классифицированы — жанр из кэша
+    assert [res["code"] for res in raw.get_json()["results"]] == [201, 201]
+
+    # Без токена пакетная загрузка недоступна, пустой пакет — 400
+    assert client.post("/api/v1/upload/batch").status_code == 401
+    assert client.post("/api/v1/upload/batch", headers=headers,
+                       data={}, content_type="multipart/form-data").status_code == 400
+
+
+def test_track_audio_range(client, new_user, unique_wav):
+    """Аудио трека отдаётся целиком и по диапазону байт (206 Partial Content)."""
+    token = login_get_token(client, new_user.email, "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+    tid = client.post(
+        "/api/v1/upload?filename=play.wav", headers=headers,
+        data=unique_wav.read_bytes(), content_type="audio/wav"
+    ).get_json()["id"]
+    data = unique_wav.read_bytes()
+
+    full = client.get(f"/api/v1/tracks/{tid}/audio", headers=headers)
+    assert full.status_code == 200
+    assert full.mimetype == "audio/wav"
+    assert full.data == data
+
+    part = client.get(f"/api/v1/tracks/{tid}/audio",
+                      headers=dict(headers, Range="bytes=10-19"))
+    assert part.status_code == 206
+    assert part.data == data[10:20]
+    assert part.headers["Content-Range"] == f"bytes 10-19/{len(data)}"
+
+    bad = client.get(f"/api/v1/tracks/{tid}/audio",
+                     headers=dict(headers, Range=f"bytes={len(data) + 5}-"))
+    assert bad.status_code == 416
+
+
+def test_dedup_counters(app, client, unique_wav):
+    """
+    Промах и попадание кэша дедупликации видны в /health (счётчики процесса)
+    и в flask dedup-stats (попадания по всем процессам из БД).
+    """
+    from app.services import dedup
+
+    with app.app_context():
+        hits_before = dedup.totals()["hits"]
+    before = client.get("/api/v1/health").get_json()["dedup"]
+
+    def upload():
+        return client.post(
+            "/api/v1/upload?filename=counted.wav",
+            data=unique_wav.read_bytes(), content_type="audio/wav"
+        )
+
+    assert upload().status_code == 202
+    assert upload().status_code == 201
+
+    after = client.get("/api/v1/health").get_json()["dedup"]
+    assert after == {"hits": before["hits"] + 1, "misses": before["misses"] + 1}
+    result = app.test_cli_runner().invoke(args=["dedup-stats"])
+    assert result.exit_code == 0, result.output
+    assert f"попаданий: {hits_before + 1}" in result.output
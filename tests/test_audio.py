@@ -0,0 +1,47 @@
+import struct
+import wave
+
+import pytest
+
+from app.services.audio import aggregate_scores, load_windows, window_starts
+
+
+def test_window_starts_spread_over_track():
+    """Три окна — начало, середина и конец трека."""
+    assert window_starts(1000, 100, 3) == [0, 450, 900]
+    # Трек короче суммы окон — одно окно с начала
+    assert window_starts(250, 100, 3) == [0]
+    assert window_starts(1000, 100, 0) == []
+
+
+def test_load_windows_seeks_and_resamples(tmp_path):
+    """Из 30-секундного WAV вырезаются три окна по 2 с в частоте модели."""
+    pytest.importorskip("soundfile")
+    path = tmp_path / "long.wav"
+    rate, seconds = 8000, 30
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(2)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(struct.pack("<h", 1000) * 2 * rate * seconds)
+
+    windows = load_windows(str(path), 16000, 2.0, 3)
+    assert len(windows) == 3
+    assert all(len(w) == 32000 for w in windows)
+
+
+def test_load_windows_falls_back_for_unknown_format(tmp_path):
+    """Нераспознаваемый файл — None (пайплайн декодирует его сам)."""
+    path = tmp_path / "junk.wav"
+    path.write_bytes(b"not audio at all")
+    assert load_windows(str(path), 16000, 2.0, 3) is None
+
+
+def test_aggregate_scores_averages_windows():
+    """Оценки окон усредняются, жанры сортируются по убыванию."""
+    merged = aggregate_scores([
+        [{"label": "rock", "score": 0.6}, {"label": "jazz", "score": 0.4}],
+        [{"label": "jazz", "score": 0.9}, {"label": "rock", "score": 0.1}],
+    ])
+    assert [r["label"] for r in merged] == ["jazz", "rock"]
+    assert merged[0]["score"] == pytest.approx(0.65)
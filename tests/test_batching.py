@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from app.services.classifier import MicroBatcher
+
+
+def test_batcher_groups_concurrent_requests():
+    """
+    Запросы, пришедшие одновременно, выполняются одной пачкой
+    не больше max_batch_size, и каждый получает свой результат.
+    """
+    batches = []
+    gate = threading.Event()
+
+    def run_batch(items):
+        # Держим первую пачку, пока не соберутся все запросы
+        gate.wait(1)
+        batches.append(list(items))
+        return [x * 10 for x in items]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(6)]
+    gate.set()
+
+    assert [f.result(timeout=2) for f in futures] == [0, 10, 20, 30, 40, 50]
+    assert [len(b) for b in batches] == [4, 2]
+
+
+def test_batcher_propagates_errors():
+    """Ошибка пачки пробрасывается каждому ожидающему."""
+    def run_batch(items):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(run_batch, max_batch_size=2, max_wait_ms=10)
+    future = batcher.submit("a.wav")
+    with pytest.raises(RuntimeError):
+        future.result(timeout=2)
+
+
+def test_fair_scheduler_round_robin():
+    """Задачи разных пользователей чередуются, а не идут в порядке поступления."""
+    from app.services.jobs import FairScheduler
+
+    scheduler = FairScheduler(workers=0)
+    for name in ("a1", "a2", "a3"):
+        scheduler.submit("alice", name)
+    scheduler.submit("bob", "b1")
+    scheduler.submit(None, "g1")
+    assert scheduler.pending() == {"alice": 3, "bob": 1, None: 1}
+
+    order = [scheduler.next_job(timeout=0) for _ in range(5)]
+    assert order == ["a1", "b1", "g1", "a2", "a3"]
+    assert scheduler.next_job(timeout=0) is None
@@ -0,0 +1,25 @@
+import pytest
+
+
+def test_parity_report():
+    """Сравнение бэкендов: доля совпавших top-1 и макс. расхождение оценок."""
+    from app.services.classifier import parity
+
+    reference = [
+        [{"label": "rock", "score": 0.8}, {"label": "metal", "score": 0.2}],
+        [{"label": "jazz", "score": 0.6}, {"label": "blues", "score": 0.4}],
+    ]
+    candidate = [
+        [{"label": "rock", "score": 0.75}, {"label": "metal", "score": 0.25}],
+        [{"label": "blues", "score": 0.5}, {"label": "jazz", "score": 0.5}],
+    ]
+    report = parity(reference, candidate)
+    assert report["agreement"] == 0.5
+    assert report["max_abs_diff"] == pytest.approx(0.1)
+
+
+def test_unknown_backend_rejected():
+    from app.services.classifier import build_pipeline
+
+    with pytest.raises(ValueError):
+        build_pipeline("tensorrt")
@@ -0,0 +1,152 @@
+def _upload(client, path):
+    return client.post(
+        "/api/v1/upload?filename=track.wav",
+        data=path.read_bytes(),
+        content_type="audio/wav"
+    )
+
+
+def test_reclassify_updates_all_tracks(app, client, unique_wav, tmp_path, monkeypatch):
+    """
+    flask reclassify проходит по всем трекам чанками и записывает новые жанры;
+    с --resume продолжает после id из контрольной точки.
+    """
+    from app import db
+    from app.models import Track
+
+    tid = _upload(client, unique_wav).get_json()["id"]
+    with app.app_context():
+        version = db.session.get(Track, tid).version
+    calls = []
+
+    def fake_batch(paths, hashes=None):
+        calls.append(len(paths))
+        return [[{"label": "newgenre", "score": 0.8}]] * len(paths)
+
+    monkeypatch.setattr("app.services.classifier.classify_batch_local", fake_batch)
+    checkpoint = tmp_path / "reclassify.checkpoint"
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=[
+        "reclassify", "--workers", "1", "--chunk-size", "2",
+        "--batch-size", "4", "--checkpoint", str(checkpoint)
+    ])
+    assert result.exit_code == 0, result.output
+    assert "завершена" in result.output
+
+    with app.app_context():
+        track = db.session.get(Track, tid)
+        assert (track.genre, track.status) == ("newgenre", "done")
+        assert [(s.label, s.score) for s in track.scores] == [("newgenre", 0.8)]
+        # Версия (ETag) растёт и при bulk-обновлении
+        assert track.version > version
+        last_id = db.session.query(db.func.max(Track.id)).scalar()
+    assert checkpoint.read_text() == str(last_id)
+
+    # Повторный запуск с --resume: обрабатывать больше нечего
+    calls.clear()
+    result = runner.invoke(args=[
+        "reclassify", "--workers", "1", "--resume", "--checkpoint", str(checkpoint)
+    ])
+    assert result.exit_code == 0, result.output
+    assert calls == []
+
+
+def test_genre_stats_follow_tracks(app, client, new_user, unique_wav, tmp_path, monkeypatch):
+    """
+    Сводка по жанрам обновляется при загрузке и переклассификации
+    и совпадает с пересчётом по трекам (flask genre-stats --check).
+    """
+    from flask_jwt_extended import create_access_token
+    from app.services import genre_stats
+
+    with app.app_context():
+        token = create_access_token(identity=str(new_user.id))
+    headers = {"Authorization": f"Bearer {token}"}
+    before = client.get("/api/v1/stats", headers=headers).get_json()
+
+    r = client.post(
+        "/api/v1/upload?filename=stat.wav", headers=headers,
+        data=unique_wav.read_bytes(), content_type="audio/wav"
+    )
+    assert r.status_code == 202
+    after = client.get("/api/v1/stats", headers=headers).get_json()
+    assert after["total"] == before["total"] + 1
+    assert "testgenre" in [g["genre"] for g in after["genres"]]
+
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["genre-stats", "--check"]).exit_code == 0
+
+    # Bulk-переклассификация тоже поддерживает сводку
+    monkeypatch.setattr(
+        "app.services.classifier.classify_batch_local",
+        lambda paths, hashes=None: [[{"label": "statgenre", "score": 1.0}]] * len(paths)
+    )
+    result = runner.invoke(args=[
+        "reclassify", "--workers", "1", "--checkpoint", str(tmp_path / "reclassify.checkpoint")
+    ])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(args=["genre-stats", "--check"])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        genres = {g["genre"] for g in genre_stats.summary(new_user.id)}
+    assert "testgenre" not in genres
+
+    assert "пересобрана" in runner.invoke(args=["genre-stats"]).output
+
+
+def test_reclassify_skips_tracks_without_file(app, new_user, tmp_path, monkeypatch):
+    """
+    Трек, файл которого не найден, не теряет прежний жанр, оценки
+    и место в сводке; пропуск выводится в отчёте.
+    """
+    from app import db
+    from app.models import Track, TrackScore
+
+    with app.app_context():
+        track = Track(filename="objects/00/00/missing.wav", original_filename="missing.wav",
+                      genre="rock", status="done", user_id=new_user.id)
+        track.scores = [TrackScore(rank=0, label="rock", score=0.7)]
+        db.session.add(track)
+        db.session.commit()
+        tid, version = track.id, track.version
+
+    monkeypatch.setattr(
+        "app.services.classifier.classify_batch_local",
+        lambda paths, hashes=None: [[{"label": "newgenre", "score": 0.8}]] * len(paths)
+    )
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=[
+        "reclassify", "--workers", "1", "--checkpoint", str(tmp_path / "reclassify.checkpoint")
+    ])
+    assert result.exit_code == 0, result.output
+    assert "пропущено" in result.output
+
+    with app.app_context():
+        track = db.session.get(Track, tid)
+        assert (track.genre, track.status, track.version) == ("rock", "done", version)
+        assert [(s.label, s.score) for s in track.scores] == [("rock", 0.7)]
+    result = runner.invoke(args=["genre-stats", "--check"])
+    assert result.exit_code == 0, result.output
+
+
+def test_reclassify_resume_without_checkpoint_clears_cache(app, tmp_path, monkeypatch):
+    """--resume без файла контрольной точки — новый запуск: кэш дедупликации очищается."""
+    from app import db
+    from app.models import ClassificationCache
+
+    with app.app_context():
+        db.session.add(ClassificationCache(content_hash="f" * 64, filename="x.wav", genre="old"))
+        db.session.commit()
+
+    monkeypatch.setattr(
+        "app.services.classifier.classify_batch_local",
+        lambda paths, hashes=None: [[{"label": "newgenre", "score": 0.8}]] * len(paths)
+    )
+    result = app.test_cli_runner().invoke(args=[
+        "reclassify", "--workers", "1", "--resume",
+        "--checkpoint", str(tmp_path / "absent.checkpoint")
+    ])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert db.session.get(ClassificationCache, "f" * 64) is None
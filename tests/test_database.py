@@ -0,0 +1,170 @@
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from app import create_app, db
+from app.models import Track, User, UserGenreStat
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """
+    Приложение с файловой SQLite-базой (WAL работает только для файла).
+    Встроенное ожидание блокировки pysqlite (timeout=5 с) отключено:
+    ждать занятую базу соединения должны только по PRAGMA busy_timeout.
+    """
+    app = create_app("testing", {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+        "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 0}},
+    })
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_sqlite_pragmas_applied(file_app):
+    """Каждое соединение получает WAL, synchronous=NORMAL и busy_timeout."""
+    with file_app.app_context():
+        pragma = lambda name: db.session.execute(text(f"PRAGMA {name}")).scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == file_app.config["SQLITE_BUSY_TIMEOUT_MS"]
+        assert pragma("cache_size") == -file_app.config["SQLITE_CACHE_SIZE_KB"]
+
+
+def test_engine_options_for_server_databases():
+    """Для PostgreSQL настраивается пул, явные параметры не перетираются."""
+    from app.services.database import engine_options
+
+    config = {
+        "SQLALCHEMY_DATABASE_URI": "postgresql://db/app",
+        "SQLALCHEMY_ENGINE_OPTIONS": {"pool_size": 3},
+        "DB_MAX_OVERFLOW": 7,
+    }
+    options = engine_options(config)
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 7
+    assert options["pool_pre_ping"] is True
+    assert engine_options({"SQLALCHEMY_DATABASE_URI": "sqlite:///x.db"}) == {}
+
+
+def test_parallel_upload_commits(file_app):
+    """
+    Параллельные коммиты загрузок (трек + обновление сводки по жанрам
+    в одной транзакции) не падают с "database is locked".
+    """
+    threads_count, per_thread = 8, 25
+    with file_app.app_context():
+        user = User(email="parallel@example.com")
+        user.password = "password123"
+        db.session.add(user)
+        db.session.commit()
+        uid = user.id
+
+    errors = []
+    barrier = threading.Barrier(threads_count)
+
+    def upload(n):
+        with file_app.app_context():
+            barrier.wait()
+            try:
+                for i in range(per_thread):
+                    db.session.add(Track(
+                        filename=f"{n}-{i}.wav", original_filename=f"{n}-{i}.wav",
+                        genre="rock", status="done", user_id=uid
+                    ))
+                    db.session.commit()
+                    # Читатели не ждут писателей
+                    Track.query.filter_by(user_id=uid).count()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=upload, args=(n,)) for n in range(threads_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with file_app.app_context():
+        assert Track.query.filter_by(user_id=uid).count() == threads_count * per_thread
+        assert db.session.get(UserGenreStat, (uid, "rock")).count == threads_count * per_thread
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """Основная SQLite-база и её копия в роли реплики чтения."""
+    from app.services.database import copy_sqlite_replicas
+
+    app = create_app("testing", {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "SQLALCHEMY_REPLICA_URIS": [f"sqlite:///{tmp_path / 'replica.db'}"],
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(email="replica@example.com")
+        user.password = "password123"
+        db.session.add(user)
+        db.session.commit()
+    copy_sqlite_replicas(app)
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_read_only_views_use_replica(replica_app, unique_wav):
+    """
+    Списки читаются с реплики; после своей загрузки пользователь
+    читает с основной БД и сразу видит новый трек.
+    """
+    from flask_jwt_extended import create_access_token
+
+    with replica_app.app_context():
+        uid = User.query.filter_by(email="replica@example.com").one().id
+        token = create_access_token(identity=str(uid))
+        # Запись мимо запросов: на реплику она не попадёт
+        track = Track(filename="x.wav", original_filename="x.wav", user_id=uid)
+        db.session.add(track)
+        db.session.commit()
+        stale_id = track.id
+    headers = {"Authorization": f"Bearer {token}"}
+    client = replica_app.test_client()
+
+    assert client.get("/api/v1/tracks", headers=headers).get_json()["tracks"] == []
+    # Детали трека, которого нет на реплике, дочитываются с основной БД
+    assert client.get(f"/api/v1/tracks/{stale_id}", headers=headers).status_code == 200
+
+    r = client.post(
+        "/api/v1/upload?filename=fresh.wav", headers=headers,
+        data=unique_wav.read_bytes(), content_type="audio/wav"
+    )
+    assert r.status_code == 202
+    ids = {t["id"] for t in client.get("/api/v1/tracks", headers=headers).get_json()["tracks"]}
+    assert ids == {stale_id, r.get_json()["id"]}
+
+
+def test_replica_responses_not_cached(replica_app, monkeypatch):
+    """
+    Ответ, прочитанный с отставшей реплики, не попадает в кэш ответов:
+    иначе устаревшие данные жили бы под свежим поколением весь TTL.
+    """
+    from flask_jwt_extended import create_access_token
+    from app.services import http_cache
+
+    monkeypatch.setattr(http_cache, "TTL", 60)
+    http_cache.clear()
+    with replica_app.app_context():
+        uid = User.query.filter_by(email="replica@example.com").one().id
+        token = create_access_token(identity=str(uid))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    r = replica_app.test_client().get("/api/v1/tracks", headers=headers)
+    assert r.status_code == 200 and r.headers.get("ETag")
+    assert not any(user_id == uid for user_id, _ in http_cache._entries)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from app.services import audio, classifier, features
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    """Окна сохраняются одним .npy и читаются через mmap."""
+    windows = [np.full(100, i, dtype=np.float32) for i in range(3)]
+    path = features.save(str(tmp_path), "v1", "ab" + "0" * 62, windows)
+
+    assert path.endswith(".npy") and "/ab/" in path
+    loaded = features.load(str(tmp_path), "v1", "ab" + "0" * 62)
+    assert len(loaded) == 3
+    assert np.array_equal(loaded[2], windows[2])
+    # Другая версия предобработки — промах
+    assert features.load(str(tmp_path), "v2", "ab" + "0" * 62) is None
+
+
+def test_ragged_windows_are_not_truncated(tmp_path, monkeypatch):
+    """
+    Окна разной длины не сохраняются обрезанными: из кэша модель
+    получала бы не то же, что при декодировании файла.
+    """
+    import pytest
+
+    ragged = [np.zeros(100, dtype=np.float32), np.zeros(60, dtype=np.float32)]
+    with pytest.raises(ValueError):
+        features.save(str(tmp_path), "v1", "ef" + "0" * 62, ragged)
+
+    monkeypatch.setattr(classifier, "FEATURE_DIR", str(tmp_path))
+    monkeypatch.setattr(classifier, "WINDOW_COUNT", 2)
+    monkeypatch.setattr(audio, "load_windows", lambda *args: ragged)
+    windows = classifier.load_features("short.wav", 16000, "ef" + "0" * 62)
+    assert [len(w) for w in windows] == [100, 60]
+    assert not any(tmp_path.rglob("*.npy"))
+
+
+def test_load_features_reads_store_instead_of_decoding(tmp_path, monkeypatch):
+    """Второй запрос тех же окон не декодирует файл."""
+    decoded = []
+
+    def fake_load_windows(path, rate, seconds, count):
+        decoded.append(path)
+        return [np.zeros(rate, dtype=np.float32)] * count
+
+    monkeypatch.setattr(audio, "load_windows", fake_load_windows)
+    monkeypatch.setattr(classifier, "FEATURE_DIR", str(tmp_path))
+    monkeypatch.setattr(classifier, "WINDOW_COUNT", 3)
+
+    first = classifier.load_features("a.flac", 16000, "cd" + "1" * 62)
+    second = classifier.load_features("a.flac", 16000, "cd" + "1" * 62)
+
+    assert decoded == ["a.flac"]
+    assert len(first) == len(second) == 3
@@ -0,0 +1,132 @@
+import pytest
+
+from app import db
+from app.models import Track
+from app.services import http_cache
+
+
+@pytest.fixture
+def auth(app, new_user):
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        token = create_access_token(identity=str(new_user.id))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _upload(client, auth, path):
+    return client.post(
+        "/api/v1/upload?filename=cached.wav", headers=auth,
+        data=path.read_bytes(), content_type="audio/wav"
+    ).get_json()["id"]
+
+
+def _reclassify(app, track_id, label):
+    with app.app_context():
+        track = db.session.get(Track, track_id)
+        track.set_scores([{"label": label, "score": 0.7}])
+        db.session.commit()
+
+
+def test_track_detail_conditional_get(app, client, auth, unique_wav):
+    """ETag по версии трека: 304 для той же версии, новый ETag после переклассификации."""
+    tid = _upload(client, auth, unique_wav)
+    r = client.get(f"/api/v1/tracks/{tid}", headers=auth)
+    assert r.status_code == 200
+    etag = r.headers["ETag"]
+    assert r.headers["Last-Modified"]
+    assert r.headers["Cache-Control"] == "private, max-age=60"
+
+    r = client.get(f"/api/v1/tracks/{tid}", headers=dict(auth, **{"If-None-Match": etag}))
+    assert r.status_code == 304
+    assert r.data == b""
+
+    # Изменились только оценки — версия всё равно растёт
+    _reclassify(app, tid, "testgenre")
+    r = client.get(f"/api/v1/tracks/{tid}", headers=dict(auth, **{"If-None-Match": etag}))
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert r.get_json()["scores"] == [{"label": "testgenre", "score": 0.7}]
+
+
+def test_track_list_conditional_get(client, auth, unique_wav, wav_stub):
+    """Список отдаёт 304, пока на странице те же треки в тех же версиях."""
+    _upload(client, auth, unique_wav)
+    r = client.get("/api/v1/tracks?limit=5", headers=auth)
+    etag = r.headers["ETag"]
+    assert r.headers["Cache-Control"] == "private, no-cache"
+    assert client.get("/api/v1/tracks?limit=5",
+                      headers=dict(auth, **{"If-None-Match": etag})).status_code == 304
+    # Другие параметры — другое представление
+    assert client.get("/api/v1/tracks?limit=5&pretty=1",
+                      headers=dict(auth, **{"If-None-Match": etag})).status_code == 200
+
+    _upload(client, auth, wav_stub)
+    assert client.get("/api/v1/tracks?limit=5",
+                      headers=dict(auth, **{"If-None-Match": etag})).status_code == 200
+
+
+def test_result_page_conditional_get(client, unique_wav):
+    tid = client.post(
+        "/api/v1/upload?filename=guest.wav",
+        data=unique_wav.read_bytes(), content_type="audio/wav"
+    ).get_json()["id"]
+    r = client.get(f"/result/{tid}")
+    assert r.status_code == 200
+    r = client.get(f"/result/{tid}", headers={"If-None-Match": r.headers["ETag"]})
+    assert r.status_code == 304
+
+
+def test_result_page_admin_sees_guest_counter(app, client, new_user, unique_wav, monkeypatch):
+    """
+    Администратору шапка показывает гостевой счётчик: после новой гостевой
+    загрузки старый ETag не подходит, и max-age страница не получает.
+    """
+    monkeypatch.setitem(app.config, "ADMIN_EMAIL", new_user.email)
+
+    def guest_upload(name, data):
+        return client.post(f"/api/v1/upload?filename={name}", data=data,
+                           content_type="audio/wav").get_json()["id"]
+
+    tid = guest_upload("admin.wav", unique_wav.read_bytes())
+    client.post("/auth/login", data={"email": new_user.email, "password": "password123"})
+    try:
+        # Первый показ выводит flash после входа и не кэшируется
+        client.get(f"/result/{tid}")
+        r = client.get(f"/result/{tid}")
+        assert r.status_code == 200
+        assert "max-age" not in r.headers["Cache-Control"]
+        etag = r.headers["ETag"]
+        assert client.get(f"/result/{tid}", headers={"If-None-Match": etag}).status_code == 304
+
+        guest_upload("other.wav", unique_wav.read_bytes() + b"\x00\x00")
+        r = client.get(f"/result/{tid}", headers={"If-None-Match": etag})
+        assert r.status_code == 200
+    finally:
+        client.get("/auth/logout")
+
+
+def test_response_cache(app, client, auth, unique_wav, monkeypatch, captured_track_queries):
+    """
+    С RESPONSE_CACHE_TTL повторный запрос не обращается к БД,
+    а изменение треков пользователя сбрасывает кэш.
+    """
+    monkeypatch.setattr(http_cache, "TTL", 60)
+    http_cache.clear()
+    tid = _upload(client, auth, unique_wav)
+    url = f"/api/v1/tracks/{tid}"
+    first = client.get(url, headers=auth)
+
+    with app.app_context():
+        engine = db.engine
+    with captured_track_queries(engine) as queries:
+        again = client.get(url, headers=auth)
+        unchanged = client.get(url, headers=dict(auth, **{"If-None-Match": first.headers["ETag"]}))
+    assert queries == []
+    assert again.data == first.data and again.headers["ETag"] == first.headers["ETag"]
+    assert unchanged.status_code == 304
+
+    _reclassify(app, tid, "othergenre")
+    r = client.get(url, headers=auth)
+    assert r.get_json()["scores"][0]["label"] == "othergenre"
+    http_cache.clear()
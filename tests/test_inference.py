@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from app.services import inference
+
+
+def test_authkey_required():
+    """Сервер инференса не работает без отдельного надёжного ключа."""
+    for value in (None, "", "change-me"):
+        with pytest.raises(RuntimeError):
+            inference.check_authkey(value)
+    assert inference.check_authkey("s3cr3t-key") == b"s3cr3t-key"
+
+
+def test_init_app_refuses_default_key(app, monkeypatch):
+    monkeypatch.setitem(app.config, "INFERENCE_SERVER_ADDRESS", "127.0.0.1:5055")
+    monkeypatch.setitem(app.config, "INFERENCE_AUTHKEY", None)
+    try:
+        with pytest.raises(RuntimeError):
+            inference.init_app(app)
+    finally:
+        monkeypatch.undo()
+        inference.init_app(app)
+
+
+def test_remote_reconnects_after_server_restart(monkeypatch):
+    """Обрыв соединения сбрасывает прокси, вызов повторяется через новое подключение."""
+    connects = []
+
+    class Proxy:
+        def __init__(self, broken):
+            self.broken = broken
+
+        def status(self):
+            if self.broken:
+                raise ConnectionResetError
+            return {"ready": True, "workers": 1}
+
+    def connect():
+        connects.append(1)
+        # Первый прокси — от «старого» сервера, который перезапустили
+        inference._remote = Proxy(broken=len(connects) == 1)
+        return inference._remote
+
+    monkeypatch.setattr(inference, "_remote", None)
+    monkeypatch.setattr(inference, "_get_remote", lambda: inference._remote or connect())
+    assert inference._call_remote("status") == {"ready": True, "workers": 1}
+    assert len(connects) == 2
+    # Новый прокси закэширован и используется дальше
+    assert inference._call_remote("status")["ready"]
+    assert len(connects) == 2
+
+
+def test_lazy_pool_becomes_ready(client, monkeypatch):
+    """
+    Пул, запущенный первым запросом без INFERENCE_PRELOAD, прогревается
+    в фоне, и /health начинает отвечать 200.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Потоки вместо процессов: воркеры не загружают настоящую модель
+    monkeypatch.setattr(
+        inference, "ProcessPoolExecutor",
+        lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers)
+    )
+    monkeypatch.setattr(inference, "POOL_SIZE", 1)
+    monkeypatch.setattr(inference, "_pool", None)
+    monkeypatch.setattr(inference, "_warm_pids", set())
+    monkeypatch.setattr(
+        "app.services.classifier.classify_batch_local",
+        lambda paths, hashes=None: [[{"label": "rock", "score": 1.0}]] * len(paths)
+    )
+
+    assert inference.status() == {"mode": "pool", "ready": False, "workers": 0}
+    assert client.get("/api/v1/health").status_code == 503
+
+    assert inference.classify_batch(["a.wav"]) == [[{"label": "rock", "score": 1.0}]]
+    try:
+        deadline = time.monotonic() + 5
+        while not inference.status()["ready"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert inference.status() == {"mode": "pool", "ready": True, "workers": 1}
+        r = client.get("/api/v1/health")
+        assert r.status_code == 200 and r.get_json()["mode"] == "pool"
+    finally:
+        inference._pool.shutdown()
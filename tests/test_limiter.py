@@ -0,0 +1,142 @@
+import pytest
+
+from app.services.limiter import MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "ratelimit.db"))
+
+
+def test_sliding_window(backend):
+    """
+    Скользящее окно: после исчерпания лимита запросы отклоняются,
+    а доля предыдущего окна «остывает» постепенно.
+    """
+    window = 100
+    # 5 запросов в конце окна [0, 100)
+    assert all(backend.hit("k", 5, window, now=90) for _ in range(5))
+    assert not backend.hit("k", 5, window, now=95)
+
+    # В начале следующего окна прошлый счётчик учитывается почти целиком:
+    # 5 * 0.9 = 4.5 — проходит только один запрос
+    assert backend.hit("k", 5, window, now=110)
+    assert not backend.hit("k", 5, window, now=110)
+    # Через половину окна — наполовину: 1 + 5 * 0.5 = 3.5, места ещё на два
+    assert all(backend.hit("k", 5, window, now=150) for _ in range(2))
+    assert not backend.hit("k", 5, window, now=150)
+
+    # Спустя два окна счётчики обнуляются
+    assert backend.usage("k", window, now=400) == 0
+
+
+def test_reset_by_prefix(backend):
+    backend.hit("guest:1.1.1.1", 1, 100, now=10)
+    backend.hit("guest:1.1.1.10", 1, 100, now=10)
+    backend.hit("user:1", 1, 100, now=10)
+
+    backend.delete("guest:1.1.1.1")
+    assert backend.usage("guest:1.1.1.1", 100, now=10) == 0
+    assert backend.usage("guest:1.1.1.10", 100, now=10) == 1
+
+    backend.reset("guest:")
+    assert backend.usage("guest:1.1.1.10", 100, now=10) == 0
+    assert backend.usage("user:1", 100, now=10) == 1
+
+
+def test_sqlite_backend_shared_between_instances(tmp_path):
+    """Два экземпляра на одном файле (как два воркера) видят общий счётчик."""
+    path = str(tmp_path / "ratelimit.db")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    assert first.hit("guest:ip", 2, 100, now=1)
+    assert second.hit("guest:ip", 2, 100, now=1)
+    assert not first.hit("guest:ip", 2, 100, now=1)
+
+
+def test_guest_limit_survives_cookie_reset(app, unique_wav):
+    """Гостевой лимит привязан к IP: новый клиент без cookies его не обходит."""
+    for i in range(5):
+        r = app.test_client().post(
+            "/api/v1/upload",
+            data={"file": (open(unique_wav, "rb"), unique_wav.name)},
+            content_type="multipart/form-data"
+        )
+        assert r.status_code == (202 if i == 0 else 201)
+
+    r = app.test_client().post(
+        "/api/v1/upload",
+        data={"file": (open(unique_wav, "rb"), unique_wav.name)},
+        content_type="multipart/form-data"
+    )
+    assert r.status_code == 403
+
+
+def test_user_request_quota(app, client, new_user, unique_wav, monkeypatch):
+    """Сверх USER_REQUESTS_PER_MINUTE пользователь получает 429."""
+    from flask_jwt_extended import create_access_token
+
+    monkeypatch.setitem(app.config, "USER_REQUESTS_PER_MINUTE", 2)
+    with app.app_context():
+        token = create_access_token(identity=str(new_user.id))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def upload():
+        return client.post(
+            "/api/v1/upload?filename=q.wav", headers=headers,
+            data=unique_wav.read_bytes(), content_type="audio/wav"
+        )
+
+    assert upload().status_code == 202
+    assert upload().status_code == 201
+    r = upload()
+    assert r.status_code == 429
+    assert "quota" in r.get_json()["error"].lower()
+
+
+def test_user_audio_quota(app, client, new_user, unique_wav, monkeypatch):
+    """
+    Секунды аудио списываются только при прогоне модели:
+    после исчерпания часовой квоты новый файл отклоняется с 429,
+    а повтор уже классифицированного файла проходит из кэша.
+    """
+    import hashlib
+    from flask_jwt_extended import create_access_token
+
+    from app.models import Track
+    from app.services import storage
+
+    # Файл unique_wav длится 0.01 с — квоты хватает ровно на один
+    monkeypatch.setitem(app.config, "USER_AUDIO_SECONDS_PER_HOUR", 0.01)
+    with app.app_context():
+        token = create_access_token(identity=str(new_user.id))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    first = client.post(
+        "/api/v1/upload?filename=a.wav", headers=headers,
+        data=unique_wav.read_bytes(), content_type="audio/wav"
+    )
+    assert first.status_code == 202
+
+    other = unique_wav.read_bytes()[:-2] + b"\x01\x02"
+    r = client.post(
+        "/api/v1/upload?filename=b.wav", headers=headers,
+        data=other, content_type="audio/wav"
+    )
+    assert r.status_code == 429
+    # На файл отклонённой загрузки не ссылается ни один трек —
+    # его удаляет сборщик мусора (блоб лежит в objects/xx/yy/)
+    with app.app_context():
+        blob = lambda data: storage.blob_name(hashlib.sha256(data).hexdigest(), ".wav")
+        assert storage.get_storage().exists(blob(other))
+        assert Track.query.filter_by(filename=blob(other)).count() == 0
+        storage.collect_garbage(min_age=0)
+        assert not storage.get_storage().exists(blob(other))
+        assert storage.get_storage().exists(blob(unique_wav.read_bytes()))
+
+    again = client.post(
+        "/api/v1/upload?filename=a.wav", headers=headers,
+        data=unique_wav.read_bytes(), content_type="audio/wav"
+    )
+    assert again.status_code == 201
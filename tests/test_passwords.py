@@ -0,0 +1,56 @@
+import pytest
+
+from app import db
+from app.models import User
+
+
+@pytest.fixture
+def bench_user(app):
+    """Пользователь с хешем по методу из конфига тестов."""
+    with app.app_context():
+        User.query.filter_by(email="hash@example.com").delete()
+        user = User(email="hash@example.com")
+        user.password = "password123"
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def _hash(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password_hash
+
+
+def test_password_uses_configured_method(app, bench_user):
+    assert _hash(app, bench_user).startswith("pbkdf2:sha256:1000$")
+    with app.app_context():
+        assert not db.session.get(User, bench_user).password_needs_rehash()
+
+
+def test_login_rehashes_with_new_method(app, client, bench_user, monkeypatch):
+    """После смены PASSWORD_HASH_METHOD хеш пересчитывается при входе."""
+    monkeypatch.setitem(app.config, "PASSWORD_HASH_METHOD", "pbkdf2:sha256:2000")
+
+    r = client.post("/api/v1/auth/login", json={"email": "hash@example.com", "password": "password123"})
+    assert r.status_code == 200
+    assert _hash(app, bench_user).startswith("pbkdf2:sha256:2000$")
+
+    # Неверный пароль хеш не трогает, со старым паролем вход по-прежнему работает
+    before = _hash(app, bench_user)
+    r = client.post("/api/v1/auth/login", json={"email": "hash@example.com", "password": "wrong"})
+    assert r.status_code == 401
+    assert _hash(app, bench_user) == before
+
+    r = client.post("/auth/login", data={"email": "hash@example.com", "password": "password123"})
+    assert r.status_code == 302
+    client.get("/auth/logout")
+
+
+def test_password_bench_command(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=[
+        "password-bench", "--method", "pbkdf2:sha256:1000", "--seconds", "0.01"
+    ])
+    assert result.exit_code == 0, result.output
+    assert "pbkdf2:sha256:1000:" in result.output
+    assert "входов/с" in result.output
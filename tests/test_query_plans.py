@@ -0,0 +1,96 @@
+import pytest
+
+
+def query_plan(engine, statement, parameters):
+    """Строки EXPLAIN QUERY PLAN для запроса (поле detail)."""
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+def assert_uses_indexes(engine, queries):
+    """
+    Ни один запрос не сканирует track целиком и не сортирует
+    результат во временном B-дереве — порядок должен давать индекс.
+    """
+    assert queries, "запросы к track не выполнялись"
+    for statement, parameters in queries:
+        plan = query_plan(engine, statement, parameters)
+        assert not any(d.startswith("SCAN track") for d in plan), (statement, plan)
+        assert not any("TEMP B-TREE" in d for d in plan), (statement, plan)
+
+
+@pytest.fixture
+def logged_in(client, new_user):
+    client.post(
+        "/auth/login",
+        data={"email": new_user.email, "password": "password123"}
+    )
+    yield client
+    client.get("/auth/logout")
+
+
+@pytest.mark.parametrize("query_string", [
+    "sort=date&order=desc",
+    "sort=date&order=asc",
+    "sort=name&order=asc",
+    "sort=name&order=desc",
+])
+def test_stats_queries_use_indexes(app, logged_in, query_string, captured_track_queries):
+    """Сортировки страницы /stats идут по составным индексам (user_id, ...)."""
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+    with captured_track_queries(engine) as queries:
+        assert logged_in.get(f"/stats?{query_string}").status_code == 200
+    assert_uses_indexes(engine, queries)
+
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/tracks",
+    "/api/v1/tracks?genre=rock",
+    "/api/v1/tracks?since=2024-01-01&until=2025-01-01",
+    "/api/v1/tracks?cursor=WyIyMDI0LTAxLTAxVDAwOjAwOjAwIiwgMTBd",
+    "/api/v1/tracks/export",
+    "/api/v1/tracks/1",
+])
+def test_api_track_queries_use_indexes(app, client, new_user, url, captured_track_queries):
+    """Запросы API к трекам пользователя не сканируют таблицу целиком."""
+    from app import db
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        engine = db.engine
+        token = create_access_token(identity=str(new_user.id))
+    with captured_track_queries(engine) as queries:
+        r = client.get(url, headers={"Authorization": f"Bearer {token}"})
+        r.get_data()
+        assert r.status_code in (200, 404)
+    assert_uses_indexes(engine, queries)
+
+
+def test_grouped_stats_summary_skips_tracks(app, logged_in, captured_track_queries):
+    """Сводка по жанрам читается из user_genre_stat, таблица track не трогается."""
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+    with captured_track_queries(engine) as queries:
+        assert logged_in.get("/stats?group=1").status_code == 200
+    assert queries == []
+
+
+@pytest.mark.parametrize("query_string", [
+    "group=1&genre=rock&sort=date",
+    "group=1&genre=&sort=date&order=asc",
+])
+def test_grouped_stats_queries_use_indexes(app, logged_in, query_string, captured_track_queries):
+    """Треки раскрытого жанра читаются по индексу (user_id, genre, uploaded_at)."""
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+    with captured_track_queries(engine) as queries:
+        assert logged_in.get(f"/stats?{query_string}").status_code == 200
+    assert_uses_indexes(engine, queries)
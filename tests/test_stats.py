@@ -0,0 +1,60 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def stats_user(app):
+    """Пользователь с 7 треками двух жанров (создаётся один раз на модуль)."""
+    from datetime import datetime, timedelta
+    from app import db
+    from app.models import Track, User
+
+    with app.app_context():
+        user = User(email="stats@example.com")
+        user.password = "password123"
+        db.session.add(user)
+        db.session.flush()
+        for i in range(7):
+            db.session.add(Track(
+                filename=f"s{i}.wav", original_filename=f"song{i}.wav",
+                genre="rock" if i < 5 else "jazz", status="done",
+                uploaded_at=datetime(2024, 1, 1) + timedelta(hours=i),
+                user_id=user.id
+            ))
+        db.session.commit()
+    return "stats@example.com"
+
+
+@pytest.fixture
+def stats_client(client, stats_user):
+    """Клиент, залогиненный через веб-форму."""
+    client.post("/auth/login", data={"email": stats_user, "password": "password123"})
+    yield client
+    client.get("/auth/logout")
+
+
+def test_stats_paginated(app, stats_client, monkeypatch):
+    """Без группировки /stats показывает треки постранично."""
+    monkeypatch.setitem(app.config, "STATS_PAGE_SIZE", 3)
+
+    first = stats_client.get("/stats?sort=date&order=asc").get_data(as_text=True)
+    assert "song0.wav" in first and "song2.wav" in first
+    assert "song3.wav" not in first
+
+    third = stats_client.get("/stats?sort=date&order=asc&page=3").get_data(as_text=True)
+    assert "song6.wav" in third and "song5.wav" not in third
+
+
+def test_stats_grouped_summary(app, stats_client, monkeypatch):
+    """
+    Группировка показывает сводку по жанрам из GROUP BY,
+    а треки загружаются только для выбранного жанра.
+    """
+    monkeypatch.setitem(app.config, "STATS_PAGE_SIZE", 2)
+
+    summary = stats_client.get("/stats?group=1").get_data(as_text=True)
+    assert "Rock" in summary and "Jazz" in summary
+    assert "song0.wav" not in summary
+
+    jazz = stats_client.get("/stats?group=1&genre=jazz&sort=date&order=asc").get_data(as_text=True)
+    assert "song5.wav" in jazz and "song6.wav" in jazz
+    assert "song0.wav" not in jazz
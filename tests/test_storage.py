@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from app.services.storage import S3Storage, blob_name
+
+
+@pytest.fixture
+def s3(tmp_path):
+    """S3Storage поверх moto — локальной подмены S3."""
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="uploads")
+        yield S3Storage("uploads", str(tmp_path / "cache"), prefix="genre", client=client)
+
+
+def write(backend, data, name, chunk=1024):
+    writer = backend.writer()
+    for i in range(0, len(data), chunk):
+        writer.write(data[i:i + chunk])
+    return writer.commit(name), writer.local_path
+
+
+def test_s3_small_and_multipart_writes(s3, monkeypatch):
+    """Маленький файл пишется одним PUT, большой — multipart по частям."""
+    monkeypatch.setattr(S3Storage, "PART_SIZE", 5 * 1024 * 1024)
+    small = os.urandom(3000)
+    big = os.urandom(11 * 1024 * 1024)
+
+    name, local = write(s3, small, blob_name("aa" * 32, ".wav"))
+    assert s3.exists(name) and s3.size(name) == len(small)
+    assert open(local, "rb").read() == small
+
+    name, _ = write(s3, big, blob_name("bb" * 32, ".wav"), chunk=1024 * 1024)
+    assert s3.size(name) == len(big)
+    # Временные объекты multipart-загрузки не остаются
+    assert [n for n, _, _ in s3.list("tmp")] == []
+
+
+def test_s3_range_read_and_cache(s3):
+    """Чтение диапазона байт и скачивание в локальный кэш для модели."""
+    data = os.urandom(5000)
+    name, local = write(s3, data, blob_name("cc" * 32, ".flac"))
+    assert b"".join(s3.read_range(name, 100, 50)) == data[100:150]
+
+    os.remove(local)
+    path = s3.local_path(name)
+    assert open(path, "rb").read() == data
+
+    s3.delete(name)
+    assert not s3.exists(name)
+    assert s3.local_path(name) is None
+
+
+def test_s3_abort_leaves_nothing(s3, monkeypatch):
+    monkeypatch.setattr(S3Storage, "PART_SIZE", 5 * 1024 * 1024)
+    writer = s3.writer()
+    writer.write(os.urandom(6 * 1024 * 1024))
+    writer.abort()
+    assert list(s3.list("")) == []
@@ -0,0 +1,98 @@
+import io
+import struct
+
+from app.services.uploads import _flac_duration, _mp3_byte_rate, sniff_format
+
+
+def test_sniff_format_signatures():
+    """Формат определяется по сигнатуре, а не по расширению."""
+    assert sniff_format(b"RIFF\x24\x00\x00\x00WAVEfmt ") == ".wav"
+    assert sniff_format(b"fLaC\x00\x00\x00\x22") == ".flac"
+    assert sniff_format(b"ID3\x04\x00\x00\x00\x00\x00\x00") == ".mp3"
+    assert sniff_format(b"\xff\xfb\x90\x64") == ".mp3"
+    assert sniff_format(b"PK\x03\x04") is None
+
+
+def test_flac_duration_from_streaminfo():
+    """Длительность FLAC читается из STREAMINFO без декодирования."""
+    sample_rate, total = 44100, 44100 * 300
+    # 16 бит мин/макс блока, 24+24 бита размеров кадров, затем
+    # 20 бит частоты, 3 бита каналов, 5 бит глубины, 36 бит сэмплов
+    packed = (sample_rate << 44) | (1 << 41) | (15 << 36) | total
+    streaminfo = b"\x10\x00\x10\x00" + b"\x00" * 6 + packed.to_bytes(8, "big")
+    head = b"fLaC" + b"\x80\x00\x00\x22" + streaminfo + b"\x00" * 16
+    assert _flac_duration(head) == 300
+
+
+def test_mp3_byte_rate_skips_id3():
+    """Байтрейт MP3 берётся из первого кадра после тега ID3v2."""
+    tag = b"ID3\x04\x00\x00" + struct.pack(">I", 5) + b"\x00" * 5
+    frame = b"\xff\xfb\x90\x64"  # MPEG-1 Layer III, 128 кбит/с
+    assert _mp3_byte_rate(tag + frame) == 128000 // 8
+
+
+def test_mp3_byte_rate_only_for_cbr_mpeg1():
+    """
+    VBR (служебный кадр Xing/Info/VBRI) и MPEG-2/2.5 не оцениваются
+    по битрейту первого кадра — иначе длинный VBR-файл отклонялся бы зря.
+    """
+    stereo = b"\xff\xfb\x90\x64"  # MPEG-1 Layer III, 128 кбит/с, joint stereo
+    mono = b"\xff\xfb\x90\xc4"
+    assert _mp3_byte_rate(stereo + b"\x00" * 32 + b"Xing" + b"\x00" * 8) is None
+    assert _mp3_byte_rate(stereo + b"\x00" * 32 + b"Info" + b"\x00" * 8) is None
+    assert _mp3_byte_rate(mono + b"\x00" * 17 + b"Xing" + b"\x00" * 8) is None
+    assert _mp3_byte_rate(stereo + b"\x00" * 32 + b"VBRI" + b"\x00" * 8) is None
+    assert _mp3_byte_rate(b"\xff\xf3\x90\x64") is None  # MPEG-2 Layer III
+    assert _mp3_byte_rate(b"\xff\xe3\x90\x64") is None  # MPEG-2.5 Layer III
+    assert _mp3_byte_rate(stereo + b"\x00" * 44) == 128000 // 8
+
+
+def test_content_addressed_storage(app, unique_wav):
+    """
+    Файл сохраняется по хешу содержимого в objects/ab/cd/<hash>.wav;
+    повторная загрузка того же содержимого не создаёт вторую копию.
+    """
+    import os
+    from app.services.uploads import save_upload
+
+    with app.test_request_context():
+        with open(unique_wav, "rb") as f:
+            first = save_upload(f, ".wav")
+        with open(unique_wav, "rb") as f:
+            second = save_upload(f, ".wav")
+
+    h = first.content_hash
+    assert first.filename == f"objects/{h[:2]}/{h[2:4]}/{h}.wav"
+    assert second.filename == first.filename
+    assert os.path.exists(first.path)
+    assert os.listdir(os.path.join(app.config["UPLOAD_FOLDER"], "tmp")) == []
+
+
+def test_storage_release_and_gc(app, unique_wav):
+    """
+    Файл без ссылок из треков удаляет сборщик мусора;
+    файл, на который ссылается трек, остаётся.
+    """
+    import os
+    from app import db
+    from app.models import Track
+    from app.services import storage
+    from app.services.uploads import save_upload
+
+    with app.test_request_context():
+        with open(unique_wav, "rb") as f:
+            kept = save_upload(f, ".wav")
+        db.session.add(Track(filename=kept.filename, original_filename="kept.wav",
+                             content_hash=kept.content_hash, status="done"))
+        db.session.commit()
+
+        orphan = save_upload(io.BytesIO(unique_wav.read_bytes() + b"\x00\x00"), ".wav")
+        # Свежие файлы сборщик не трогает — ссылка может быть ещё не записана
+        assert storage.collect_garbage(min_age=3600)["removed"] == 0
+        stats = storage.collect_garbage(min_age=0, dry_run=True)
+        assert stats["removed"] >= 1 and os.path.exists(orphan.path)
+
+        result = app.test_cli_runner().invoke(args=["storage-gc", "--min-age", "0"])
+        assert result.exit_code == 0, result.output
+        assert not os.path.exists(orphan.path)
+        assert os.path.exists(kept.path)
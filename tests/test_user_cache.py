@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db
+from app.models import User
+from app.services import user_cache
+
+
+@contextmanager
+def captured_user_queries(engine):
+    """Собрать SELECT'ы по таблице user, выполненные внутри блока."""
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and 'FROM "user"' in statement:
+            queries.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_load_user_served_from_cache(app, client, new_user):
+    """Повторные запросы залогиненного пользователя не читают таблицу user."""
+    client.post("/auth/login", data={"email": new_user.email, "password": "password123"})
+    assert client.get("/stats").status_code == 200
+
+    with app.app_context():
+        engine = db.engine
+    with captured_user_queries(engine) as queries:
+        assert client.get("/stats").status_code == 200
+        assert client.get("/upload").status_code == 200
+    assert queries == []
+    client.get("/auth/logout")
+
+
+def test_user_change_invalidates_cache(app, new_user):
+    """Изменение пользователя сразу видно через кэш."""
+    with app.app_context():
+        assert user_cache.get(new_user.id).email == new_user.email
+        db.session.remove()
+
+        user = db.session.get(User, new_user.id)
+        user.email = "renamed@example.com"
+        db.session.commit()
+        db.session.remove()
+
+        assert user_cache.get(new_user.id).email == "renamed@example.com"
+        db.session.remove()
+
+        # Bulk-удаление обходит события маппера, но тоже сбрасывает кэш
+        User.query.filter_by(id=new_user.id).delete()
+        db.session.commit()
+        assert user_cache.get(new_user.id) is None
+
+
+def test_cache_is_bounded(app, monkeypatch):
+    """Сверх MAX_ENTRIES вытесняются давно не использованные записи."""
+    monkeypatch.setattr(user_cache, "MAX_ENTRIES", 2)
+    user_cache.invalidate()
+    with app.app_context():
+        ids = []
+        for n in range(3):
+            user = User(email=f"cache{n}@example.com")
+            user.password = "password123"
+            db.session.add(user)
+            db.session.commit()
+            ids.append(user.id)
+        for user_id in ids:
+            user_cache.get(user_id)
+    assert list(user_cache._entries) == ids[1:]
+    user_cache.invalidate()
+
+
+def test_api_upload_checks_user_via_cache(app, client, new_user, unique_wav):
+    """Загрузка по JWT проверяет пользователя по кэшу, не читая таблицу user."""
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        engine = db.engine
+        token = create_access_token(identity=str(new_user.id))
+        assert user_cache.get(new_user.id) is not None
+    with captured_user_queries(engine) as queries:
+        r = client.post(
+            "/api/v1/upload?filename=jwt.wav",
+            headers={"Authorization": f"Bearer {token}"},
+            data=unique_wav.read_bytes(), content_type="audio/wav"
+        )
+    assert r.status_code == 202
+    assert queries == []
+
+
+def test_api_upload_with_deleted_user(app, client, unique_wav):
+    """
+    Токен удалённого пользователя: одиночная загрузка становится гостевой
+    (без внешнего ключа на несуществующего пользователя), пакетная — 401.
+    """
+    import io
+    from flask_jwt_extended import create_access_token
+    from app.models import Track
+
+    with app.app_context():
+        user = User(email="deleted@example.com")
+        user.password = "password123"
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+        assert user_cache.get(user.id) is not None
+        db.session.delete(user)
+        db.session.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    r = client.post(
+        "/api/v1/upload?filename=orphan.wav", headers=headers,
+        data=unique_wav.read_bytes(), content_type="audio/wav"
+    )
+    assert r.status_code == 202
+    with app.app_context():
+        assert db.session.get(Track, r.get_json()["id"]).user_id is None
+
+    r = client.post(
+        "/api/v1/upload/batch", headers=headers,
+        data={"files": (io.BytesIO(unique_wav.read_bytes()), "a.wav")}, content_type="multipart/form-data"
+    )
+    assert r.status_code == 401